@@ -2,15 +2,43 @@
 ASGI config for kahootclone project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django, websocket connections to /ws/games/<publicId>/
+go to restServer.consumers.game_socket and the lobby event stream of the
+host to services.streams.participant_stream. Websockets and the event
+stream need the project to be served by an ASGI server (e.g. uvicorn
+kahootclone.asgi:application).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kahootclone.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402
+from restServer.consumers import game_socket  # noqa: E402
+from services.streams import participant_stream  # noqa: E402
+
+GAME_SOCKET_PATH = re.compile(r'^/ws/games/(?P<publicId>[0-9]+)/$')
+PARTICIPANT_STREAM_PATH = reverse('game-participantstream')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        match = GAME_SOCKET_PATH.match(scope['path'])
+        if match is None:
+            await receive()
+            await send({'type': 'websocket.close'})
+            return
+        await game_socket(scope, receive, send, int(match['publicId']))
+        return
+    if scope['type'] == 'http' and scope['path'] == PARTICIPANT_STREAM_PATH:
+        await participant_stream(scope, receive, send)
+        return
+    await django_application(scope, receive, send)
@@ -0,0 +1,57 @@
+import threading
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from .querycount import QueryCounter
+
+
+class LoadSheddingMiddleware:
+    '''Reject API requests with 503 and Retry-After while more than
+    settings.API_MAX_INFLIGHT of them are being served by this process,
+    instead of letting the backlog grow until every request times out.
+    Only useful with threaded workers or an ASGI server, a sync worker
+    serves one request at a time.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+        with self._lock:
+            if self._inflight >= getattr(settings, 'API_MAX_INFLIGHT', 200):
+                response = JsonResponse(
+                    {'detail': 'Server busy, try again later.'}, status=503)
+                response['Retry-After'] = '1'
+                return response
+            self._inflight += 1
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+
+class QueryCountMiddleware:
+    '''With DEBUG on, report the number of queries run by the request and
+    the time spent in them (milliseconds) in the X-DB-Query-Count and
+    X-DB-Time response headers.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        response['X-DB-Query-Count'] = str(counter.count)
+        response['X-DB-Time'] = '%.2f' % (counter.time * 1000)
+        return response
@@ -0,0 +1,46 @@
+"""Query accounting shared by QueryCountMiddleware and the test suites.
+
+QueryCounter is a database execute wrapper that counts the queries run
+through a connection and the time spent in them. QueryBudgetMixin lets a
+test case declare the maximum number of queries of each endpoint in
+query_budgets and check them with assertQueryBudget, so that an N+1
+regression fails the tests instead of slowing down production.
+"""
+import time
+from contextlib import contextmanager
+from django.db import connection
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.queries.append(sql)
+
+
+class QueryBudgetMixin:
+    '''query_budgets maps an endpoint (usually its url name) to the
+    maximum number of queries a request to it may run'''
+    query_budgets = {}
+
+    @contextmanager
+    def assertQueryBudget(self, endpoint):
+        budget = self.query_budgets[endpoint]
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            yield counter
+        if counter.count > budget:
+            self.fail('%s ran %d queries, its budget is %d:\n%s' % (
+                endpoint, counter.count, budget,
+                '\n'.join('%d. %s' % (i, sql) for i, sql in enumerate(
+                    counter.queries, start=1))))
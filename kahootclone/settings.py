@@ -72,6 +72,8 @@ if VUE_CLIENT:
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'kahootclone.middleware.LoadSheddingMiddleware',
+    'kahootclone.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -176,6 +178,85 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Cache: CACHE_BACKEND is the dotted path of a Django cache backend and
+# CACHE_LOCATION its location (e.g. host:11211 for
+# django.core.cache.backends.memcached.PyMemcacheCache). The default
+# in-process cache is only right for a single worker; with several workers
+# they all need the same cache, or the game contexts, rankings and the pages of
+# models/contentcache.py drift apart between them (WEB_WORKERS below; the
+# models.W001 check warns, and game contexts are then kept only briefly).
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 100000}
+
+# Sessions: SESSION_BACKEND=db (default), cached_db, cache or
+# signed_cookies. The session only holds the login and the game the host
+# is running, so every backend works; 'cache' needs a cache shared by all
+# the workers (CACHES) and loses the sessions when it is cleared.
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_BACKENDS[os.environ.get('SESSION_BACKEND', 'db')]
+
+# Write-behind mode for guesses: accepted guesses are kept in memory and
+# stored in bulk every GUESS_BUFFER_SIZE guesses, every
+# GUESS_BUFFER_INTERVAL seconds and whenever a question is closed.
+# Only meant for deployments running a single worker process.
+GUESS_WRITE_BEHIND = os.environ.get(
+    'GUESS_WRITE_BEHIND', '').lower() in ['true', 't', '1']
+GUESS_BUFFER_SIZE = 200
+GUESS_BUFFER_INTERVAL = 1.0
+
+# Game PINs are handed out without collisions (models/pins.py); the PIN of
+# a deleted game is only given to a new game after this many seconds, so
+# that players still holding it do not join the wrong game.
+GAME_PIN_REUSE_DELAY = 3600
+
+# Questionnaires and games with more guesses and participants than this
+# are deleted by a background thread, in chunks (models/deletion.py).
+DELETE_INLINE_LIMIT = 5000
+
+# Token buckets of the player endpoints (/api/participant/, /api/guess/):
+# scope -> (burst size, requests per second). A whole classroom may share
+# one address, hence the large 'ip' bucket. Set API_THROTTLE_STORE to
+# 'cache' to share the buckets between workers through CACHES.
+API_THROTTLES = {
+    'participant': (10, 2),
+    'ip': (600, 200),
+}
+API_THROTTLE_STORE = 'memory'
+# The 'ip' bucket is keyed by the client address. X-Forwarded-For is only
+# trusted for the proxies in front of the app (one on Render, see
+# NUM_PROXIES), otherwise any client could pick its own bucket.
+REST_FRAMEWORK = {
+    'NUM_PROXIES': int(os.environ.get(
+        'NUM_PROXIES', 1 if 'RENDER' in os.environ else 0)),
+}
+# API requests served at the same time by one process before the
+# following ones are rejected with 503
+API_MAX_INFLIGHT = 200
+
+# Worker processes serving the site, from WEB_CONCURRENCY as gunicorn and
+# uvicorn read it. With one, in-process broadcasts and caches reach every
+# request.
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Broadcast layer used to push game events to websockets and event
+# streams, see models/broadcast.py. The host lobby uses the event stream
+# when the broadcast reaches every worker (a single worker, or a shared
+# backend), it polls otherwise.
+BROADCAST_BACKEND = 'models.broadcast.InProcessBroadcast'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
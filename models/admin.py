@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Participant, Questionnaire
 from .models import Question, Answer, Game, User, Guess
+from .models import GameSummary, QuestionSummary
 # Register your models here.
 admin.site.register(Participant)
 admin.site.register(Answer)
@@ -29,3 +30,12 @@ class GameAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Game, GameAdmin)
+
+
+class GameSummaryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'playedAt', 'publicId', 'participantCount',
+                    'archivedAt')
+
+
+admin.site.register(GameSummary, GameSummaryAdmin)
+admin.site.register(QuestionSummary)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'models'
+
+    def ready(self):
+        # connect the receivers that keep the game caches up to date
+        from . import signals  # noqa: F401
+        # warn about caches the workers do not share
+        from . import checks  # noqa: F401
@@ -0,0 +1,89 @@
+"""Archival of finished games.
+
+A played game leaves a Participant row per player and a Guess row per
+answer in the tables every running game uses. archive_game compacts the
+game into one GameSummary (participants, score histogram, podium) and a
+QuestionSummary per question (guesses of every answer), then deletes the
+raw rows CHUNK_SIZE at a time with models/deletion.py, and finally the
+game itself, which releases its PIN.
+
+The summary is written before anything is deleted and only once per game
+(GameSummary.gameId is unique), so an interrupted archival is finished
+by the next one. See the archivegames command.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from .constants import LEADERBOARD
+from .models import Game, Participant, Guess, GameSummary, QuestionSummary
+from . import deletion, guessbuffer, snapshot
+
+CHUNK_SIZE = deletion.CHUNK_SIZE
+
+
+def archivable(finished_after, stale_after):
+    '''games that ended finished_after ago and games in any other state
+    that have not moved for stale_after (both timedelta)'''
+    now = timezone.now()
+    finished = Game.objects.filter(
+        state=LEADERBOARD, updated_at__lte=now - finished_after)
+    stale = Game.objects.exclude(state=LEADERBOARD).filter(
+        updated_at__lte=now - stale_after)
+    return (finished | stale).order_by('updated_at')
+
+
+def summarize(game):
+    '''write the summaries of the game, return its GameSummary'''
+    if guessbuffer.enabled():
+        guessbuffer.buffer.flush(game.id)
+    questions = snapshot.get_snapshot(game.id)['questions']
+    histogram = dict(Participant.objects.filter(game=game).values_list(
+        'points').annotate(count=Count('id')).order_by())
+    podium = list(Participant.objects.filter(game=game).order_by(
+        '-points', 'id').values_list('alias', 'points')[:3])
+    counts = {}
+    for answer_id, count in Guess.objects.filter(game=game).values_list(
+            'answer_id').annotate(count=Count('id')).order_by():
+        counts[answer_id] = count
+    with transaction.atomic():
+        summary, created = GameSummary.objects.get_or_create(
+            gameId=game.id, defaults={
+                'questionnaire_id': game.questionnaire_id,
+                'title': game.questionnaire.title,
+                'publicId': game.publicId,
+                'state': game.state,
+                'playedAt': game.created_at,
+                'participantCount': sum(histogram.values()),
+                'scoreHistogram': {
+                    str(points): count
+                    for points, count in sorted(histogram.items())},
+                'podium': [list(row) for row in podium],
+            })
+        if created:
+            QuestionSummary.objects.bulk_create(
+                _question_summary(summary, position, question, counts)
+                for position, question in enumerate(questions, 1))
+    return summary
+
+
+def _question_summary(summary, position, question, counts):
+    answers = []
+    guessCount = correctCount = 0
+    for i, (answer_id, text) in enumerate(question['answers']):
+        correct = bool(question['correct'] >> i & 1)
+        count = counts.get(answer_id, 0)
+        answers.append([text, correct, count])
+        guessCount += count
+        if correct:
+            correctCount += count
+    return QuestionSummary(
+        gameSummary=summary, position=position, question=question['text'],
+        guessCount=guessCount, correctCount=correctCount, answers=answers)
+
+
+def archive_game(game, chunk_size=CHUNK_SIZE):
+    '''summarize the game and delete it, return its GameSummary'''
+    summary = summarize(game)
+    deletion.purge_game(game, chunk_size)
+    return summary
+
@@ -0,0 +1,180 @@
+"""Broadcast layer used to push game events to connected clients.
+
+Views publish a JSON-serializable message on a channel (one per game for
+the players, see game_channel, and one per game for the host lobby, see
+lobby_channel) and every subscriber of that channel receives it,
+so one state transition costs one publish whatever the number of players.
+
+The backend is chosen with settings.BROADCAST_BACKEND:
+
+- InProcessBroadcast delivers to the subscribers of the current process,
+  which is all that is needed when a single server process handles the
+  websockets of a game.
+- LocalClusterBroadcast is a stand-in for a shared backend (e.g. Redis
+  pub/sub) used to test several workers in one process: every instance
+  behaves as a separate worker and a message published on any of them
+  reaches the subscribers of all of them.
+
+A message reaches the subscribers of every worker when the backend is
+shared (shared = True) or when the site runs in a single worker process
+(settings.WEB_WORKERS), see reaches_every_worker; the lobby event stream
+of the host is only offered then (see services/streams.py).
+
+Subscriptions can be read both from threads (get) and from asyncio code
+(aget), because publishers are regular synchronous views.
+"""
+import asyncio
+import json
+import queue
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def game_channel(publicId):
+    return 'game:%s' % publicId
+
+
+def lobby_channel(publicId):
+    '''participants joining a game, for the host'''
+    return 'lobby:%s' % publicId
+
+
+class Subscription:
+    '''messages published on a channel since the subscription started'''
+
+    def __init__(self, broadcast, channel):
+        self.broadcast = broadcast
+        self.channel = channel
+        self._messages = queue.SimpleQueue()
+        self._loop = None
+        self._event = None
+
+    def put(self, message):
+        self._messages.put(message)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def get(self, timeout=None):
+        '''next message, raise queue.Empty after timeout seconds'''
+        return self._messages.get(timeout=timeout)
+
+    async def aget(self):
+        '''next message, from asyncio code'''
+        if self._loop is None:
+            self._event = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        while True:
+            self._event.clear()
+            try:
+                return self._messages.get_nowait()
+            except queue.Empty:
+                await self._event.wait()
+
+    def close(self):
+        self.broadcast.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BaseBroadcast:
+
+    # messages reach the subscribers of every worker process
+    shared = False
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+
+class InProcessBroadcast(BaseBroadcast):
+    '''fan-out to the subscribers of this process'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._channels.pop(subscription.channel, None)
+
+    def subscribers(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class LocalClusterBroadcast(InProcessBroadcast):
+    '''every instance is one worker, messages go through a shared hub'''
+
+    shared = True
+
+    # instances created without an explicit hub share this one
+    hub = []
+
+    def __init__(self, hub=None):
+        super().__init__()
+        if hub is not None:
+            self.hub = hub
+        self.hub.append(self)
+
+    def publish(self, channel, message):
+        # messages cross process boundaries in a real cluster
+        message = json.loads(json.dumps(message))
+        for worker in list(self.hub):
+            worker.deliver(channel, message)
+
+
+_broadcast = None
+_broadcast_lock = threading.Lock()
+
+
+def get_broadcast():
+    global _broadcast
+    if _broadcast is None:
+        with _broadcast_lock:
+            if _broadcast is None:
+                backend = getattr(settings, 'BROADCAST_BACKEND',
+                                  'models.broadcast.InProcessBroadcast')
+                _broadcast = import_string(backend)()
+    return _broadcast
+
+
+def publish(channel, message):
+    get_broadcast().publish(channel, message)
+
+
+def subscribe(channel):
+    return get_broadcast().subscribe(channel)
+
+
+def reaches_every_worker():
+    '''a message published by any request reaches every subscriber'''
+    return (get_broadcast().shared
+            or getattr(settings, 'WEB_WORKERS', 1) == 1)
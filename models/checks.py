@@ -0,0 +1,20 @@
+"""System checks of the deployment settings the game engine relies on."""
+from django.conf import settings
+from django.core import checks
+from . import gamestate
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    '''several workers with a per-process cache each keep their own game
+    contexts and versions, and only see a state change when their copy
+    expires'''
+    if gamestate.shared_cache():
+        return []
+    return [checks.Warning(
+        '%d workers (WEB_CONCURRENCY) share no cache.' %
+        settings.WEB_WORKERS,
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a cache shared by '
+             'every worker; until then game contexts and versions are '
+             'only kept %d seconds.' % gamestate.LOCAL_TIMEOUT,
+        id='models.W001')]
@@ -0,0 +1,59 @@
+"""Cache of the authoring pages and of the questionnaires games start from.
+
+Cached values are keyed by a version per questionnaire, per question and
+per user (the list of their questionnaires). models/signals.py bumps the
+versions whenever a Questionnaire, Question or Answer is saved or deleted,
+so a page is read from the database once per change, not once per render,
+and a stale value is never served: the old keys are simply not asked for
+again and expire.
+
+    contentcache.cached(QUESTIONNAIRE, questionnaire.id, 'questions',
+                        lambda: list(questionnaire.question_set.all()))
+"""
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+QUESTIONNAIRE = 'questionnaire'
+QUESTION = 'question'
+USER = 'user'
+
+# seconds a value may live in the cache, old versions are never read
+# again so this only bounds the memory they take
+CONTENT_TIMEOUT = 24 * 60 * 60
+
+
+def _version_key(kind, id):
+    return 'content:%s:%s:version' % (kind, id)
+
+
+def get_version(kind, id):
+    '''opaque token that changes every time the content changes'''
+    key = _version_key(kind, id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(kind, id):
+    cache.set(_version_key(kind, id), uuid.uuid4().hex, None)
+
+
+def bump(kind, id):
+    '''the content changed: new version now and again on commit, so a
+    page read between the change and the commit is not kept'''
+    _bump(kind, id)
+    transaction.on_commit(lambda: _bump(kind, id))
+
+
+def cached(kind, id, name, build):
+    '''the value called name of the content, build() when it is not in
+    the cache for the current version'''
+    key = 'content:%s:%s:%s:%s' % (kind, id, get_version(kind, id), name)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CONTENT_TIMEOUT)
+    return value
@@ -0,0 +1,137 @@
+"""Chunked deletion of questionnaires and games.
+
+Deleting a questionnaire or a game with Model.delete() lets Django's
+Collector load every related Participant and Guess into memory and delete
+them in a few huge statements, which locks the hot tables for as long as
+it takes. The functions here delete the dependents bottom-up instead:
+guesses, then participants, then the game, then the questions and answers
+with the questionnaire, at most chunk_size rows per transaction, so memory
+stays flat and no lock is held for long.
+
+delete_questionnaire and delete_game run the deletion right away when the
+questionnaire or game has at most settings.DELETE_INLINE_LIMIT guesses
+and participants, and in a background thread started when the current
+transaction commits otherwise. A questionnaire is marked pendingDeletion
+first, so it disappears from Questionnaire.objects at once; if the process
+dies before the thread is done, the purge command finishes the job.
+"""
+import logging
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from .constants import LEADERBOARD
+from .models import Questionnaire, Game, Participant, Guess
+from . import contentcache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+_threads = []
+_threads_lock = threading.Lock()
+
+
+def delete_in_chunks(queryset, chunk_size=CHUNK_SIZE, limit=None):
+    '''delete the rows of queryset chunk_size at a time, at most limit
+    rows if given, return how many'''
+    deleted = 0
+    while limit is None or deleted < limit:
+        size = chunk_size
+        if limit is not None:
+            size = min(size, limit - deleted)
+        ids = list(queryset.values_list('pk', flat=True)[:size])
+        if not ids:
+            break
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    return deleted
+
+
+def purge_game(game, chunk_size=CHUNK_SIZE):
+    '''delete the game, its guesses and its participants'''
+    delete_in_chunks(Guess.objects.filter(game=game).order_by(), chunk_size)
+    delete_in_chunks(Participant.objects.filter(game=game).order_by(),
+                     chunk_size)
+    game.delete()
+
+
+def purge_questionnaire(questionnaire, chunk_size=CHUNK_SIZE):
+    '''delete the questionnaire and everything that depends on it'''
+    for game in Game.objects.filter(questionnaire=questionnaire):
+        purge_game(game, chunk_size)
+    # only the questions and answers are left for the Collector
+    questionnaire.delete()
+
+
+def _is_large(games):
+    '''more than DELETE_INLINE_LIMIT rows depend on the games'''
+    limit = getattr(settings, 'DELETE_INLINE_LIMIT', 5000)
+    rows = Guess.objects.filter(game__in=games).values('id')[:limit + 1]
+    rows = rows.count()
+    if rows <= limit:
+        rows += Participant.objects.filter(game__in=games).values(
+            'id')[:limit + 1 - rows].count()
+    return rows > limit
+
+
+def _run(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('background deletion failed, run the purge '
+                         'command to finish it')
+    finally:
+        connection.close()
+
+
+def in_background(function, *args):
+    '''run function(*args) in a thread once the transaction commits'''
+
+    def start():
+        thread = threading.Thread(target=_run, args=(function,) + args,
+                                  daemon=True)
+        with _threads_lock:
+            _threads[:] = [alive for alive in _threads if alive.is_alive()]
+            _threads.append(thread)
+        thread.start()
+
+    transaction.on_commit(start)
+
+
+def wait(timeout=None):
+    '''wait for the background deletions of this process'''
+    with _threads_lock:
+        threads = list(_threads)
+    for thread in threads:
+        thread.join(timeout)
+
+
+def delete_questionnaire(questionnaire, chunk_size=CHUNK_SIZE):
+    '''hide the questionnaire and delete it, return True if the deletion
+    runs in the background'''
+    Questionnaire.all_objects.filter(pk=questionnaire.pk).update(
+        pendingDeletion=True)
+    questionnaire.pendingDeletion = True
+    # update() sends no signal, drop the cached pages by hand
+    contentcache.bump(contentcache.QUESTIONNAIRE, questionnaire.pk)
+    contentcache.bump(contentcache.USER, questionnaire.user_id)
+    if _is_large(Game.objects.filter(questionnaire=questionnaire)):
+        in_background(purge_questionnaire, questionnaire, chunk_size)
+        return True
+    purge_questionnaire(questionnaire, chunk_size)
+    return False
+
+
+def delete_game(game, chunk_size=CHUNK_SIZE):
+    '''delete the game, return True if the deletion runs in the
+    background'''
+    if _is_large(Game.objects.filter(pk=game.pk)):
+        if game.state != LEADERBOARD:
+            # the players see the game end until it is gone
+            game.state = LEADERBOARD
+            game.save(update_fields=['state', 'updated_at'])
+        in_background(purge_game, game, chunk_size)
+        return True
+    purge_game(game, chunk_size)
+    return False
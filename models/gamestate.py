@@ -0,0 +1,167 @@
+"""Cached per-game state used by the hot paths of a running game.
+
+Every guess needs to know which question the game is showing and which
+answers it offers. Instead of asking the database for that on every
+request, the resolved "game context" is kept in the cache, keyed by the
+game publicId, and thrown away whenever the game row changes (see
+models/signals.py), which is what happens each time GameCountdownView
+moves the game to its next state. Questions and answers come from the
+immutable snapshot of the game (see models/snapshot.py).
+
+The invalidation only reaches the workers that share the cache. With
+several workers (settings.WEB_WORKERS) and a per-process cache, the
+others keep their copy until it expires, so contexts and game versions
+(the ETag of the game API) then only live LOCAL_TIMEOUT seconds (see cache_timeout and models/checks.py).
+"""
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from .models import Game, Participant
+from . import snapshot
+
+# seconds a context may live in the cache, it is invalidated explicitly
+# on every state change so this is only a safety net
+CONTEXT_TIMEOUT = 60 * 60
+# seconds a context may live in a cache the other workers do not see,
+# i.e. how long they may go on with the previous question
+LOCAL_TIMEOUT = 2
+
+
+def shared_cache():
+    '''the cache seen by this worker is the one of every worker'''
+    return (getattr(settings, 'WEB_WORKERS', 1) == 1
+            or not isinstance(caches['default'], LocMemCache))
+
+
+def cache_timeout():
+    '''seconds an explicitly invalidated entry may live in the cache'''
+    return CONTEXT_TIMEOUT if shared_cache() else LOCAL_TIMEOUT
+
+
+def _context_key(publicId):
+    return 'game:%s:context' % publicId
+
+
+def _participant_key(uuidP):
+    return 'participant:%s' % uuidP
+
+
+def _version_key(publicId):
+    return 'game:%s:version' % publicId
+
+
+def _build_context(publicId):
+    '''read the game from the database and its current question from
+    the snapshot'''
+    game = Game.objects.filter(publicId=publicId).values(
+        'id', 'publicId', 'state', 'questionNo', 'questionnaire_id').first()
+    if game is None:
+        return None
+    question = None
+    game_snapshot = snapshot.get_snapshot(game['id'])
+    if game_snapshot is not None:
+        question = snapshot.get_question(game_snapshot, game['questionNo'])
+    answers = question['answers'] if question else ()
+    return {
+        'id': game['id'],
+        'publicId': game['publicId'],
+        'state': game['state'],
+        'questionNo': game['questionNo'],
+        'questionnaire': game['questionnaire_id'],
+        'question': question['id'] if question else None,
+        'questionText': question['text'] if question else None,
+        'answerTime': question['answerTime'] if question else None,
+        # (answer id, correct) in the order the players see them
+        'answers': tuple((id, bool(question['correct'] >> i & 1))
+                         for i, (id, _) in enumerate(answers)),
+        'answerTexts': tuple(text for _, text in answers),
+    }
+
+
+def get_game_context(publicId):
+    '''return the cached context of the game with this publicId,
+    or None if there is no such game'''
+    try:
+        publicId = int(publicId)
+    except (TypeError, ValueError):
+        return None
+    key = _context_key(publicId)
+    context = cache.get(key)
+    if context is None:
+        context = _build_context(publicId)
+        if context is None:
+            return None
+        cache.set(key, context, cache_timeout())
+    return context
+
+
+def question_message(context):
+    '''the question the players can answer, as pushed to their
+    websockets while the game is in the ANSWER state'''
+    return {
+        'question': context['questionText'],
+        'answerTime': context['answerTime'],
+        'answers': context['answerTexts'],
+    }
+
+
+def invalidate_game_context(publicId):
+    cache.delete(_context_key(publicId))
+
+
+def get_game_version(publicId):
+    '''opaque token that changes every time the game changes; only ask
+    for the version of a game that exists'''
+    key = _version_key(publicId)
+    version = cache.get(key)
+    if version is None:
+        # unknown, evicted or expired: start a new one, any cached
+        # payload or ETag of an older token becomes stale
+        cache.add(key, uuid.uuid4().hex, cache_timeout())
+        version = cache.get(key)
+    return version
+
+
+def peek_game_version(publicId):
+    '''the version of the game if it is in the cache, None otherwise'''
+    return cache.get(_version_key(publicId))
+
+
+def forget_game_version(publicId):
+    cache.delete(_version_key(publicId))
+
+
+def bump_game_version(publicId):
+    cache.set(_version_key(publicId), uuid.uuid4().hex, cache_timeout())
+
+
+def parse_uuid(value):
+    '''return value as a UUID, or None if it is not a valid one'''
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def get_participant(uuidP):
+    '''return {'id', 'game'} for the participant with this uuid,
+    or None if it does not exist'''
+    uuidP = parse_uuid(uuidP)
+    if uuidP is None:
+        return None
+    key = _participant_key(uuidP)
+    participant = cache.get(key)
+    if participant is None:
+        participant = Participant.objects.filter(uuidP=uuidP).values(
+            'id', 'game_id').first()
+        if participant is None:
+            return None
+        participant = {'id': participant['id'],
+                       'game': participant['game_id']}
+        cache.set(key, participant, CONTEXT_TIMEOUT)
+    return participant
+
+
+def invalidate_participant(uuidP):
+    cache.delete(_participant_key(uuidP))
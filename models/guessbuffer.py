@@ -0,0 +1,113 @@
+"""Write-behind buffer for guesses.
+
+When settings.GUESS_WRITE_BEHIND is on, GuessViewSet does not insert
+every guess as it arrives. Accepted guesses are checked against an
+in-memory record of who has already answered each question and kept
+here, and they are written with one bulk insert when the buffer reaches
+GUESS_BUFFER_SIZE guesses, when GUESS_BUFFER_INTERVAL seconds have passed
+since the last flush, or at the latest when GameCountdownView closes the
+question and needs the guesses to compute its statistics.
+
+The buffer lives in the memory of the process, so write-behind is meant
+for deployments where a game is served by a single worker process.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import IntegrityError
+from .models import Guess
+
+
+def enabled():
+    return getattr(settings, 'GUESS_WRITE_BEHIND', False)
+
+
+class GuessBuffer:
+    '''pending guesses and already answered questions, per game'''
+
+    def __init__(self):
+        # protects the dictionaries below
+        self._lock = threading.Lock()
+        # held while a flush writes to the database, so that a flush
+        # requested by GameCountdownView waits for any flush in progress
+        self._flush_lock = threading.Lock()
+        # game id -> list of pending guesses
+        self._pending = {}
+        # game id -> set of (participant id, question id) already answered
+        self._answered = {}
+        # game id -> question ids whose answers were read from the database
+        self._loaded = {}
+        # game id -> time of the last flush
+        self._flushed_at = {}
+
+    def _load_answered(self, game_id, question_id):
+        '''guesses stored before this process started also count'''
+        loaded = self._loaded.setdefault(game_id, set())
+        if question_id in loaded:
+            return
+        participant_ids = Guess.objects.filter(
+            game_id=game_id, question_id=question_id).values_list(
+            'participant_id', flat=True)
+        with self._lock:
+            answered = self._answered.setdefault(game_id, set())
+            answered.update((participant_id, question_id)
+                            for participant_id in participant_ids)
+            loaded.add(question_id)
+
+    def add(self, guess):
+        '''buffer the guess, return False if the participant has already
+        answered this question'''
+        game_id = guess.game_id
+        self._load_answered(game_id, guess.question_id)
+        now = time.monotonic()
+        with self._lock:
+            answered = self._answered.setdefault(game_id, set())
+            key = (guess.participant_id, guess.question_id)
+            if key in answered:
+                return False
+            answered.add(key)
+            pending = self._pending.setdefault(game_id, [])
+            pending.append(guess)
+            flushed_at = self._flushed_at.setdefault(game_id, now)
+            full = len(pending) >= getattr(
+                settings, 'GUESS_BUFFER_SIZE', 200)
+            due = now - flushed_at >= getattr(
+                settings, 'GUESS_BUFFER_INTERVAL', 1.0)
+        if full or due:
+            self.flush(game_id)
+        return True
+
+    def flush(self, game_id):
+        '''write the pending guesses of the game to the database,
+        return the number of guesses written'''
+        with self._flush_lock:
+            with self._lock:
+                guesses = self._pending.pop(game_id, [])
+                self._flushed_at[game_id] = time.monotonic()
+            if not guesses:
+                return 0
+            try:
+                Guess.objects.bulk_create_scored(guesses)
+            except IntegrityError:
+                # somebody else stored one of them, keep the rest
+                for guess in guesses:
+                    try:
+                        guess.save()
+                    except IntegrityError:
+                        pass
+            return len(guesses)
+
+    def discard(self, game_id):
+        '''forget everything about the game'''
+        with self._lock:
+            self._pending.pop(game_id, None)
+            self._answered.pop(game_id, None)
+            self._loaded.pop(game_id, None)
+            self._flushed_at.pop(game_id, None)
+
+    def pending(self, game_id):
+        with self._lock:
+            return len(self._pending.get(game_id, ()))
+
+
+buffer = GuessBuffer()
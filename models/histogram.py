@@ -0,0 +1,94 @@
+"""Answer histograms of the questions of a game.
+
+Every (game, question, answer) has a counter in the cache, incremented
+when a guess for it is committed (see models/signals.py), so that the
+distribution of the answers of a question is a single cache read instead
+of a scan of Guess. GameCountdownView sets the counters of a question to
+zero when it opens the question, before any guess can arrive.
+
+Counters are only trusted while the 'counted' key of their question is
+in the cache. When it is missing (evicted, or a question opened before a
+restart) the counters are rebuilt with one GROUP BY query, and when a
+counter is missing the 'counted' key is dropped so that the next read
+rebuilds them. With several worker processes the cache must be shared
+(settings.CACHES), like the game contexts.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+from .models import Guess
+
+# seconds the counters live in the cache
+HISTOGRAM_TIMEOUT = 60 * 60
+
+
+def _counted_key(game_id, question_id):
+    return 'game:%s:question:%s:counted' % (game_id, question_id)
+
+
+def _answer_key(game_id, question_id, answer_id):
+    return 'game:%s:question:%s:answer:%s' % (game_id, question_id,
+                                              answer_id)
+
+
+def _keys(game_id, question):
+    return [_answer_key(game_id, question['id'], answer_id)
+            for answer_id, _ in question['answers']]
+
+
+def _store(game_id, question, counts):
+    cache.set_many({key: counts.get(answer_id, 0) for key, (answer_id, _)
+                    in zip(_keys(game_id, question), question['answers'])},
+                   HISTOGRAM_TIMEOUT)
+    cache.set(_counted_key(game_id, question['id']), True,
+              HISTOGRAM_TIMEOUT)
+
+
+def open_question(game_id, question):
+    '''start counting the guesses of a snapshot question'''
+    _store(game_id, question, {})
+
+
+def recount(game_id, question):
+    '''read the counters of the question from the database'''
+    counts = dict(Guess.objects.filter(
+        game_id=game_id, question_id=question['id']).values_list(
+        'answer_id').annotate(count=Count('id')).order_by())
+    _store(game_id, question, counts)
+    return counts
+
+
+def add(game_id, counts):
+    '''counts: {(question id, answer id): new guesses}'''
+    for (question_id, answer_id), count in counts.items():
+        if not cache.get(_counted_key(game_id, question_id)):
+            # not counted yet, the next read counts them
+            continue
+        try:
+            cache.incr(_answer_key(game_id, question_id, answer_id), count)
+        except ValueError:
+            cache.delete(_counted_key(game_id, question_id))
+
+
+def distribution(game_id, question):
+    '''{'total', 'correct', 'answers': [{'id', 'answer', 'correct',
+    'count'}]} of a snapshot question, answers in the order the players
+    see them'''
+    keys = _keys(game_id, question)
+    values = cache.get_many(
+        keys + [_counted_key(game_id, question['id'])])
+    if len(values) == len(keys) + 1:
+        counts = {answer_id: values[key] for key, (answer_id, _)
+                  in zip(keys, question['answers'])}
+    else:
+        counts = recount(game_id, question)
+    answers = []
+    total = correct = 0
+    for i, (answer_id, text) in enumerate(question['answers']):
+        is_correct = bool(question['correct'] >> i & 1)
+        count = counts.get(answer_id, 0)
+        answers.append({'id': answer_id, 'answer': text,
+                        'correct': is_correct, 'count': count})
+        total += count
+        if is_correct:
+            correct += count
+    return {'total': total, 'correct': correct, 'answers': answers}
@@ -0,0 +1,54 @@
+# Archive finished and abandoned games
+#
+# execute python manage.py archivegames [--finished-after 60]
+#                                       [--stale-after 24] [--chunk-size 1000]
+#                                       [--limit 100] [--dry-run]
+#
+# Games on the leaderboard for --finished-after minutes and games in any
+# other state that have not moved for --stale-after hours are compacted
+# into GameSummary and QuestionSummary rows, then their participants and
+# guesses are deleted --chunk-size rows at a time (see models/archive.py).
+# Meant to run periodically, e.g. from cron.
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from models import archive
+
+
+class Command(BaseCommand):
+    help = """summarize and delete finished and abandoned games
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--finished-after', type=float, default=60,
+                            help='minutes a game stays on the leaderboard')
+        parser.add_argument('--stale-after', type=float, default=24,
+                            help='hours before an abandoned game is archived')
+        parser.add_argument('--chunk-size', type=int,
+                            default=archive.CHUNK_SIZE,
+                            help='rows deleted per transaction')
+        parser.add_argument('--limit', type=int,
+                            help='archive at most this many games')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only list the games')
+
+    def handle(self, *args, **options):
+        games = archive.archivable(
+            timedelta(minutes=options['finished_after']),
+            timedelta(hours=options['stale_after'])).select_related(
+            'questionnaire')
+        if options['limit'] is not None:
+            games = games[:options['limit']]
+        archived = 0
+        for game in games.iterator():
+            if options['dry_run']:
+                self.stdout.write('%d %s (state %d, %s)' % (
+                    game.publicId, game.questionnaire.title, game.state,
+                    game.updated_at))
+                continue
+            summary = archive.archive_game(game, options['chunk_size'])
+            archived += 1
+            self.stdout.write('%d %s: %d participants' % (
+                summary.publicId, summary.title, summary.participantCount))
+        if not options['dry_run']:
+            self.stdout.write('%d games archived' % archived)
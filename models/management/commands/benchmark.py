@@ -0,0 +1,237 @@
+# Benchmark the hot paths of the game engine
+#
+# execute python manage.py benchmark [--scales 10 100 1000] [--repeat 10]
+#                                    [--save | --compare] [--tolerance 0.25]
+#
+# Every scale creates a questionnaire and a game with that many
+# participants (and up to 100 questions) inside a transaction that is
+# rolled back at the end, so the database is left as it was. Requests go
+# through the Django test client, so the numbers are those of the views
+# and middleware without the network.
+#
+# For every benchmark the median time and the number of queries are
+# reported. --save stores them in the baseline file (BASELINE, kept in the
+# repository) and --compare fails when a benchmark runs more queries than
+# the baseline or is slower than the baseline by more than --tolerance.
+# Times are only comparable on the same machine and database, record a
+# new baseline with --save when either changes; --compare refuses a
+# baseline recorded on another database vendor.
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from kahootclone.querycount import QueryCounter
+from models.models import User, Questionnaire, Question, Answer
+from models.models import Game, Participant, Guess, normalize_alias
+from models import gamestate
+import models.constants as constants
+
+BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+# the benchmarks measure the views, not the throttles
+UNTHROTTLED = {'participant': (10 ** 9, 10 ** 9), 'ip': (10 ** 9, 10 ** 9)}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = """time the game engine hot paths, compare with a baseline
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+',
+                            default=[10, 100, 1000],
+                            help='number of participants of the game')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='runs of every benchmark, the median counts')
+        parser.add_argument('--baseline', default=BASELINE)
+        parser.add_argument('--output', help='also write the results here')
+        parser.add_argument('--save', action='store_true',
+                            help='store the results as the new baseline')
+        parser.add_argument('--compare', action='store_true',
+                            help='fail on regressions against the baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed slowdown, 0.25 is 25%%')
+        parser.add_argument('--min-ms', type=float, default=2.0,
+                            help='ignore slowdowns smaller than this')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        results = {'vendor': connection.vendor, 'repeat': self.repeat,
+                   'scales': {}}
+        self.stdout.write('%8s %-22s %10s %8s' % (
+            'scale', 'benchmark', 'median ms', 'queries'))
+        for scale in options['scales']:
+            results['scales'][str(scale)] = self.run_scale(scale)
+        for path in (options['output'],
+                     options['baseline'] if options['save'] else None):
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)),
+                            exist_ok=True)
+                with open(path, 'w') as output:
+                    json.dump(results, output, indent=2, sort_keys=True)
+                    output.write('\n')
+        if options['compare']:
+            self.compare(results, options['baseline'], options['tolerance'],
+                         options['min_ms'])
+
+    def run_scale(self, scale):
+        self.results = {}
+        self.publicIds = []
+        try:
+            with transaction.atomic(), override_settings(
+                    API_THROTTLES=UNTHROTTLED,
+                    ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+                self.populate(scale)
+                self.benchmarks()
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            # the game ids and pins will be used again after the rollback
+            for publicId in self.publicIds:
+                gamestate.invalidate_game_context(publicId)
+                gamestate.bump_game_version(publicId)
+        for name, (ms, queries) in self.results.items():
+            self.stdout.write('%8d %-22s %10.2f %8d' % (
+                scale, name, ms, queries))
+        return {name: {'ms': round(ms, 3), 'queries': queries}
+                for name, (ms, queries) in self.results.items()}
+
+    def populate(self, scale):
+        '''a game with scale participants, every one of them has answered
+        the second question; repeat more have not answered anything'''
+        user, _ = User.objects.get_or_create(username='benchmark')
+        self.questionnaire = Questionnaire.objects.create(
+            title='benchmark', user=user)
+        for number in range(max(2, min(scale, 100))):
+            question = Question.objects.create(
+                question='question %03d' % number,
+                questionnaire=self.questionnaire)
+            Answer.objects.bulk_create(
+                Answer(answer='answer %d' % i, question=question,
+                       correct=i == 0, position=i + 1) for i in range(4))
+        self.host = Client()
+        self.host.force_login(user)
+        response = self.host.get(
+            reverse('game-create', args=[self.questionnaire.id]))
+        if response.status_code != 200:
+            raise CommandError('game-create failed with %d' %
+                               response.status_code)
+        self.game = Game.objects.get(questionnaire=self.questionnaire)
+        self.publicIds.append(self.game.publicId)
+        aliases = ['alias_%d' % i for i in range(scale + self.repeat)]
+        Participant.objects.bulk_create(
+            [Participant(game=self.game, alias=alias, points=i,
+                         normalizedAlias=normalize_alias(alias))
+             for i, alias in enumerate(aliases)], batch_size=5000)
+        participants = list(Participant.objects.filter(
+            game=self.game).order_by('id'))
+        self.fresh = participants[scale:]
+        question = self.question(2)
+        answers = list(question.answer_set.all())
+        Guess.objects.bulk_create(
+            [Guess(participant=participant, game=self.game,
+                   question=question, answer=answers[i % len(answers)])
+             for i, participant in enumerate(participants[:scale])],
+            batch_size=5000)
+
+    def question(self, questionNo):
+        '''the question shown when the game has questionNo questions left'''
+        return Question.objects.get(
+            questionnaire=self.questionnaire, position=questionNo)
+
+    def set_state(self, state, questionNo):
+        self.game.state = state
+        self.game.questionNo = questionNo
+        self.game.save()
+
+    def measure(self, name, request, setup=None):
+        times = []
+        counter = QueryCounter()
+        for run in range(self.repeat):
+            if setup:
+                setup()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = request(run)
+                times.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise CommandError('%s failed with %d' % (
+                    name, response.status_code))
+        self.results[name] = (statistics.median(times) * 1000,
+                              counter.count)
+
+    def benchmarks(self):
+        game = self.game
+        player = Client()
+        countdown = reverse('game-count-down')
+
+        self.measure(
+            'join', lambda run: player.post(
+                reverse('participant-list'),
+                {'game': game.publicId, 'alias': 'joining_%d' % run}),
+            lambda: self.set_state(constants.WAITING, game.questionNo))
+        self.measure(
+            'guess', lambda run: player.post(
+                reverse('guess-list'),
+                {'game': game.publicId, 'uuidp': self.fresh[run].uuidP,
+                 'answer': 1}),
+            lambda: self.set_state(constants.QUESTION, 1))
+        self.measure(
+            'countdown:waiting', lambda run: self.host.get(countdown),
+            lambda: self.set_state(constants.WAITING, 2))
+        self.measure(
+            'countdown:question', lambda run: self.host.get(countdown),
+            lambda: self.set_state(constants.QUESTION, 2))
+        self.measure(
+            'countdown:answer', lambda run: self.host.get(countdown),
+            lambda: self.set_state(constants.ANSWER, 2))
+        self.measure(
+            'countdown:leaderboard', lambda run: self.host.get(countdown),
+            lambda: self.set_state(constants.LEADERBOARD, 0))
+        self.measure(
+            'questionnaire-detail', lambda run: self.host.get(reverse(
+                'questionnaire-detail', args=[self.questionnaire.id])))
+
+    def compare(self, results, path, tolerance, min_ms):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            raise CommandError('There is no baseline at %s, '
+                               'record one with --save.' % path)
+        # query plans and times of another database say nothing
+        if baseline.get('vendor') != results['vendor']:
+            raise CommandError(
+                'The baseline at %s was recorded on %s, not %s; record '
+                'one on this database with --save.' % (
+                    path, baseline.get('vendor'), results['vendor']))
+        regressions = []
+        for scale, benchmarks in results['scales'].items():
+            for name, result in benchmarks.items():
+                base = baseline['scales'].get(scale, {}).get(name)
+                if base is None:
+                    continue
+                if result['queries'] > base['queries']:
+                    regressions.append('%s %s: %d queries, baseline %d' % (
+                        scale, name, result['queries'], base['queries']))
+                if (result['ms'] > base['ms'] * (1 + tolerance)
+                        and result['ms'] - base['ms'] > min_ms):
+                    regressions.append('%s %s: %.2f ms, baseline %.2f' % (
+                        scale, name, result['ms'], base['ms']))
+        for regression in regressions:
+            self.stdout.write('REGRESSION %s' % regression)
+        if regressions:
+            raise CommandError('%d regressions against %s' % (
+                len(regressions), path))
+        self.stdout.write('No regressions against %s' % path)
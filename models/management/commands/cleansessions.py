@@ -0,0 +1,42 @@
+# Delete expired sessions, a bounded amount of work per run
+#
+# execute python manage.py cleansessions [--chunk-size 1000]
+#                                        [--max-rows 100000]
+#
+# Unlike Django's clearsessions, which deletes every expired row in one
+# statement, expired rows of the database session backends (db and
+# cached_db) are deleted --chunk-size at a time and at most --max-rows per
+# run, so the job never locks django_session for long; run it often (e.g.
+# from cron) to keep up. The cache backend expires its sessions itself
+# and signed cookies are not stored at all, for them there is nothing to
+# do.
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from models import deletion
+
+
+class Command(BaseCommand):
+    help = """delete expired sessions in bounded chunks
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            default=deletion.CHUNK_SIZE,
+                            help='rows deleted per transaction')
+        parser.add_argument('--max-rows', type=int, default=100000,
+                            help='rows deleted at most by this run')
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            self.stdout.write('%s does not keep expired sessions' %
+                              settings.SESSION_ENGINE)
+            return
+        expired = store.get_model_class().objects.filter(
+            expire_date__lt=timezone.now()).order_by()
+        deleted = deletion.delete_in_chunks(
+            expired, options['chunk_size'], options['max_rows'])
+        self.stdout.write('%d expired sessions deleted' % deleted)
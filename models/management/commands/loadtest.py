@@ -0,0 +1,287 @@
+# Simulate a classroom game against a running server
+#
+# execute python manage.py loadtest [--url http://127.0.0.1:8000]
+#                                   [--players 500] [--questions 5]
+#
+# A questionnaire owned by a new user named loadtest-<random hex> is
+# created in the database used by the server, a simulated host logs in
+# (the session is created directly in the session store) and drives
+# GameCountdownView while every simulated player, one thread each, joins
+# through /api/participant/, polls /api/games/<publicId>/ with
+# If-None-Match like the real client and answers every question through
+# /api/guess/. At the end the latency percentiles and the throughput of
+# every endpoint are reported. The user (with its questionnaire and game)
+# and the session are deleted at the end, unless --keep; nothing the
+# command did not create is touched.
+#
+# Only servers listening on a loopback address are accepted. The throttles
+# of the server (settings.API_THROTTLES) see every player coming from the
+# same address, raise the 'ip' limits to measure the server and not them.
+import ipaddress
+import json
+import math
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth import SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from models.models import User, Questionnaire, Question, Answer, Game
+import models.constants as constants
+
+# prefix of the name of the user created for every run
+USERNAME = 'loadtest'
+
+
+def percentile(values, p):
+    '''nearest-rank percentile of the sorted list values'''
+    if not values:
+        return 0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def check_local(url):
+    '''raise CommandError unless url points to this machine'''
+    host = urlsplit(url).hostname
+    try:
+        address = ipaddress.ip_address(socket.gethostbyname(host or ''))
+    except (socket.gaierror, ValueError):
+        raise CommandError('Cannot resolve %s.' % url)
+    if not address.is_loopback:
+        raise CommandError(
+            'loadtest only runs against a local server, %s is %s.' % (
+                host, address))
+
+
+class Recorder:
+    '''latency and status of every request, per endpoint'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+
+    def add(self, endpoint, latency, status):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            statuses = self.statuses.setdefault(endpoint, {})
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+class Client:
+    '''urllib requests timed into a Recorder'''
+
+    def __init__(self, url, recorder, timeout, cookie=None):
+        self.url = url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookie = cookie
+
+    def request(self, endpoint, path, data=None, headers=None):
+        '''return (status, headers, decoded json body or None)'''
+        headers = dict(headers or {})
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        request = urllib.request.Request(
+            self.url + path, data=body, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(
+                    request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+                response_headers = response.headers
+        except urllib.error.HTTPError as error:
+            status, content = error.code, error.read()
+            response_headers = error.headers
+        except OSError:
+            # refused, reset or timed out
+            status, content, response_headers = 'error', b'', {}
+        self.recorder.add(endpoint, time.perf_counter() - start, status)
+        try:
+            content = json.loads(content)
+        except ValueError:
+            content = None
+        return status, response_headers, content
+
+
+class Player(threading.Thread):
+    '''join, poll the game and answer every question once'''
+
+    def __init__(self, command, number):
+        super().__init__(daemon=True)
+        self.command = command
+        self.alias = 'player_%d' % number
+        self.joined = False
+
+    def run(self):
+        command = self.command
+        client = Client(command.url, command.recorder, command.timeout)
+        status, _, data = client.request(
+            'join', '/api/participant/',
+            {'game': command.publicId, 'alias': self.alias})
+        command.joins.release()
+        if status != 201:
+            return
+        self.joined = True
+        uuidp = data['uuidP']
+        path = '/api/games/%d/' % command.publicId
+        etag = None
+        answered = None
+        while not command.stop.is_set():
+            headers = {'If-None-Match': etag} if etag else {}
+            status, response_headers, data = client.request(
+                'poll', path, headers=headers)
+            if status == 200:
+                etag = response_headers.get('ETag')
+                state, questionNo = data['state'], data['questionNo']
+                if state == constants.LEADERBOARD:
+                    return
+                if (state in (constants.QUESTION, constants.ANSWER)
+                        and questionNo != answered):
+                    time.sleep(random.uniform(0, command.think_time))
+                    client.request('guess', '/api/guess/', {
+                        'game': command.publicId, 'uuidp': uuidp,
+                        'answer': random.randint(1, command.answers)})
+                    answered = questionNo
+            command.stop.wait(
+                command.poll_interval * random.uniform(0.5, 1.5))
+
+
+class Command(BaseCommand):
+    help = """simulate a game with many players against a local server
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='server to test, must be local')
+        parser.add_argument('--players', type=int, default=100)
+        parser.add_argument('--questions', type=int, default=3)
+        parser.add_argument('--answers', type=int, default=4,
+                            help='answers per question')
+        parser.add_argument('--question-time', type=float, default=3.0,
+                            help='seconds the host spends on every screen')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='average seconds between two polls')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='maximum seconds before answering')
+        parser.add_argument('--join-time', type=float, default=30.0,
+                            help='maximum seconds to wait for the joins')
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help='timeout of every request')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the questionnaire and the game')
+
+    def handle(self, *args, **options):
+        check_local(options['url'])
+        self.url = options['url']
+        self.answers = options['answers']
+        self.question_time = options['question_time']
+        self.poll_interval = options['poll_interval']
+        self.think_time = min(options['think_time'], self.question_time)
+        self.timeout = options['timeout']
+        self.recorder = Recorder()
+        self.stop = threading.Event()
+        self.joins = threading.Semaphore(0)
+
+        user = self.create_questionnaire(options['questions'])
+        session = None
+        try:
+            session = self.login(user)
+            host = Client(self.url, self.recorder, self.timeout,
+                          cookie='%s=%s' % (settings.SESSION_COOKIE_NAME,
+                                            session.session_key))
+            status, _, _ = host.request(
+                'create', '/services/gamecreate/%d' % self.questionnaire.id)
+            if status != 200:
+                raise CommandError('Cannot create the game (%s).' % status)
+            game = Game.objects.get(questionnaire=self.questionnaire)
+            self.publicId = game.publicId
+            start = time.perf_counter()
+            players = [Player(self, number)
+                       for number in range(options['players'])]
+            for player in players:
+                player.start()
+            deadline = time.monotonic() + options['join_time']
+            for _ in players:
+                if not self.joins.acquire(
+                        timeout=max(0, deadline - time.monotonic())):
+                    break
+            self.drive(host, game)
+            self.stop.set()
+            for player in players:
+                player.join(self.timeout)
+            elapsed = time.perf_counter() - start
+            self.report(elapsed, sum(player.joined for player in players),
+                        len(players))
+        finally:
+            self.stop.set()
+            if not options['keep']:
+                if session is not None:
+                    session.delete()
+                user.delete()
+
+    def create_questionnaire(self, questions):
+        # a user of its own, so that deleting it never takes a real one
+        user = User.objects.create_user(
+            username='%s-%s' % (USERNAME, uuid.uuid4().hex[:12]))
+        self.questionnaire = Questionnaire.objects.create(
+            title='loadtest', user=user)
+        for number in range(questions):
+            question = Question.objects.create(
+                question='question %03d' % number,
+                questionnaire=self.questionnaire,
+                answerTime=max(1, round(self.question_time)))
+            Answer.objects.bulk_create(
+                Answer(answer='answer %d' % i, question=question,
+                       correct=i == 0, position=i + 1)
+                for i in range(self.answers))
+        return user
+
+    def login(self, user):
+        '''new session logged in as user'''
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = \
+            'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session
+
+    def drive(self, host, game):
+        '''move the game from screen to screen until the leaderboard'''
+        while game.state != constants.LEADERBOARD:
+            status, _, _ = host.request(
+                'countdown', '/services/gamecountdown/')
+            if status != 200:
+                raise CommandError('GameCountdownView failed (%s).' % status)
+            time.sleep(self.question_time)
+            game.refresh_from_db(fields=['state'])
+
+    def report(self, elapsed, joined, players):
+        self.stdout.write('%d of %d players joined, %.1f s' % (
+            joined, players, elapsed))
+        self.stdout.write('%-10s %8s %8s %8s %8s %8s  %s' % (
+            'endpoint', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+            'statuses'))
+        for endpoint in ('join', 'poll', 'guess', 'create', 'countdown'):
+            latencies = sorted(self.recorder.latencies.get(endpoint, ()))
+            statuses = self.recorder.statuses.get(endpoint, {})
+            self.stdout.write('%-10s %8d %8.1f %8.1f %8.1f %8.1f  %s' % (
+                endpoint, len(latencies), len(latencies) / elapsed,
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000,
+                ' '.join('%s:%d' % item for item in sorted(
+                    statuses.items(), key=lambda item: str(item[0])))))
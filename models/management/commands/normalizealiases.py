@@ -0,0 +1,59 @@
+# Fill the normalized alias of the participants stored before it existed
+#
+# execute python manage.py normalizealiases [--chunk-size 1000]
+#
+# Participant.normalizedAlias was added as a nullable column, so the
+# unique_alias_per_game constraint (which does not compare NULLs) can be
+# created on a table that already has participants. This command sets it
+# to normalize_alias(alias) for every participant that has none. Games
+# where two participants already share a normalized alias keep it for the
+# first one to join; the later ones get '<normalized alias>#<id>', their
+# alias as shown to the players does not change. Run it once after
+# make update_models; running it again does nothing.
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from models.models import Participant, normalize_alias
+
+
+class Command(BaseCommand):
+    help = """fill the normalized alias of the older participants
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='games handled per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        games = list(Participant.objects.filter(
+            normalizedAlias__isnull=True).order_by('game_id').values_list(
+            'game_id', flat=True).distinct())
+        filled = renamed = 0
+        for start in range(0, len(games), chunk_size):
+            chunk = games[start:start + chunk_size]
+            with transaction.atomic():
+                participants = list(
+                    Participant.objects.select_for_update().filter(
+                        game_id__in=chunk).order_by('game_id', 'pk').only(
+                        'pk', 'game_id', 'alias', 'normalizedAlias'))
+                # the aliases already taken, including those of the
+                # participants that joined after the column was added
+                taken = {(participant.game_id, participant.normalizedAlias)
+                         for participant in participants
+                         if participant.normalizedAlias is not None}
+                rows = []
+                for participant in participants:
+                    if participant.normalizedAlias is not None:
+                        continue
+                    value = normalize_alias(participant.alias)
+                    if (participant.game_id, value) in taken:
+                        value = '%s#%d' % (value, participant.pk)
+                        renamed += 1
+                    taken.add((participant.game_id, value))
+                    participant.normalizedAlias = value
+                    rows.append(participant)
+                Participant.objects.bulk_update(
+                    rows, ['normalizedAlias'], batch_size=chunk_size)
+                filled += len(rows)
+        self.stdout.write('%d aliases normalized, %d duplicates kept apart'
+                          % (filled, renamed))
@@ -0,0 +1,56 @@
+# Number the questions and answers stored before they had a position
+#
+# execute python manage.py numberpositions [--chunk-size 1000]
+#
+# Question.position and Answer.position were added with default 0. Every
+# questionnaire (question) that still has a question (answer) at position
+# 0 gets its questions (answers) numbered 1..n in the order they were
+# shown in before positions existed: questions were ordered by their text
+# (Question.Meta.ordering was ['question']), answers had no ordering and
+# came back in the order they were stored, i.e. by pk. Run it once after
+# make update_models; running it again does nothing.
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from models.models import Question, Answer
+
+
+class Command(BaseCommand):
+    help = """number the questions and answers that have no position
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='parents numbered per transaction')
+
+    def number(self, model, order, chunk_size):
+        '''number the rows of every parent with an unnumbered row in the
+        order of the fields order, return how many parents'''
+        parent_id = model.parent_field + '_id'
+        parents = list(model.objects.filter(position=0).order_by(
+            parent_id).values_list(parent_id, flat=True).distinct())
+        for start in range(0, len(parents), chunk_size):
+            chunk = parents[start:start + chunk_size]
+            rows = []
+            with transaction.atomic():
+                position = 0
+                last_parent = None
+                for row in model.objects.filter(
+                        **{parent_id + '__in': chunk}).order_by(
+                        parent_id, *order).only('pk', parent_id):
+                    if getattr(row, parent_id) != last_parent:
+                        last_parent = getattr(row, parent_id)
+                        position = 0
+                    position += 1
+                    row.position = position
+                    rows.append(row)
+                model.objects.bulk_update(rows, ['position'],
+                                          batch_size=chunk_size)
+        return len(parents)
+
+    def handle(self, *args, **options):
+        questionnaires = self.number(Question, ['question', 'pk'],
+                                     options['chunk_size'])
+        questions = self.number(Answer, ['pk'], options['chunk_size'])
+        self.stdout.write('questions of %d questionnaires and answers of '
+                          '%d questions numbered' % (questionnaires,
+                                                     questions))
@@ -0,0 +1,31 @@
+# Finish the deletion of removed questionnaires
+#
+# execute python manage.py purge [--chunk-size 1000]
+#
+# Questionnaires removed by their authors are marked pendingDeletion and
+# deleted in chunks, by a background thread when they are large (see
+# models/deletion.py). If the process died before the thread was done the
+# questionnaire stays hidden but its rows are still there; this command
+# deletes them.
+from django.core.management.base import BaseCommand
+from models.models import Questionnaire
+from models import deletion
+
+
+class Command(BaseCommand):
+    help = """delete the questionnaires marked for deletion
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int,
+                            default=deletion.CHUNK_SIZE,
+                            help='rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        purged = 0
+        for questionnaire in list(Questionnaire.all_objects.filter(
+                pendingDeletion=True)):
+            deletion.purge_questionnaire(questionnaire,
+                                         options['chunk_size'])
+            purged += 1
+        self.stdout.write('%d questionnaires purged' % purged)
@@ -1,8 +1,14 @@
-from random import randint
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max
+from django.dispatch import Signal
+from django.utils import timezone
 import uuid
 from .constants import WAITING, QUESTION, ANSWER, LEADERBOARD
+from .pins import PIN_SPACE, permute
 
 
 # Create your models here.
@@ -12,12 +18,24 @@ class User(AbstractUser):
     pass
 
 
+class QuestionnaireManager(models.Manager):
+    '''questionnaires that are not being deleted'''
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pendingDeletion=False)
+
+
 class Questionnaire(models.Model):
     '''Questionnaire model'''
     title = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # removed by its author, its rows are being deleted (models/deletion.py)
+    pendingDeletion = models.BooleanField(default=False, editable=False)
+
+    objects = QuestionnaireManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
@@ -26,26 +44,105 @@ class Questionnaire(models.Model):
         ordering = ['title']
 
 
-class Question(models.Model):
+class PositionMixin:
+    '''1-based position of an instance among the instances with the same
+    parent_field: new ones go last, deleting one with delete() closes the
+    gap and move_to reorders them. Instances created with bulk_create must
+    be given their position; rows deleted along with their parent, or by
+    QuerySet.delete(), leave the positions of the rest alone.'''
+    parent_field = None
+
+    def siblings(self):
+        parent_id = self.parent_field + '_id'
+        return type(self)._default_manager.filter(
+            **{parent_id: getattr(self, parent_id)})
+
+    def lock_siblings(self):
+        '''concurrent changes to the positions of a parent wait for each
+        other (inside a transaction)'''
+        parent = self._meta.get_field(self.parent_field).related_model
+        list(parent.objects.select_for_update().filter(
+            pk=getattr(self, self.parent_field + '_id')).values_list('pk'))
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.position:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.lock_siblings()
+            last = self.siblings().aggregate(last=Max('position'))['last']
+            self.position = (last or 0) + 1
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.lock_siblings()
+            deleted = super().delete(*args, **kwargs)
+            # positions stay 1..n, so question k is the one with position k
+            self.siblings().filter(position__gt=self.position).update(
+                position=F('position') - 1)
+        return deleted
+
+    def move_to(self, position):
+        '''move the instance to position, shifting the siblings between
+        the old and the new position'''
+        with transaction.atomic():
+            self.lock_siblings()
+            position = max(1, min(position, self.siblings().count()))
+            siblings = self.siblings().exclude(pk=self.pk)
+            if position < self.position:
+                siblings.filter(position__gte=position,
+                                position__lt=self.position).update(
+                    position=F('position') + 1)
+            elif position > self.position:
+                siblings.filter(position__gt=self.position,
+                                position__lte=position).update(
+                    position=F('position') - 1)
+            self.position = position
+            self.save(update_fields=['position'])
+
+
+class Question(PositionMixin, models.Model):
     '''Question model'''
     question = models.CharField(max_length=255)
     questionnaire = models.ForeignKey(Questionnaire, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     answerTime = models.IntegerField(default=10)
+    # GameCountdownView shows the question with position == questionNo
+    position = models.PositiveIntegerField(default=0, editable=False)
+
+    parent_field = 'questionnaire'
 
     class Meta():
-        ordering = ['question']
+        ordering = ['position']
+        indexes = [
+            models.Index(fields=['questionnaire', 'position'],
+                         name='question_position_idx'),
+        ]
 
     def __str__(self):
         return self.question
 
 
-class Answer(models.Model):
+class Answer(PositionMixin, models.Model):
     '''Answer model'''
     answer = models.CharField(max_length=255)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     correct = models.BooleanField(default=False)
+    # players choose the answer by its position
+    position = models.PositiveIntegerField(default=0, editable=False)
+
+    parent_field = 'question'
+
+    class Meta():
+        ordering = ['position']
+        indexes = [
+            # the correct answer of a question
+            models.Index(fields=['question', 'correct'],
+                         name='answer_question_correct_idx'),
+            models.Index(fields=['question', 'position'],
+                         name='answer_position_idx'),
+        ]
 
     def __str__(self):
         return self.answer
@@ -63,30 +160,199 @@ class Game(models.Model):
 
     questionnaire = models.ForeignKey(Questionnaire, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # every state transition saves the game, see archivegames
+    updated_at = models.DateTimeField(auto_now=True)
     state = models.PositiveIntegerField(default=1, choices=CHOICES)
     publicId = models.IntegerField(unique=True)
     countdownTime = models.IntegerField(default=10)
     questionNo = models.IntegerField(default=0)
+    # questions and answers as they were when the game started,
+    # see models/snapshot.py
+    snapshot = models.JSONField(null=True, editable=False)
 
     def __str__(self):
         return str(self.publicId) + " " + str(self.state)
 
     def save(self, *args, **kwargs):
         if self.publicId is None:
-            self.publicId = randint(1, 10**6)
+            self.publicId = PinCounter.objects.allocate()
         super(Game, self).save(*args, **kwargs)
 
+    class Meta():
+        indexes = [
+            # games waiting to be archived
+            models.Index(fields=['state', 'updated_at'],
+                         name='game_state_updated_idx'),
+        ]
+
+
+class PinsExhausted(Exception):
+    '''every game PIN is in use'''
+
+
+class PinManager(models.Manager):
+    '''allocator of unused game PINs: the pins of deleted games once they
+    have rested settings.GAME_PIN_REUSE_DELAY seconds, then the next
+    values of a permutation of 1..PIN_SPACE (see models/pins.py).
+    Concurrent allocations never get the same PIN: the counter row and
+    the recycled pins are locked until the allocation commits.'''
+
+    # PINs checked against the existing games in one query
+    CHECK_SIZE = 900
+
+    def allocate(self):
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count):
+        '''return count unused PINs, raise PinsExhausted'''
+        pins = []
+        with transaction.atomic():
+            pins.extend(self._take_free(count))
+            while len(pins) < count:
+                pins.extend(self._take_new(count - len(pins)))
+            # games created before the allocator (or with an explicit
+            # publicId) may hold some of them, skip those
+            taken = self._taken(pins)
+            while taken:
+                pins = [pin for pin in pins if pin not in taken]
+                more = self._take_new(count - len(pins))
+                taken = self._taken(more)
+                pins.extend(more)
+        return pins
+
+    def release(self, pins):
+        '''make the pins of deleted games available again'''
+        FreePin.objects.bulk_create(
+            [FreePin(pin=pin) for pin in pins], ignore_conflicts=True)
+
+    def _take_free(self, count):
+        rested = timezone.now() - timedelta(
+            seconds=getattr(settings, 'GAME_PIN_REUSE_DELAY', 3600))
+        free = list(FreePin.objects.select_for_update(
+            skip_locked=True).filter(freedAt__lte=rested).order_by(
+            'freedAt').values_list('id', 'pin')[:count])
+        FreePin.objects.filter(id__in=[id for id, _ in free]).delete()
+        return [pin for _, pin in free]
+
+    def _take_new(self, count):
+        counter, _ = self.select_for_update().get_or_create(pk=1)
+        start = counter.value
+        if start >= PIN_SPACE:
+            raise PinsExhausted()
+        count = min(count, PIN_SPACE - start)
+        counter.value = start + count
+        counter.save(update_fields=['value'])
+        return [permute(n) + 1 for n in range(start, start + count)]
+
+    def _taken(self, pins):
+        taken = set()
+        for i in range(0, len(pins), self.CHECK_SIZE):
+            taken.update(Game.objects.filter(
+                publicId__in=pins[i:i + self.CHECK_SIZE]).values_list(
+                'publicId', flat=True))
+        return taken
+
+
+class PinCounter(models.Model):
+    '''number of PINs handed out from the permutation, a single row'''
+    value = models.BigIntegerField(default=0)
+
+    objects = PinManager()
+
+
+class FreePin(models.Model):
+    '''PIN of a deleted game'''
+    pin = models.IntegerField(unique=True)
+    freedAt = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+def normalize_alias(alias):
+    '''aliases that only differ in case or spacing are the same'''
+    return ' '.join(alias.split()).casefold()
+
 
 class Participant(models.Model):
     '''Participant model'''
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     alias = models.CharField(max_length=25)
+    # normalize_alias(alias), unique within a game; null only for the
+    # participants stored before it existed, see normalizealiases
+    normalizedAlias = models.CharField(max_length=100, null=True,
+                                       editable=False)
     points = models.IntegerField(default=0)
-    uuidP = models.UUIDField(default=uuid.uuid4, editable=False)
+    # every guess looks the participant up by its uuid
+    uuidP = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+
+    class Meta():
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'normalizedAlias'],
+                                    name='unique_alias_per_game'),
+        ]
+        indexes = [
+            # keyset pagination of the participants of a game
+            models.Index(fields=['game', 'id'],
+                         name='participant_game_id_idx'),
+            models.Index(fields=['game', 'alias'],
+                         name='participant_game_alias_idx'),
+        ]
 
     def __str__(self):
         return self.alias + " " + str(self.uuidP)
 
+    def save(self, *args, **kwargs):
+        self.normalizedAlias = normalize_alias(self.alias)
+        super(Participant, self).save(*args, **kwargs)
+
+
+# sent when points awarded by guesses are committed, with game_id and
+# increments ({participant id: points}), see models/ranking.py
+points_awarded = Signal()
+
+
+def send_points_awarded(game_id, increments):
+    transaction.on_commit(lambda: points_awarded.send(
+        sender=Participant, game_id=game_id, increments=increments))
+
+
+# sent when guesses are committed, with game_id and counts
+# ({(question id, answer id): guesses}), see models/histogram.py
+guesses_stored = Signal()
+
+
+def send_guesses_stored(game_id, counts):
+    transaction.on_commit(lambda: guesses_stored.send(
+        sender=Guess, game_id=game_id, counts=counts))
+
+
+class GuessManager(models.Manager):
+
+    def bulk_create_scored(self, guesses):
+        '''insert many guesses at once and award their points,
+        the bulk equivalent of Guess.save'''
+        increments = Counter(
+            (guess.game_id, guess.participant_id) for guess in guesses
+            if guess.answer.correct)
+        counts = {}
+        for guess in guesses:
+            game_counts = counts.setdefault(guess.game_id, Counter())
+            game_counts[guess.question_id, guess.answer_id] += 1
+        # participants grouped by the number of points they get
+        by_points = {}
+        by_game = {}
+        for (game_id, participant_id), points in increments.items():
+            by_points.setdefault(points, []).append(participant_id)
+            by_game.setdefault(game_id, {})[participant_id] = points
+        with transaction.atomic():
+            guesses = self.bulk_create(guesses)
+            for points, participant_ids in by_points.items():
+                Participant.objects.filter(pk__in=participant_ids).update(
+                    points=F('points') + points)
+            for game_id, game_increments in by_game.items():
+                send_points_awarded(game_id, game_increments)
+            for game_id, game_counts in counts.items():
+                send_guesses_stored(game_id, dict(game_counts))
+        return guesses
+
 
 class Guess(models.Model):
     '''Guess model'''
@@ -95,6 +361,25 @@ class Guess(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
 
+    objects = GuessManager()
+
+    class Meta():
+        constraints = [
+            # one guess per participant and question, a second one
+            # raises IntegrityError
+            models.UniqueConstraint(fields=['participant', 'question'],
+                                    name='unique_guess_per_question'),
+        ]
+        indexes = [
+            # keyset pagination of the guesses of a game or a question
+            models.Index(fields=['game', 'id'], name='guess_game_id_idx'),
+            models.Index(fields=['question', 'id'],
+                         name='guess_question_id_idx'),
+            # guesses of each answer, for the statistics of a question
+            models.Index(fields=['game', 'question', 'answer'],
+                         name='guess_game_question_answer_idx'),
+        ]
+
     # El juego deberia estar en modo QUESTION??
     # def __str__(self):
     #     return self.answer
@@ -102,7 +387,59 @@ class Guess(models.Model):
         return str(self.participant) + " " + str(self.answer)
 
     def save(self, *args, **kwargs):
-        if self.answer.correct:
-            self.participant.points += 1
-            self.participant.save()
-        super(Guess, self).save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super(Guess, self).save(*args, **kwargs)
+            if adding:
+                send_guesses_stored(self.game_id, {
+                    (self.question_id, self.answer_id): 1})
+            if adding and self.answer.correct:
+                # increment in the database so that concurrent guesses
+                # never overwrite each other's points
+                Participant.objects.filter(pk=self.participant_id).update(
+                    points=F('points') + 1)
+                send_points_awarded(self.game_id, {self.participant_id: 1})
+        if adding and self.answer.correct and \
+                Guess.participant.is_cached(self):
+            self.participant.refresh_from_db(fields=['points'])
+
+
+class GameSummary(models.Model):
+    '''what is left of an archived game, see models/archive.py'''
+    # id of the archived game, a game is only summarized once
+    gameId = models.BigIntegerField(unique=True)
+    questionnaire = models.ForeignKey(Questionnaire, null=True,
+                                      on_delete=models.SET_NULL)
+    title = models.CharField(max_length=255)
+    publicId = models.IntegerField()
+    state = models.PositiveIntegerField(choices=Game.CHOICES)
+    playedAt = models.DateTimeField()
+    archivedAt = models.DateTimeField(default=timezone.now)
+    participantCount = models.IntegerField(default=0)
+    # {points: number of participants}
+    scoreHistogram = models.JSONField(default=dict)
+    # [[alias, points], ...] of the first three participants
+    podium = models.JSONField(default=list)
+
+    class Meta():
+        ordering = ['-playedAt']
+
+    def __str__(self):
+        return self.title + " " + str(self.playedAt)
+
+
+class QuestionSummary(models.Model):
+    '''answers given to one question of an archived game'''
+    gameSummary = models.ForeignKey(GameSummary, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    question = models.CharField(max_length=255)
+    guessCount = models.IntegerField(default=0)
+    correctCount = models.IntegerField(default=0)
+    # [[answer, correct, number of guesses], ...] in position order
+    answers = models.JSONField(default=list)
+
+    class Meta():
+        ordering = ['gameSummary', 'position']
+
+    def __str__(self):
+        return self.question
@@ -0,0 +1,51 @@
+"""Permutation of the game PINs.
+
+Game PINs (Game.publicId) go from 1 to PIN_SPACE. The allocator (see
+PinManager in models/models.py) hands out the n-th PIN as permute(n) + 1
+for a counter n = 0, 1, 2, ... so that consecutive games get PINs that
+look random but never repeat until the counter reaches PIN_SPACE.
+
+permute is a Feistel network on 2 * HALF_BITS bits, the smallest even
+number of bits that covers PIN_SPACE, with cycle-walking: values outside
+PIN_SPACE are permuted again until they fall inside, which keeps it a
+bijection of range(PIN_SPACE). The round keys come from SECRET_KEY.
+"""
+import hashlib
+from functools import lru_cache
+from django.conf import settings
+
+PIN_SPACE = 10 ** 6
+HALF_BITS = ((PIN_SPACE - 1).bit_length() + 1) // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+@lru_cache(maxsize=1)
+def _round_keys():
+    secret = settings.SECRET_KEY.encode()
+    return tuple(hashlib.blake2b(b'pin-round-%d' % i, key=secret[:64],
+                                 digest_size=16).digest()
+                 for i in range(ROUNDS))
+
+
+def _round(value, key):
+    digest = hashlib.blake2b(value.to_bytes(4, 'big'), key=key,
+                             digest_size=4).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+def _feistel(value):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for key in _round_keys():
+        left, right = right, left ^ _round(right, key)
+    return (left << HALF_BITS) | right
+
+
+def permute(n):
+    '''the n-th value of a fixed permutation of range(PIN_SPACE)'''
+    if not 0 <= n < PIN_SPACE:
+        raise ValueError('n must be in range(%d)' % PIN_SPACE)
+    value = _feistel(n)
+    while value >= PIN_SPACE:
+        value = _feistel(value)
+    return value
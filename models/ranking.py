@@ -0,0 +1,225 @@
+"""Per-game ranking of the participants by points.
+
+A Ranking keeps the participants of a game in buckets by points (each
+bucket sorted by participant id) and a Fenwick tree counting the
+participants of every bucket, so that
+
+    rank(participant)       1 + participants with more points
+    page(offset, limit)     participants offset..offset+limit-1, by
+                            points (descending) then id
+
+cost O(log P) (P the highest score) plus the size of the page, however
+many participants the game has, and nothing is ever sorted again.
+
+Every process keeps the rankings it has built in memory, keyed by game
+id and tagged with the game version (gamestate.get_game_version), which
+changes on every state change. A ranking of an older version is rebuilt
+from the database with a single query, so the ranking is exact from the
+moment the host moves to the next screen. In between, the participants
+and points this process stores are applied to it as they are committed
+(see models/signals.py); points awarded by other processes show up at the
+next state change.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from .models import Participant
+from . import gamestate
+
+# rankings kept in the memory of each process
+RANKING_CACHE_SIZE = 100
+
+_rankings = OrderedDict()
+_lock = threading.Lock()
+
+
+class Ranking:
+    '''participants of a game ordered by points, then id'''
+
+    def __init__(self, participants=()):
+        '''participants: (id, alias, points) in id order'''
+        self._lock = threading.Lock()
+        self.points = {}
+        self.aliases = {}
+        self.buckets = {}
+        for id, alias, points in participants:
+            points = max(points, 0)
+            self.points[id] = points
+            self.aliases[id] = alias
+            self.buckets.setdefault(points, []).append(id)
+        self.size = 16
+        while self.size <= max(self.buckets, default=0):
+            self.size *= 2
+        self._rebuild()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _update(self, points, delta):
+        i = points + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _at_most(self, points):
+        '''participants with at most this many points'''
+        total = 0
+        i = min(points + 1, self.size)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _find(self, count):
+        '''smallest points p with _at_most(p) >= count'''
+        position = 0
+        step = 1 << (self.size.bit_length() - 1)
+        while step:
+            if (position + step <= self.size
+                    and self.tree[position + step] < count):
+                position += step
+                count -= self.tree[position]
+            step >>= 1
+        return position
+
+    def _grow(self, points):
+        '''make room in the tree for this many points'''
+        if points < self.size:
+            return
+        while self.size <= points:
+            self.size *= 2
+        self._rebuild()
+
+    def _rebuild(self):
+        tree = [0] * (self.size + 1)
+        for score, ids in self.buckets.items():
+            tree[score + 1] = len(ids)
+        # linear construction of the Fenwick tree
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _insert(self, id, points):
+        self._grow(points)
+        self.points[id] = points
+        bisect.insort(self.buckets.setdefault(points, []), id)
+        self._update(points, 1)
+
+    def _delete(self, id):
+        points = self.points.pop(id)
+        bucket = self.buckets[points]
+        del bucket[bisect.bisect_left(bucket, id)]
+        if not bucket:
+            del self.buckets[points]
+        self._update(points, -1)
+        return points
+
+    def add(self, id, alias, points=0):
+        with self._lock:
+            if id in self.points:
+                self._delete(id)
+            self.aliases[id] = alias
+            self._insert(id, max(points, 0))
+
+    def remove(self, id):
+        with self._lock:
+            if id in self.points:
+                self._delete(id)
+                del self.aliases[id]
+
+    def award(self, id, points):
+        '''add points to the participant'''
+        with self._lock:
+            if id in self.points:
+                self._insert(id, max(self._delete(id) + points, 0))
+
+    def rank(self, id):
+        '''1-based rank of the participant, ties share a rank; None if
+        the participant is not in the game'''
+        with self._lock:
+            points = self.points.get(id)
+            if points is None:
+                return None
+            return len(self.points) - self._at_most(points) + 1
+
+    def points_of(self, id):
+        with self._lock:
+            return self.points.get(id)
+
+    def page(self, offset, limit):
+        '''[{'rank', 'id', 'alias', 'points'}] from the offset-th
+        participant (0-based) of the ranking'''
+        rows = []
+        with self._lock:
+            total = len(self.points)
+            while len(rows) < limit and offset < total:
+                # the offset-th from the top is the (total - offset)-th
+                # from the bottom
+                points = self._find(total - offset)
+                above = total - self._at_most(points)
+                bucket = self.buckets[points]
+                for id in bucket[offset - above:
+                                 offset - above + limit - len(rows)]:
+                    rows.append({'rank': above + 1, 'id': id,
+                                 'alias': self.aliases[id],
+                                 'points': points})
+                offset = above + len(bucket)
+        return rows
+
+    def top(self, k):
+        return self.page(0, k)
+
+
+def _build(game_id):
+    return Ranking(Participant.objects.filter(game_id=game_id).order_by(
+        'id').values_list('id', 'alias', 'points'))
+
+
+def get_ranking(game_id, publicId):
+    '''the ranking of the game, rebuilt when the game version changed'''
+    version = gamestate.get_game_version(publicId)
+    with _lock:
+        entry = _rankings.get(game_id)
+        if entry is not None and entry[0] == version:
+            _rankings.move_to_end(game_id)
+            return entry[1]
+    ranking = _build(game_id)
+    with _lock:
+        _rankings[game_id] = (version, ranking)
+        _rankings.move_to_end(game_id)
+        while len(_rankings) > RANKING_CACHE_SIZE:
+            _rankings.popitem(last=False)
+    return ranking
+
+
+def _loaded(game_id):
+    with _lock:
+        entry = _rankings.get(game_id)
+    return entry[1] if entry is not None else None
+
+
+def participant_joined(game_id, id, alias, points=0):
+    ranking = _loaded(game_id)
+    if ranking is not None:
+        ranking.add(id, alias, points)
+
+
+def participant_left(game_id, id):
+    ranking = _loaded(game_id)
+    if ranking is not None:
+        ranking.remove(id)
+
+
+def points_awarded(game_id, increments):
+    '''increments: {participant id: points}'''
+    ranking = _loaded(game_id)
+    if ranking is not None:
+        for id, points in increments.items():
+            ranking.award(id, points)
+
+
+def discard(game_id):
+    with _lock:
+        _rankings.pop(game_id, None)
@@ -0,0 +1,107 @@
+import threading
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Questionnaire, Game, Question, Answer, Participant
+from .models import PinCounter
+from .models import points_awarded, guesses_stored
+from . import contentcache, gamestate, guessbuffer, histogram, ranking
+from . import snapshot
+
+
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+def game_changed(sender, instance, **kwargs):
+    # GameCountdownView saves the game on every state transition
+    gamestate.invalidate_game_context(instance.publicId)
+    gamestate.bump_game_version(instance.publicId)
+
+
+@receiver(post_save, sender=Game)
+def game_created(sender, instance, created, **kwargs):
+    if created:
+        # the id may have belonged to a deleted game
+        snapshot.discard(instance.pk)
+        ranking.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Game)
+def game_deleted(sender, instance, **kwargs):
+    # only existing games have a version, see GameViewSet.retrieve
+    gamestate.forget_game_version(instance.publicId)
+    guessbuffer.buffer.discard(instance.pk)
+    snapshot.discard(instance.pk)
+    ranking.discard(instance.pk)
+    PinCounter.objects.release([instance.publicId])
+
+
+@receiver(post_delete, sender=Participant)
+def participant_deleted(sender, instance, **kwargs):
+    gamestate.invalidate_participant(instance.uuidP)
+    ranking.participant_left(instance.game_id, instance.pk)
+
+
+@receiver(post_save, sender=Participant)
+def participant_joined(sender, instance, created, **kwargs):
+    if created:
+        ranking.participant_joined(instance.game_id, instance.pk,
+                                   instance.alias, instance.points)
+
+
+@receiver(points_awarded)
+def update_ranking(sender, game_id, increments, **kwargs):
+    ranking.points_awarded(game_id, increments)
+
+
+@receiver(guesses_stored)
+def update_histogram(sender, game_id, counts, **kwargs):
+    histogram.add(game_id, counts)
+
+
+@receiver(post_save, sender=Questionnaire)
+@receiver(post_delete, sender=Questionnaire)
+def questionnaire_changed(sender, instance, **kwargs):
+    contentcache.bump(contentcache.QUESTIONNAIRE, instance.pk)
+    # the lists of questionnaires of the author
+    contentcache.bump(contentcache.USER, instance.user_id)
+
+
+# ids of the questions this thread is deleting, their answers are
+# deleted first and need not look up the questionnaire to invalidate
+_deleting = threading.local()
+
+
+def _deleting_questions():
+    if not hasattr(_deleting, 'questions'):
+        _deleting.questions = set()
+    return _deleting.questions
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleting(sender, instance, **kwargs):
+    _deleting_questions().add(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    contentcache.bump(contentcache.QUESTION, instance.pk)
+    contentcache.bump(contentcache.QUESTIONNAIRE, instance.questionnaire_id)
+    _deleting_questions().discard(instance.pk)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    if instance.question_id in _deleting_questions():
+        # question_changed invalidates the question and the questionnaire
+        return
+    contentcache.bump(contentcache.QUESTION, instance.question_id)
+    if Answer.question.is_cached(instance):
+        questionnaire_id = instance.question.questionnaire_id
+    else:
+        questionnaire_id = Question.objects.filter(
+            pk=instance.question_id).values_list(
+            'questionnaire_id', flat=True).first()
+    if questionnaire_id is not None:
+        # the questionnaire page shows the number of answers
+        contentcache.bump(contentcache.QUESTIONNAIRE, questionnaire_id)
@@ -0,0 +1,100 @@
+"""Immutable snapshot of the questionnaire of a game.
+
+When GameCreateView starts a game the questionnaire is compiled into a
+compact structure stored in Game.snapshot, so a running game never reads
+Question or Answer rows again and later edits of the author do not change
+what the players see:
+
+    {'questions': [
+        {'id': 7, 'text': 'question', 'answerTime': 10,
+         'answers': [[21, 'first answer'], [22, 'second answer']],
+         # bit i is set when answer i is correct
+         'correct': 1},
+        ...]}
+
+Questions are in position order, question k (Game.questionNo == k) is
+questions[k - 1]. Snapshots never change, so every process keeps the ones
+it has read in memory. Games created without a snapshot (e.g. in the admin)
+get one the first time it is needed.
+"""
+import threading
+from collections import OrderedDict
+from .models import Game, Question, Answer
+
+# snapshots kept in the memory of each process
+SNAPSHOT_CACHE_SIZE = 1000
+
+_snapshots = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_snapshot(questionnaire_id):
+    '''read the questionnaire, two queries whatever its size'''
+    questions = []
+    by_id = {}
+    for id, text, answerTime in Question.objects.filter(
+            questionnaire_id=questionnaire_id).values_list(
+            'id', 'question', 'answerTime'):
+        question = {'id': id, 'text': text, 'answerTime': answerTime,
+                    'answers': [], 'correct': 0}
+        questions.append(question)
+        by_id[id] = question
+    for id, question_id, text, correct in Answer.objects.filter(
+            question__questionnaire_id=questionnaire_id).values_list(
+            'id', 'question_id', 'answer', 'correct'):
+        question = by_id[question_id]
+        if correct:
+            question['correct'] |= 1 << len(question['answers'])
+        question['answers'].append([id, text])
+    return {'questions': questions}
+
+
+def remember(game_id, snapshot):
+    '''keep the snapshot of the game in memory'''
+    with _lock:
+        _snapshots[game_id] = snapshot
+        _snapshots.move_to_end(game_id)
+        while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+            _snapshots.popitem(last=False)
+
+
+def get_snapshot(game_id):
+    '''return the snapshot of the game, None if there is no such game'''
+    with _lock:
+        snapshot = _snapshots.get(game_id)
+    if snapshot is not None:
+        return snapshot
+    row = Game.objects.filter(pk=game_id).values_list(
+        'snapshot', 'questionnaire_id').first()
+    if row is None:
+        return None
+    snapshot, questionnaire_id = row
+    if snapshot is None:
+        snapshot = compile_snapshot(questionnaire_id)
+        if not Game.objects.filter(pk=game_id, snapshot__isnull=True).update(
+                snapshot=snapshot):
+            # somebody else stored one first, use theirs
+            snapshot = Game.objects.filter(pk=game_id).values_list(
+                'snapshot', flat=True).first()
+            if snapshot is None:
+                return None
+    remember(game_id, snapshot)
+    return snapshot
+
+
+def discard(game_id):
+    with _lock:
+        _snapshots.pop(game_id, None)
+
+
+def get_question(snapshot, questionNo):
+    '''question number questionNo of the snapshot, or None'''
+    if 1 <= questionNo <= len(snapshot['questions']):
+        return snapshot['questions'][questionNo - 1]
+    return None
+
+
+def correct_answers(question):
+    '''[id, text] of the correct answers of a snapshot question'''
+    return [answer for i, answer in enumerate(question['answers'])
+            if question['correct'] >> i & 1]
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant, Guess, GameSummary, QuestionSummary
+from models.models import FreePin
+from models.snapshot import compile_snapshot
+from models import archive
+import models.constants as constants
+
+
+class ArchiveTest(TestCase):
+    """finished games are compacted into summaries"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='quiz', user=user)
+        self.questions = []
+        for text in ('first', 'second'):
+            question = Question.objects.create(
+                question=text, questionnaire=self.questionnaire)
+            answers = [Answer.objects.create(answer=answer, question=question,
+                                             correct=answer == 'right')
+                       for answer in ('right', 'wrong')]
+            self.questions.append((question, answers))
+        self.game = self.create_game(constants.LEADERBOARD)
+
+    def create_game(self, state, participants=5):
+        game = Game.objects.create(
+            questionnaire=self.questionnaire, state=state,
+            snapshot=compile_snapshot(self.questionnaire.id))
+        for i in range(participants):
+            participant = Participant.objects.create(
+                game=game, alias='alias_%d' % i)
+            # participant i answers the first i questions right
+            for number, (question, (right, wrong)) in enumerate(
+                    self.questions):
+                Guess(participant=participant, game=game, question=question,
+                      answer=right if number < i else wrong).save()
+        return game
+
+    def age(self, game, **delta):
+        Game.objects.filter(pk=game.pk).update(
+            updated_at=timezone.now() - timedelta(**delta))
+
+    def test_archive_game(self):
+        publicId = self.game.publicId
+        summary = archive.archive_game(self.game, chunk_size=3)
+        self.assertFalse(Game.objects.filter(pk=self.game.pk).exists())
+        self.assertFalse(Participant.objects.exists())
+        self.assertFalse(Guess.objects.exists())
+        self.assertTrue(FreePin.objects.filter(pin=publicId).exists())
+        summary.refresh_from_db()
+        self.assertEqual(summary.title, 'quiz')
+        self.assertEqual(summary.publicId, publicId)
+        self.assertEqual(summary.participantCount, 5)
+        # points 0, 1, 2, 2, 2
+        self.assertEqual(summary.scoreHistogram, {'0': 1, '1': 1, '2': 3})
+        self.assertEqual(summary.podium, [
+            ['alias_2', 2], ['alias_3', 2], ['alias_4', 2]])
+        first, second = QuestionSummary.objects.filter(gameSummary=summary)
+        self.assertEqual((first.position, first.question), (1, 'first'))
+        self.assertEqual(first.guessCount, 5)
+        self.assertEqual(first.correctCount, 4)
+        self.assertEqual(first.answers, [['right', True, 4],
+                                         ['wrong', False, 1]])
+        self.assertEqual(second.answers, [['right', True, 3],
+                                          ['wrong', False, 2]])
+
+    def test_summary_survives_questionnaire_changes(self):
+        summary = archive.archive_game(self.game)
+        self.questionnaire.delete()
+        summary.refresh_from_db()
+        self.assertIsNone(summary.questionnaire)
+        self.assertEqual(QuestionSummary.objects.count(), 2)
+
+    def test_interrupted_archival(self):
+        # the summary was written, the rows were not deleted yet
+        archive.summarize(self.game)
+        archive.archive_game(self.game)
+        self.assertEqual(GameSummary.objects.count(), 1)
+        self.assertEqual(QuestionSummary.objects.count(), 2)
+
+    def test_archivable(self):
+        waiting = self.create_game(constants.WAITING, participants=0)
+        finished, stale = timedelta(hours=1), timedelta(days=1)
+        # both were just played
+        self.assertFalse(archive.archivable(finished, stale).exists())
+        self.age(self.game, hours=2)
+        self.age(waiting, hours=2)
+        self.assertEqual(list(archive.archivable(finished, stale)),
+                         [self.game])
+        self.age(waiting, days=2)
+        self.assertEqual(list(archive.archivable(finished, stale)),
+                         [waiting, self.game])
+
+    def test_command(self):
+        waiting = self.create_game(constants.WAITING, participants=1)
+        self.age(self.game, hours=2)
+        self.age(waiting, days=2)
+        out = StringIO()
+        call_command('archivegames', '--dry-run', stdout=out)
+        self.assertEqual(Game.objects.count(), 2)
+        out = StringIO()
+        call_command('archivegames', '--chunk-size', '2', stdout=out)
+        self.assertIn('2 games archived', out.getvalue())
+        self.assertFalse(Game.objects.exists())
+        self.assertEqual(
+            sorted(GameSummary.objects.values_list('state', flat=True)),
+            [constants.WAITING, constants.LEADERBOARD])
@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from models.models import Game, Participant, Questionnaire
+
+BENCHMARKS = ['join', 'guess', 'countdown:waiting', 'countdown:question',
+              'countdown:answer', 'countdown:leaderboard',
+              'questionnaire-detail']
+
+
+class BenchmarkCommandTest(TestCase):
+    """benchmarks run in a rolled back transaction and are compared
+    with a stored baseline"""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, 'baseline.json')
+
+    def benchmark(self, **options):
+        call_command('benchmark', scales=[3], repeat=2,
+                     baseline=self.baseline, stdout=StringIO(), **options)
+
+    def test_save_and_compare(self):
+        self.benchmark(save=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.assertEqual(sorted(baseline['scales']['3']), sorted(BENCHMARKS))
+        # nothing is left behind
+        self.assertFalse(Questionnaire.objects.exists())
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(Participant.objects.exists())
+        # the same code against its own baseline, times may vary a lot
+        self.benchmark(compare=True, tolerance=100, min_ms=1000)
+
+    def test_query_regression(self):
+        self.benchmark(save=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['scales']['3']['guess']['queries'] -= 1
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.benchmark(compare=True, tolerance=100, min_ms=1000)
+
+    def test_time_regression(self):
+        self.benchmark(save=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        # only join is slower than the baseline
+        for result in baseline['scales']['3'].values():
+            result['ms'] = 10 ** 9
+        baseline['scales']['3']['join']['ms'] = 0
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.benchmark(compare=True, tolerance=0.25, min_ms=0)
+
+    def test_other_vendor(self):
+        self.benchmark(save=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['vendor'] = 'other'
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'recorded on other'):
+            self.benchmark(compare=True, tolerance=100, min_ms=1000)
+
+    def test_missing_baseline(self):
+        with self.assertRaisesMessage(CommandError, 'no baseline'):
+            self.benchmark(compare=True)
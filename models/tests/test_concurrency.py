@@ -0,0 +1,73 @@
+import threading
+import unittest
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from models.models import User, Questionnaire, Question, Answer
+from models.models import Game, Participant, Guess
+
+NUMBERPARTICIPANTS = 40
+NUMBERQUESTIONS = 50
+NUMBERTHREADS = 16
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql',
+                     'needs a database that supports concurrent writers')
+class GuessConcurrencyTest(TransactionTestCase):
+    """many guesses scored at the same time must not lose points"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.game = Game.objects.create(questionnaire=questionnaire)
+        self.answers = []
+        for i in range(NUMBERQUESTIONS):
+            question = Question.objects.create(
+                question='question %d' % i, questionnaire=questionnaire)
+            right = Answer.objects.create(
+                answer='right', question=question, correct=True)
+            wrong = Answer.objects.create(
+                answer='wrong', question=question, correct=False)
+            self.answers.append((question, right, wrong))
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+            for i in range(NUMBERPARTICIPANTS)]
+
+    def test_parallel_guesses(self):
+        # participant i answers question j correctly when (i + j) % 3 != 0
+        guesses = []
+        expected = {}
+        for i, participant in enumerate(self.participants):
+            expected[participant.pk] = 0
+            for j, (question, right, wrong) in enumerate(self.answers):
+                correct = (i + j) % 3 != 0
+                expected[participant.pk] += int(correct)
+                guesses.append(Guess(
+                    participant_id=participant.pk, game_id=self.game.pk,
+                    question_id=question.pk,
+                    answer=right if correct else wrong))
+        errors = []
+
+        def worker(chunk):
+            try:
+                for guess in chunk:
+                    guess.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        # every thread gets guesses of every participant, so the same
+        # participant row is updated from many threads at once
+        threads = [threading.Thread(target=worker,
+                                    args=(guesses[n::NUMBERTHREADS],))
+                   for n in range(NUMBERTHREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Guess.objects.count(),
+                         NUMBERPARTICIPANTS * NUMBERQUESTIONS)
+        points = dict(Participant.objects.values_list('pk', 'points'))
+        self.assertEqual(points, expected)
@@ -0,0 +1,123 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant, Guess
+from models import deletion
+import models.constants as constants
+
+
+def create_questionnaire(user, participants=4):
+    '''a questionnaire with two questions and a game with participants,
+    every one of them has answered both questions'''
+    questionnaire = Questionnaire.objects.create(title='q', user=user)
+    game = Game.objects.create(questionnaire=questionnaire)
+    players = [Participant.objects.create(game=game, alias='alias_%d' % i)
+               for i in range(participants)]
+    for text in ('first', 'second'):
+        question = Question.objects.create(
+            question=text, questionnaire=questionnaire)
+        answer = Answer.objects.create(answer='a', question=question,
+                                       correct=True)
+        Guess.objects.bulk_create(
+            Guess(participant=player, game=game, question=question,
+                  answer=answer) for player in players)
+    return questionnaire, game
+
+
+class DeletionTest(TestCase):
+    """questionnaires and games are deleted in chunks"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire, self.game = create_questionnaire(self.user)
+
+    def assertEmpty(self):
+        for model in (Guess, Participant, Game, Answer, Question):
+            self.assertFalse(model.objects.exists(), model)
+        self.assertFalse(Questionnaire.all_objects.exists())
+
+    def test_delete_in_chunks(self):
+        deleted = deletion.delete_in_chunks(
+            Guess.objects.filter(game=self.game), chunk_size=3)
+        self.assertEqual(deleted, 8)
+        self.assertFalse(Guess.objects.exists())
+
+    def test_purge_game(self):
+        deletion.purge_game(self.game, chunk_size=3)
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(Participant.objects.exists())
+        self.assertFalse(Guess.objects.exists())
+        self.assertEqual(Question.objects.count(), 2)
+
+    def test_delete_questionnaire_inline(self):
+        self.assertFalse(deletion.delete_questionnaire(self.questionnaire))
+        self.assertEmpty()
+
+    @override_settings(DELETE_INLINE_LIMIT=5)
+    def test_large_questionnaire_in_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(
+                deletion.delete_questionnaire(self.questionnaire))
+        # hidden at once, deleted when the transaction commits
+        self.assertFalse(Questionnaire.objects.exists())
+        self.assertTrue(Questionnaire.all_objects.exists())
+        self.assertEqual(Guess.objects.count(), 8)
+        # the thread, the rest drop the cached pages
+        self.assertEqual(len([callback for callback in callbacks
+                              if callback.__name__ == 'start']), 1)
+
+    @override_settings(DELETE_INLINE_LIMIT=5)
+    def test_large_game_in_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(deletion.delete_game(self.game))
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.state, constants.LEADERBOARD)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_purge_command(self):
+        Questionnaire.objects.filter(pk=self.questionnaire.pk).update(
+            pendingDeletion=True)
+        out = StringIO()
+        call_command('purge', '--chunk-size', '3', stdout=out)
+        self.assertIn('1 questionnaires purged', out.getvalue())
+        self.assertEmpty()
+
+    def test_remove_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('questionnaire-remove', args=[self.questionnaire.id]))
+        self.assertRedirects(response, reverse('questionnaire-list'))
+        self.assertEmpty()
+
+    def test_game_create_replaces_game(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('game-create',
+                                args=[self.questionnaire.id]))
+        game = Game.objects.get(questionnaire=self.questionnaire)
+        self.assertNotEqual(game.pk, self.game.pk)
+        self.assertFalse(Participant.objects.exists())
+
+
+@override_settings(DELETE_INLINE_LIMIT=5)
+class BackgroundDeletionTest(TransactionTestCase):
+    """large deletions run in a thread after the commit"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire, self.game = create_questionnaire(
+            self.user, participants=10)
+
+    def test_remove_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('questionnaire-remove', args=[self.questionnaire.id]))
+        self.assertRedirects(response, reverse('questionnaire-list'))
+        deletion.wait(10)
+        self.assertFalse(Questionnaire.all_objects.exists())
+        self.assertFalse(Guess.objects.exists())
+        self.assertFalse(Participant.objects.exists())
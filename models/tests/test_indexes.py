@@ -0,0 +1,99 @@
+import unittest
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from models.models import User, Questionnaire, Question, Answer
+from models.models import Game, Participant, Guess, normalize_alias
+
+NUMBERGAMES = 20
+NUMBERPARTICIPANTS = 250
+NUMBERQUESTIONS = 25
+NUMBERANSWERS = 4
+NUMBERGUESSES = 5
+
+
+@unittest.skipUnless(connection.vendor in ('postgresql', 'sqlite'),
+                     'plans are only checked on PostgreSQL and SQLite')
+class HotQueryIndexTest(TestCase):
+    """the hot queries are answered with an index, not a table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='a', password='a')
+        games = []
+        for g in range(NUMBERGAMES):
+            questionnaire = Questionnaire.objects.create(
+                title='q%d' % g, user=user)
+            Question.objects.bulk_create(
+                Question(question='question %d' % i,
+                         questionnaire=questionnaire, position=i + 1)
+                for i in range(NUMBERQUESTIONS))
+            questions = list(questionnaire.question_set.all())
+            Answer.objects.bulk_create(
+                Answer(answer='answer %d' % i, question=question,
+                       correct=i == 0, position=i + 1)
+                for question in questions for i in range(NUMBERANSWERS))
+            game = Game.objects.create(questionnaire=questionnaire,
+                                       publicId=g + 1)
+            games.append((game, questions))
+        for game, questions in games:
+            Participant.objects.bulk_create(
+                Participant(game=game, alias='alias_%d' % i,
+                            normalizedAlias=normalize_alias('alias_%d' % i))
+                for i in range(NUMBERPARTICIPANTS))
+            answers = {}
+            for answer in Answer.objects.filter(question__in=questions):
+                answers.setdefault(answer.question_id, []).append(answer)
+            Guess.objects.bulk_create(
+                Guess(participant=participant, game=game, question=question,
+                      answer=answers[question.id][participant.id % 4])
+                for participant in Participant.objects.filter(game=game)
+                for question in questions[:NUMBERGUESSES])
+        # planner statistics, as autovacuum would have them
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.game, questions = games[NUMBERGAMES // 2]
+        cls.question = questions[0]
+        cls.answer = Answer.objects.filter(question=cls.question).first()
+        cls.participant = Participant.objects.filter(game=cls.game).first()
+
+    def assertIndexScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+            self.assertIn('Index', plan)
+        else:
+            self.assertNotRegex(plan, r'\bSCAN (TABLE )?models_')
+            self.assertRegex(plan, r'\bSEARCH .*USING .*(INDEX|KEY)')
+
+    def test_question_by_position(self):
+        self.assertIndexScan(Question.objects.filter(
+            questionnaire_id=self.game.questionnaire_id, position=3))
+
+    def test_participant_by_uuid(self):
+        self.assertIndexScan(Participant.objects.filter(
+            uuidP=self.participant.uuidP))
+
+    def test_participant_by_alias(self):
+        self.assertIndexScan(Participant.objects.filter(
+            game=self.game, alias=self.participant.alias))
+
+    def test_guess_by_participant(self):
+        self.assertIndexScan(Guess.objects.filter(
+            participant=self.participant, question=self.question))
+
+    def test_guesses_by_answer(self):
+        self.assertIndexScan(Guess.objects.filter(
+            game=self.game, question=self.question, answer=self.answer))
+
+    def test_correct_answer(self):
+        self.assertIndexScan(Answer.objects.filter(
+            question=self.question, correct=True))
+
+    def test_unique_guess(self):
+        self.assertEqual(
+            Guess.objects.filter(participant=self.participant).count(),
+            NUMBERGUESSES)
+        guess = Guess(participant=self.participant, game=self.game,
+                      question=self.question, answer=self.answer)
+        with self.assertRaises(IntegrityError):
+            guess.save()
@@ -0,0 +1,57 @@
+import unittest
+from io import StringIO
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import LiveServerTestCase, SimpleTestCase
+from models.management.commands.loadtest import percentile
+from models.models import Questionnaire, User
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql',
+                     'needs a database that supports concurrent writers')
+class LoadTestCommandTest(LiveServerTestCase):
+    """a small simulated game against the live test server"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_game(self):
+        # an account that happens to be called like the command's users
+        User.objects.create_user(username='loadtest', password='x')
+        out = StringIO()
+        call_command('loadtest', url=self.live_server_url, players=5,
+                     questions=2, question_time=0.5, poll_interval=0.1,
+                     think_time=0.1, stdout=out)
+        report = out.getvalue()
+        self.assertIn('5 of 5 players joined', report)
+        lines = {line.split()[0]: line.split() for line in
+                 report.splitlines()[2:]}
+        self.assertEqual(lines['join'][1], '5')
+        # every player answers both questions
+        self.assertEqual(lines['guess'][1], '10')
+        self.assertIn('201:10', lines['guess'])
+        # waiting, two questions with their answers and the leaderboard
+        self.assertEqual(lines['countdown'][1], '5')
+        # the questionnaire, the game and the user of the run are removed
+        # at the end, the existing account is left alone
+        self.assertFalse(Questionnaire.objects.exists())
+        self.assertEqual(list(User.objects.values_list('username', flat=True)),
+                         ['loadtest'])
+        self.assertFalse(Session.objects.exists())
+
+
+class LoadTestLocalOnlyTest(SimpleTestCase):
+
+    def test_remote_server(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', url='http://192.0.2.1:8000',
+                         stdout=StringIO())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0)
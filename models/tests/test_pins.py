@@ -0,0 +1,127 @@
+import threading
+import unittest
+from datetime import timedelta
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from models.models import User, Questionnaire, Game
+from models.models import PinCounter, FreePin, PinsExhausted
+from models import pins
+
+
+class PermuteTest(TestCase):
+    """permute is a bijection of range(PIN_SPACE)"""
+
+    def test_bijection(self):
+        values = [pins.permute(n) for n in range(0, pins.PIN_SPACE, 7)]
+        self.assertEqual(len(values), len(set(values)))
+        self.assertTrue(all(0 <= value < pins.PIN_SPACE
+                            for value in values))
+
+    def test_range(self):
+        for n in (-1, pins.PIN_SPACE):
+            with self.assertRaises(ValueError):
+                pins.permute(n)
+
+
+class PinAllocatorTest(TestCase):
+    """game PINs never collide"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=user)
+
+    def test_many_pins(self):
+        allocated = PinCounter.objects.allocate_many(300000)
+        self.assertEqual(len(allocated), 300000)
+        self.assertEqual(len(set(allocated)), 300000)
+        self.assertTrue(all(0 < pin <= pins.PIN_SPACE for pin in allocated))
+        # the next ones are different again
+        more = PinCounter.objects.allocate_many(1000)
+        self.assertFalse(set(more) & set(allocated))
+
+    def test_games(self):
+        games = [Game.objects.create(questionnaire=self.questionnaire)
+                 for _ in range(50)]
+        publicIds = [game.publicId for game in games]
+        self.assertEqual(len(publicIds), len(set(publicIds)))
+
+    def test_skip_used_pin(self):
+        # a game created with an explicit PIN, e.g. before the allocator
+        first = pins.permute(0) + 1
+        Game.objects.create(questionnaire=self.questionnaire, publicId=first)
+        game = Game.objects.create(questionnaire=self.questionnaire)
+        self.assertNotEqual(game.publicId, first)
+        self.assertEqual(game.publicId, pins.permute(1) + 1)
+
+    def test_recycle_after_delay(self):
+        game = Game.objects.create(questionnaire=self.questionnaire)
+        publicId = game.publicId
+        game.delete()
+        self.assertTrue(FreePin.objects.filter(pin=publicId).exists())
+        # too recent to be given again
+        self.assertNotEqual(PinCounter.objects.allocate(), publicId)
+        FreePin.objects.filter(pin=publicId).update(
+            freedAt=timezone.now() - timedelta(hours=2))
+        self.assertEqual(PinCounter.objects.allocate(), publicId)
+        self.assertFalse(FreePin.objects.filter(pin=publicId).exists())
+
+    @override_settings(GAME_PIN_REUSE_DELAY=0)
+    def test_recycle_without_delay(self):
+        game = Game.objects.create(questionnaire=self.questionnaire)
+        publicId = game.publicId
+        game.delete()
+        game = Game.objects.create(questionnaire=self.questionnaire)
+        self.assertEqual(game.publicId, publicId)
+
+    def test_exhausted(self):
+        PinCounter.objects.create(pk=1, value=pins.PIN_SPACE - 2)
+        self.assertEqual(len(PinCounter.objects.allocate_many(2)), 2)
+        with self.assertRaises(PinsExhausted):
+            PinCounter.objects.allocate()
+
+    def test_game_create_exhausted(self):
+        PinCounter.objects.create(pk=1, value=pins.PIN_SPACE)
+        self.client.force_login(self.questionnaire.user)
+        response = self.client.get(
+            '/services/gamecreate/%d' % self.questionnaire.id)
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Game.objects.exists())
+
+    def test_game_create_exhausted_keeps_game(self):
+        # the game being played is not lost when there is no PIN left
+        game = Game.objects.create(questionnaire=self.questionnaire)
+        PinCounter.objects.filter(pk=1).update(value=pins.PIN_SPACE)
+        self.client.force_login(self.questionnaire.user)
+        response = self.client.get(
+            '/services/gamecreate/%d' % self.questionnaire.id)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(list(Game.objects.all()), [game])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql',
+                     'needs a database that supports concurrent writers')
+class PinConcurrencyTest(TransactionTestCase):
+    """PINs allocated at the same time are all different"""
+
+    def test_parallel_allocations(self):
+        allocated = []
+        lock = threading.Lock()
+
+        def allocate():
+            try:
+                for _ in range(20):
+                    pin = PinCounter.objects.allocate()
+                    with lock:
+                        allocated.append(pin)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(allocated), 160)
+        self.assertEqual(len(set(allocated)), 160)
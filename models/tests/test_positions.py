@@ -0,0 +1,112 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from models.models import User, Questionnaire, Question, Answer, Game
+from models import gamestate
+
+
+class PositionTest(TestCase):
+    """questions and answers keep the positions 1..n"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=user)
+        # the text order is not the position order
+        self.questions = [
+            Question.objects.create(question=text,
+                                    questionnaire=self.questionnaire)
+            for text in ('d', 'c', 'b', 'a')]
+        self.answers = [
+            Answer.objects.create(answer=text, question=self.questions[0])
+            for text in ('z', 'y', 'x')]
+
+    def texts(self, model, **filters):
+        field = 'question' if model is Question else 'answer'
+        return list(model.objects.filter(**filters).values_list(
+            field, flat=True))
+
+    def test_create(self):
+        self.assertEqual(
+            list(Question.objects.values_list('question', 'position')),
+            [('d', 1), ('c', 2), ('b', 3), ('a', 4)])
+        self.assertEqual(
+            list(Answer.objects.values_list('answer', 'position')),
+            [('z', 1), ('y', 2), ('x', 3)])
+        # positions are per parent
+        other = Question.objects.create(
+            question='other', questionnaire=Questionnaire.objects.create(
+                title='other', user=self.questionnaire.user))
+        self.assertEqual(other.position, 1)
+
+    def test_delete(self):
+        self.questions[1].delete()
+        self.assertEqual(
+            list(Question.objects.values_list('question', 'position')),
+            [('d', 1), ('b', 2), ('a', 3)])
+        self.answers[0].delete()
+        self.assertEqual(
+            list(Answer.objects.values_list('answer', 'position')),
+            [('y', 1), ('x', 2)])
+
+    def test_cascade(self):
+        # the parent goes too, no gap to close
+        with CaptureQueriesContext(connection) as queries:
+            self.questionnaire.delete()
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith('UPDATE')])
+        self.assertFalse(Answer.objects.exists())
+
+    def test_number_positions(self):
+        # rows stored before positions existed
+        Question.objects.update(position=0)
+        Answer.objects.filter(pk=self.answers[1].pk).update(position=0)
+        out = StringIO()
+        call_command('numberpositions', '--chunk-size', '1', stdout=out)
+        self.assertIn('questions of 1 questionnaires and answers of 1 '
+                      'questions numbered', out.getvalue())
+        # the questions were shown by their text, the answers as stored
+        self.assertEqual(self.texts(Question), ['a', 'b', 'c', 'd'])
+        self.assertEqual(
+            list(Answer.objects.values_list('answer', 'position')),
+            [('z', 1), ('y', 2), ('x', 3)])
+        call_command('numberpositions', stdout=out)
+        self.assertIn('questions of 0 questionnaires', out.getvalue())
+
+    def test_move(self):
+        self.questions[3].move_to(1)
+        self.assertEqual(self.texts(Question), ['a', 'd', 'c', 'b'])
+        self.questions[3].move_to(3)
+        self.assertEqual(self.texts(Question), ['d', 'c', 'a', 'b'])
+        # out of range positions go to the ends
+        self.questions[0].move_to(10)
+        self.assertEqual(self.texts(Question), ['c', 'a', 'b', 'd'])
+        self.questions[0].move_to(0)
+        self.assertEqual(self.texts(Question), ['d', 'c', 'a', 'b'])
+        self.assertEqual(
+            list(Question.objects.values_list('position', flat=True)),
+            [1, 2, 3, 4])
+        self.answers[2].move_to(1)
+        self.assertEqual(self.texts(Answer), ['x', 'z', 'y'])
+
+    def test_game_context(self):
+        game = Game.objects.create(questionnaire=self.questionnaire,
+                                   publicId=123456, questionNo=2)
+        context = gamestate.get_game_context(game.publicId)
+        self.assertEqual(context['questionText'], 'c')
+        game.questionNo = 1
+        game.save()
+        context = gamestate.get_game_context(game.publicId)
+        self.assertEqual(context['questionText'], 'd')
+        self.assertEqual(context['answerTexts'], ('z', 'y', 'x'))
+        # a running game keeps the order it started with
+        self.questions[3].move_to(1)
+        self.answers[0].move_to(3)
+        cache.clear()
+        context = gamestate.get_game_context(game.publicId)
+        self.assertEqual(context['questionText'], 'd')
+        self.assertEqual(context['answerTexts'], ('z', 'y', 'x'))
@@ -0,0 +1,120 @@
+import random
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant, Guess
+from models.ranking import Ranking
+from models import gamestate, ranking
+
+
+def expected_page(points, offset, limit):
+    '''the same page, sorting everything'''
+    ordered = sorted(points.items(), key=lambda item: (-item[1], item[0]))
+    return [{'rank': 1 + sum(p > score for p in points.values()),
+             'id': id, 'alias': 'alias_%d' % id, 'points': score}
+            for id, score in ordered[offset:offset + limit]]
+
+
+class RankingStructureTest(SimpleTestCase):
+    """pages and ranks of a Ranking match a full sort"""
+
+    def check(self, structure, points):
+        self.assertEqual(len(structure), len(points))
+        for offset, limit in ((0, 3), (0, len(points) + 1), (7, 5),
+                              (len(points) - 2, 10), (len(points), 5)):
+            self.assertEqual(structure.page(offset, limit),
+                             expected_page(points, offset, limit))
+        for id, score in points.items():
+            self.assertEqual(structure.rank(id),
+                             1 + sum(p > score for p in points.values()))
+
+    def test_build(self):
+        points = {id: random.randint(0, 40) for id in range(1, 200)}
+        structure = Ranking((id, 'alias_%d' % id, points[id])
+                            for id in sorted(points))
+        self.check(structure, points)
+
+    def test_updates(self):
+        random.seed(1)
+        structure = Ranking()
+        points = {}
+        for step in range(2000):
+            id = random.randint(1, 150)
+            if id not in points:
+                points[id] = 0
+                structure.add(id, 'alias_%d' % id)
+            elif random.random() < 0.05:
+                del points[id]
+                structure.remove(id)
+            else:
+                # past the initial size of the tree as well
+                increment = random.randint(1, 3)
+                points[id] += increment
+                structure.award(id, increment)
+        self.check(structure, points)
+
+    def test_empty(self):
+        structure = Ranking()
+        self.assertEqual(structure.top(3), [])
+        self.assertIsNone(structure.rank(1))
+
+
+class GameRankingTest(TestCase):
+    """the ranking of a game follows the database"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.question = Question.objects.create(
+            question='q', questionnaire=questionnaire)
+        self.right = Answer.objects.create(
+            answer='right', question=self.question, correct=True)
+        self.wrong = Answer.objects.create(
+            answer='wrong', question=self.question, correct=False)
+        self.game = Game.objects.create(questionnaire=questionnaire)
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i,
+                                       points=i % 3)
+            for i in range(6)]
+
+    def get_ranking(self):
+        return ranking.get_ranking(self.game.id, self.game.publicId)
+
+    def aliases(self, rows):
+        return [row['alias'] for row in rows]
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            top = self.get_ranking().top(3)
+        self.assertEqual(self.aliases(top), ['alias_2', 'alias_5', 'alias_1'])
+        # cached until the game version changes
+        with self.assertNumQueries(0):
+            self.get_ranking().top(3)
+        gamestate.bump_game_version(self.game.publicId)
+        with self.assertNumQueries(1):
+            self.get_ranking()
+
+    def test_incremental(self):
+        structure = self.get_ranking()
+        late = Participant.objects.create(game=self.game, alias='late')
+        self.assertEqual(structure.rank(late.id), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess(participant=late, game=self.game, question=self.question,
+                  answer=self.right).save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess.objects.bulk_create_scored([
+                Guess(participant=self.participants[0], game=self.game,
+                      question=self.question, answer=self.wrong),
+                Guess(participant=self.participants[3], game=self.game,
+                      question=self.question, answer=self.right)])
+        with self.assertNumQueries(0):
+            structure = self.get_ranking()
+        self.assertEqual(structure.points_of(late.id), 1)
+        self.assertEqual(structure.points_of(self.participants[3].id), 1)
+        self.assertEqual(structure.rank(self.participants[0].id), 7)
+        removed = self.participants[2].id
+        self.participants[2].delete()
+        self.assertIsNone(structure.rank(removed))
+        self.assertEqual(self.aliases(structure.top(2)),
+                         ['alias_5', 'alias_1'])
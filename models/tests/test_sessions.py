@@ -0,0 +1,90 @@
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant
+from models.snapshot import compile_snapshot
+
+
+class CleanSessionsTest(TestCase):
+    """expired sessions are deleted a bounded amount at a time"""
+
+    def setUp(self):
+        now = timezone.now()
+        for i in range(25):
+            Session.objects.create(
+                session_key='expired%02d' % i, session_data='',
+                expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='alive', session_data='',
+                               expire_date=now + timedelta(days=1))
+
+    def test_bounded(self):
+        out = StringIO()
+        call_command('cleansessions', '--chunk-size', '4', '--max-rows',
+                     '10', stdout=out)
+        self.assertIn('10 expired sessions deleted', out.getvalue())
+        self.assertEqual(Session.objects.count(), 16)
+        call_command('cleansessions', stdout=out)
+        self.assertEqual(list(Session.objects.values_list(
+            'session_key', flat=True)), ['alive'])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_cookie_sessions(self):
+        out = StringIO()
+        call_command('cleansessions', stdout=out)
+        self.assertIn('does not keep expired sessions', out.getvalue())
+        self.assertEqual(Session.objects.count(), 26)
+
+
+class SessionPayloadTest(TestCase):
+    """the host session only holds the game it is running"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=self.user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        Answer.objects.create(answer='right', question=question, correct=True)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, questionNo=1,
+            snapshot=compile_snapshot(questionnaire.id))
+        for i in range(20):
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+
+    def play(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session.save()
+        # signed cookies get a new key on every save
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = \
+            session.session_key
+        keys = set()
+        for _ in range(5):
+            response = self.client.get(reverse('game-count-down'))
+            self.assertEqual(response.status_code, 200)
+            keys.update(self.client.session.keys())
+        self.assertNotIn('participants', keys)
+        self.assertNotIn('correct', keys)
+        self.assertIn('game_state', keys)
+
+    def test_db_sessions(self):
+        self.play()
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_sessions(self):
+        self.play()
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_cookie_sessions(self):
+        self.play()
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase
+from models.models import User, Questionnaire, Question, Answer, Game
+from models import snapshot
+
+
+class SnapshotTest(TestCase):
+    """the questionnaire compiled for a game"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=user)
+        self.first = Question.objects.create(
+            question='b', questionnaire=self.questionnaire, answerTime=5)
+        self.second = Question.objects.create(
+            question='a', questionnaire=self.questionnaire, answerTime=7)
+        self.answers = [
+            Answer.objects.create(answer=text, question=self.first,
+                                  correct=correct)
+            for text, correct in (('x', False), ('y', True), ('z', True))]
+        self.answer = Answer.objects.create(
+            answer='w', question=self.second, correct=True)
+        self.answers[0].move_to(3)
+
+    def test_compile(self):
+        with self.assertNumQueries(2):
+            compiled = snapshot.compile_snapshot(self.questionnaire.id)
+        x, y, z = self.answers
+        self.assertEqual(compiled, {'questions': [
+            {'id': self.first.id, 'text': 'b', 'answerTime': 5,
+             'answers': [[y.id, 'y'], [z.id, 'z'], [x.id, 'x']],
+             'correct': 0b011},
+            {'id': self.second.id, 'text': 'a', 'answerTime': 7,
+             'answers': [[self.answer.id, 'w']], 'correct': 0b1},
+        ]})
+        question = snapshot.get_question(compiled, 1)
+        self.assertEqual(snapshot.correct_answers(question),
+                         [[y.id, 'y'], [z.id, 'z']])
+        self.assertIsNone(snapshot.get_question(compiled, 0))
+        self.assertIsNone(snapshot.get_question(compiled, 3))
+
+    def test_compiled_once(self):
+        # games created without one get it the first time it is needed
+        game = Game.objects.create(questionnaire=self.questionnaire,
+                                   publicId=123456)
+        compiled = snapshot.get_snapshot(game.id)
+        game.refresh_from_db()
+        self.assertEqual(game.snapshot, compiled)
+        with self.assertNumQueries(0):
+            self.assertEqual(snapshot.get_snapshot(game.id), compiled)
+        # later edits are not seen by the game
+        self.first.question = 'edited'
+        self.first.save()
+        snapshot.discard(game.id)
+        self.assertEqual(
+            snapshot.get_snapshot(game.id)['questions'][0]['text'], 'b')
+        self.assertIsNone(snapshot.get_snapshot(game.id + 1))
+
+    def test_deleted_game(self):
+        game = Game.objects.create(questionnaire=self.questionnaire,
+                                   publicId=123456)
+        snapshot.get_snapshot(game.id)
+        game_id = game.id
+        game.delete()
+        self.assertIsNone(snapshot.get_snapshot(game_id))
@@ -0,0 +1,54 @@
+"""WebSocket endpoint that pushes game events to the players.
+
+ws://<host>/ws/games/<publicId>/ sends the current state of the game (and
+the question, while it takes guesses) as soon as the connection is
+accepted and then every message published on
+the game channel: state transitions, the question being shown and the
+scores (see services.views.notify_players). Messages are JSON objects
+with a 'type' key. Players do not need to poll /api/games/ any more.
+"""
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from models import broadcast, gamestate
+from models.constants import ANSWER
+
+# close code used when the game does not exist
+GAME_NOT_FOUND = 4004
+
+
+async def game_socket(scope, receive, send, publicId):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    # subscribe before reading the state, so no transition is missed
+    subscription = broadcast.subscribe(broadcast.game_channel(publicId))
+    try:
+        game = await sync_to_async(gamestate.get_game_context)(publicId)
+        if game is None:
+            await send({'type': 'websocket.close', 'code': GAME_NOT_FOUND})
+            return
+        state = {'type': 'state', 'state': game['state'],
+                 'questionNo': game['questionNo']}
+        if game['state'] == ANSWER:
+            # a player (re)connecting while the question takes guesses
+            state['question'] = gamestate.question_message(game)
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': json.dumps(state)})
+        receiving = asyncio.ensure_future(receive())
+        publishing = asyncio.ensure_future(subscription.aget())
+        while True:
+            done, _ = await asyncio.wait(
+                [receiving, publishing], return_when=asyncio.FIRST_COMPLETED)
+            if receiving in done:
+                # players have nothing to say, only disconnections matter
+                if receiving.result()['type'] == 'websocket.disconnect':
+                    break
+                receiving = asyncio.ensure_future(receive())
+            if publishing in done:
+                await send({'type': 'websocket.send',
+                            'text': json.dumps(publishing.result())})
+                publishing = asyncio.ensure_future(subscription.aget())
+        publishing.cancel()
+    finally:
+        subscription.close()
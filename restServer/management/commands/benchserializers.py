@@ -0,0 +1,83 @@
+# Compare the model serializers with the values() fast path
+#
+# execute python manage.py benchserializers [--rows 1000 100000]
+#
+# The rows are created inside a transaction that is rolled back at the
+# end, so the database is left as it was.
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from models.models import User, Questionnaire, Question, Answer
+from models.models import Game, Participant, Guess, normalize_alias
+from restServer.serializers import ParticipantSerializer, GuessSerializer
+from restServer.serializers import participant_values, guess_values
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = """time ModelSerializer against ValuesSerializer
+           """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+',
+                            default=[1000, 100000],
+                            help='number of participants and guesses')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='keep the best of this many runs')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.stdout.write('%-12s %8s %12s %12s %8s' % (
+            'model', 'rows', 'model (s)', 'values (s)', 'speedup'))
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self.populate(rows)
+                    self.compare('Participant', rows, ParticipantSerializer,
+                                 participant_values,
+                                 Participant.objects.order_by('id'))
+                    self.compare('Guess', rows, GuessSerializer,
+                                 guess_values, Guess.objects.order_by('id'))
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def populate(self, rows):
+        "one game with rows participants, each with one guess"
+        user = User.objects.create_user(username='benchserializers')
+        questionnaire = Questionnaire.objects.create(title='bench', user=user)
+        question = Question.objects.create(
+            question='bench', questionnaire=questionnaire)
+        answer = Answer.objects.create(answer='bench', question=question)
+        game = Game.objects.create(questionnaire=questionnaire)
+        Participant.objects.bulk_create(
+            [Participant(game=game, alias='alias_%d' % i,
+                         normalizedAlias=normalize_alias('alias_%d' % i))
+             for i in range(rows)], batch_size=5000)
+        Guess.objects.bulk_create(
+            [Guess(participant_id=pk, game=game, question=question,
+                   answer=answer)
+             for pk in Participant.objects.filter(
+                 game=game).values_list('id', flat=True)],
+            batch_size=5000)
+
+    def best(self, function):
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def compare(self, name, rows, serializer_class, values_serializer,
+                queryset):
+        model_time = self.best(
+            lambda: serializer_class(queryset.all(), many=True).data)
+        values_time = self.best(
+            lambda: values_serializer.serialize(queryset.all()))
+        self.stdout.write('%-12s %8d %12.4f %12.4f %7.1fx' % (
+            name, rows, model_time, values_time, model_time / values_time))
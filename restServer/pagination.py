@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    '''Cursor pagination on the primary key. Every page is an index range
+    scan starting after the last id of the previous page, so fetching a
+    page costs the same however large the table is and however deep the
+    page is. Page size is capped by max_page_size.'''
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
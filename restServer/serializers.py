@@ -1,3 +1,4 @@
+from django.db.models import QuerySet
 from models.models import Participant, Game, Guess
 from rest_framework import serializers
 
@@ -6,14 +7,17 @@ class ParticipantSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Participant
-        fields = '__all__'
+        # normalizedAlias only backs the unique alias constraint
+        exclude = ['normalizedAlias']
 
 
 class GameSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Game
-        fields = '__all__'
+        # public, players poll it: no snapshot, it holds the answer key
+        fields = ['id', 'questionnaire', 'created_at', 'state', 'publicId',
+                  'countdownTime', 'questionNo']
 
 
 class GuessSerializer(serializers.ModelSerializer):
@@ -22,3 +26,66 @@ class GuessSerializer(serializers.ModelSerializer):
         model = Guess
         # all fields
         fields = '__all__'
+
+
+class ValuesSerializer:
+    '''Read-only fast path for a ModelSerializer.
+
+    Produces the same payload as serializer_class(many=True).data, but
+    from queryset.values() rows instead of model instances. The field map
+    (output key, column, conversion) is worked out once from the model
+    serializer and reused for every row, and columns whose database value
+    is already what DRF would output are copied without any conversion.
+    '''
+
+    # DRF fields whose representation of a database value is the value
+    PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField,
+                    serializers.BooleanField, serializers.ChoiceField,
+                    serializers.PrimaryKeyRelatedField)
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._fields = None
+
+    @property
+    def fields(self):
+        '''list of (output key, values() column, conversion or None)'''
+        if self._fields is None:
+            model = self.serializer_class.Meta.model
+            fields = []
+            for name, field in self.serializer_class().fields.items():
+                column = model._meta.get_field(field.source).attname
+                convert = field.to_representation
+                if isinstance(field, self.PLAIN_FIELDS):
+                    convert = None
+                fields.append((name, column, convert))
+            self._fields = fields
+        return self._fields
+
+    @property
+    def columns(self):
+        return [column for _, column, _ in self.fields]
+
+    def values(self, queryset):
+        '''the queryset restricted to the columns the payload needs'''
+        return queryset.values(*self.columns)
+
+    def to_representation(self, row):
+        data = {}
+        for name, column, convert in self.fields:
+            value = row[column]
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def serialize(self, rows):
+        '''serialize an iterable of values() rows, or a queryset'''
+        if isinstance(rows, QuerySet):
+            rows = self.values(rows)
+        return [self.to_representation(row) for row in rows]
+
+
+participant_values = ValuesSerializer(ParticipantSerializer)
+game_values = ValuesSerializer(GameSerializer)
+guess_values = ValuesSerializer(GuessSerializer)
@@ -0,0 +1,132 @@
+import uuid
+from unittest import mock
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game, Guess
+from models.models import Questionnaire, Question, Answer, User
+from models import gamestate
+from restServer.views import BATCH_SIZE
+
+
+class GuessBatchTest(APITestCase):
+    """tests for /api/guess/batch/"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('guess-batch')
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        self.right = Answer.objects.create(
+            answer='right', question=self.question, correct=True)
+        self.wrong = Answer.objects.create(
+            answer='wrong', question=self.question)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1)
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+            for i in range(50)]
+
+    def post(self, guesses, game=None):
+        data = {'game': game or self.game.publicId, 'guesses': guesses}
+        return self.client.post(self.url, data, format='json')
+
+    def test_batch(self):
+        guesses = [{'uuidp': str(p.uuidP), 'answer': 1 + i % 2}
+                   for i, p in enumerate(self.participants)]
+        gamestate.get_game_context(self.game.publicId)
+        # participants, existing guesses, savepoint, insert,
+        # points update and savepoint release
+        with self.assertNumQueries(6):
+            response = self.post(guesses)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 50)
+        self.assertTrue(all(r['status'] == 201 for r in results))
+        self.assertEqual(results[0]['data']['answer'], self.right.id)
+        self.assertEqual(results[1]['data']['answer'], self.wrong.id)
+        self.assertEqual(Guess.objects.count(), 50)
+        self.assertEqual(
+            Guess.objects.filter(answer=self.right).count(), 25)
+        for i, participant in enumerate(self.participants):
+            participant.refresh_from_db()
+            self.assertEqual(participant.points, 1 - i % 2)
+
+    def test_batch_item_errors(self):
+        first, second = self.participants[:2]
+        Guess.objects.create(participant=second, game=self.game,
+                             question=self.question, answer=self.right)
+        guesses = [
+            {'uuidp': str(first.uuidP), 'answer': 1},
+            {'uuidp': str(first.uuidP), 'answer': 2},
+            {'uuidp': str(second.uuidP), 'answer': 1},
+            {'uuidp': str(uuid.uuid4()), 'answer': 1},
+            {'uuidp': 'garbage', 'answer': 1},
+            {'uuidp': str(self.participants[2].uuidP), 'answer': 7},
+            'not a guess',
+        ]
+        response = self.post(guesses)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results],
+                         [201, 403, 403, 403, 403, 403, 403])
+        self.assertEqual(results[1]['detail'], 'Guess already exists.')
+        self.assertEqual(results[2]['detail'], 'Guess already exists.')
+        self.assertEqual(results[3]['detail'], 'Participant does not exist.')
+        self.assertEqual(results[4]['detail'], 'Participant does not exist.')
+        self.assertEqual(results[5]['detail'], 'Invalid answer.')
+        self.assertEqual(Guess.objects.count(), 2)
+        first.refresh_from_db()
+        self.assertEqual(first.points, 1)
+
+    def test_batch_concurrent_guess(self):
+        first, second = self.participants[:2]
+        bulk_create_scored = Guess.objects.bulk_create_scored
+
+        def race(guesses):
+            # another request stores a guess of second after the check
+            Guess.objects.create(participant=second, game=self.game,
+                                 question=self.question, answer=self.wrong)
+            return bulk_create_scored(guesses)
+        with mock.patch.object(Guess.objects, 'bulk_create_scored', race):
+            response = self.post([{'uuidp': str(first.uuidP), 'answer': 1},
+                                  {'uuidp': str(second.uuidP), 'answer': 1}])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], [201, 403])
+        self.assertEqual(results[1]['detail'], 'Guess already exists.')
+        self.assertEqual(Guess.objects.count(), 2)
+        second.refresh_from_db()
+        self.assertEqual(second.points, 0)
+
+    def test_batch_other_game(self):
+        other = Game.objects.create(
+            questionnaire=self.game.questionnaire, publicId=654321,
+            questionNo=1)
+        stranger = Participant.objects.create(game=other, alias='stranger')
+        response = self.post([{'uuidp': str(stranger.uuidP), 'answer': 1}])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], [403])
+        self.assertEqual(results[0]['detail'], 'Participant does not exist.')
+        self.assertFalse(Guess.objects.exists())
+        stranger.refresh_from_db()
+        self.assertEqual(stranger.points, 0)
+
+    def test_batch_game_does_not_exist(self):
+        response = self.post([], game=654321)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, {'detail': 'Game does not exist.'})
+
+    def test_batch_too_large(self):
+        response = self.post([{}] * (BATCH_SIZE + 1))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            self.url, {'game': self.game.publicId, 'guesses': 'x'},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_not_an_object(self):
+        response = self.client.post(self.url, [{}], format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,137 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant, Guess
+from models.snapshot import compile_snapshot, get_snapshot
+from models.constants import WAITING, QUESTION, ANSWER, LEADERBOARD
+from models import histogram, snapshot
+
+
+class DistributionTest(APITestCase):
+    """answer histograms follow the guesses without scanning them"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        self.answers = [
+            Answer.objects.create(answer=text, question=question,
+                                  correct=text == 'right')
+            for text in ('right', 'wrong', 'other')]
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, state=ANSWER, questionNo=1,
+            snapshot=compile_snapshot(questionnaire.id))
+        self.question = get_snapshot(self.game.id)['questions'][0]
+        histogram.open_question(self.game.id, self.question)
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+            for i in range(6)]
+        self.url = reverse('game-distribution',
+                           kwargs={'publicId': self.game.publicId})
+
+    def guess(self, participants, answer):
+        with self.captureOnCommitCallbacks(execute=True):
+            for participant in participants:
+                response = self.client.post(reverse('guess-list'), {
+                    'game': self.game.publicId,
+                    'uuidp': participant.uuidP,
+                    'answer': answer})
+                self.assertEqual(response.status_code, 201)
+
+    def counts(self):
+        return [answer['count'] for answer in histogram.distribution(
+            self.game.id, self.question)['answers']]
+
+    def test_counters(self):
+        self.guess(self.participants[:3], 1)
+        self.guess(self.participants[3:5], 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), [3, 2, 0])
+        distribution = histogram.distribution(self.game.id, self.question)
+        self.assertEqual((distribution['total'], distribution['correct']),
+                         (5, 3))
+
+    def test_bulk_guesses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess.objects.bulk_create_scored([
+                Guess(participant=participant, game=self.game,
+                      question_id=self.question['id'],
+                      answer=self.answers[1])
+                for participant in self.participants])
+        self.assertEqual(self.counts(), [0, 6, 0])
+
+    def test_recount(self):
+        self.guess(self.participants[:2], 3)
+        # evicted
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(), [0, 0, 2])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), [0, 0, 2])
+        # a counter lost on its own
+        cache.delete(histogram._answer_key(
+            self.game.id, self.question['id'], self.answers[0].id))
+        self.guess(self.participants[2:3], 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(), [1, 0, 2])
+
+    def test_endpoint(self):
+        self.guess(self.participants[:4], 1)
+        self.guess(self.participants[4:], 2)
+        # the question is open, the correct answer is not told
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'question': self.question['id'], 'total': 6,
+            'answers': [{'answer': 'right', 'count': 4},
+                        {'answer': 'wrong', 'count': 2},
+                        {'answer': 'other', 'count': 0}]})
+        # the scores were shown, the last question left is played
+        Game.objects.filter(pk=self.game.pk).update(
+            state=LEADERBOARD, questionNo=0)
+        cache.clear()
+        response = self.client.get(
+            self.url, {'question': self.question['id']})
+        self.assertEqual(response.data['correct'], 4)
+        self.assertAlmostEqual(response.data['correctRate'], 4 / 6)
+        self.assertEqual([answer['correct']
+                          for answer in response.data['answers']],
+                         [True, False, False])
+        response = self.client.get(self.url, {'question': 0})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unplayed_questions(self):
+        # two more questions, played before the one of setUp
+        questionnaire = self.game.questionnaire
+        for i in range(2):
+            question = Question.objects.create(
+                question='question %d' % i, questionnaire=questionnaire)
+            Answer.objects.create(answer='yes', question=question,
+                                  correct=True)
+        Game.objects.filter(pk=self.game.pk).update(
+            snapshot=compile_snapshot(questionnaire.id))
+        snapshot.discard(self.game.id)
+        questions = [question['id'] for question
+                     in snapshot.get_snapshot(self.game.id)['questions']]
+
+        def correct_told(state, questionNo, question):
+            Game.objects.filter(pk=self.game.pk).update(
+                state=state, questionNo=questionNo)
+            cache.clear()
+            response = self.client.get(self.url, {'question': question})
+            self.assertEqual(response.status_code, 200)
+            return 'correct' in response.data
+
+        # in the lobby and while the question is shown or takes guesses
+        self.assertFalse(correct_told(WAITING, 3, questions[2]))
+        self.assertFalse(correct_told(QUESTION, 3, questions[2]))
+        self.assertFalse(correct_told(ANSWER, 3, questions[2]))
+        # questions still to come
+        self.assertFalse(correct_told(QUESTION, 2, questions[0]))
+        self.assertFalse(correct_told(ANSWER, 2, questions[1]))
+        # played
+        self.assertTrue(correct_told(QUESTION, 2, questions[2]))
+        self.assertTrue(correct_told(LEADERBOARD, 0, questions[0]))
@@ -0,0 +1,279 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core import checks
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game, Guess
+from models.models import Questionnaire, Question, Answer, User
+from models.constants import QUESTION
+from models import gamestate
+
+
+class GameContextTest(APITestCase):
+    """the guess hot path is served from the cached game context"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='questionnaire_title', user=self.user)
+        self.question = Question.objects.create(
+            question='this is a question', questionnaire=self.questionnaire)
+        self.question2 = Question.objects.create(
+            question='this is a question2', questionnaire=self.questionnaire)
+        self.answer = Answer.objects.create(
+            answer='this is an answer', question=self.question, correct=True)
+        self.answer2 = Answer.objects.create(
+            answer='this is an answer2', question=self.question)
+        self.answer3 = Answer.objects.create(
+            answer='this is an answer3', question=self.question2,
+            correct=True)
+        self.game = Game.objects.create(
+            questionnaire=self.questionnaire, publicId=123456, questionNo=1)
+        self.participant = Participant.objects.create(
+            game=self.game, alias='pepe')
+
+    def test_context(self):
+        context = gamestate.get_game_context(self.game.publicId)
+        self.assertEqual(context['id'], self.game.id)
+        self.assertEqual(context['question'], self.question.id)
+        self.assertEqual(context['answers'], (
+            (self.answer.id, True), (self.answer2.id, False)))
+        self.assertIsNone(gamestate.get_game_context(654321))
+        self.assertIsNone(gamestate.get_game_context('not a pin'))
+
+    def test_context_is_cached(self):
+        gamestate.get_game_context(self.game.publicId)
+        with self.assertNumQueries(0):
+            gamestate.get_game_context(self.game.publicId)
+            gamestate.get_game_context(str(self.game.publicId))
+
+    def test_context_invalidated_on_transition(self):
+        gamestate.get_game_context(self.game.publicId)
+        self.game.state = QUESTION
+        self.game.questionNo = 2
+        self.game.save()
+        context = gamestate.get_game_context(self.game.publicId)
+        self.assertEqual(context['state'], QUESTION)
+        self.assertEqual(context['question'], self.question2.id)
+        self.assertEqual(context['answers'], ((self.answer3.id, True),))
+
+    def test_context_timeout(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set:
+            gamestate.get_game_context(self.game.publicId)
+        self.assertEqual(set.call_args[0][2], gamestate.CONTEXT_TIMEOUT)
+
+    @override_settings(WEB_WORKERS=2)
+    def test_context_timeout_per_process_cache(self):
+        # other workers never see the invalidation, their copy expires soon
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set:
+            gamestate.get_game_context(self.game.publicId)
+        self.assertEqual(set.call_args[0][2], gamestate.LOCAL_TIMEOUT)
+        self.assertEqual(
+            [error.id for error in checks.run_checks(tags=['caches'])],
+            ['models.W001'])
+
+    def test_context_ignores_answer_change(self):
+        # the game plays the snapshot taken when it started
+        gamestate.get_game_context(self.game.publicId)
+        self.answer.answer = 'edited'
+        self.answer.save()
+        answer2_id = self.answer2.id
+        self.answer2.delete()
+        cache.clear()
+        context = gamestate.get_game_context(self.game.publicId)
+        self.assertEqual(context['answers'], (
+            (self.answer.id, True), (answer2_id, False)))
+        self.assertEqual(context['answerTexts'], (
+            'this is an answer', 'this is an answer2'))
+
+    def test_guess_with_warm_cache(self):
+        url = reverse('guess-list')
+        data = {'game': self.game.publicId,
+                'uuidp': self.participant.uuidP,
+                'answer': 1}
+        gamestate.get_game_context(self.game.publicId)
+        gamestate.get_participant(self.participant.uuidP)
+        # no Game, Participant, Question or Answer lookups: only the
+        # insert, guarded by the unique constraint, and the points update
+        # (plus the savepoint that wraps them)
+        with self.assertNumQueries(4):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['answer'], self.answer.id)
+        self.assertEqual(response.data['question'], self.question.id)
+        self.assertEqual(Guess.objects.count(), 1)
+        self.assertEqual(
+            Participant.objects.get(pk=self.participant.pk).points, 1)
+
+    def test_guess_invalid_participant(self):
+        url = reverse('guess-list')
+        data = {'game': self.game.publicId, 'uuidp': 'garbage', 'answer': 1}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data,
+                         {'detail': 'Participant does not exist.'})
+
+    def test_guess_participant_of_other_game(self):
+        other = Game.objects.create(
+            questionnaire=self.questionnaire, publicId=654321, questionNo=1)
+        url = reverse('guess-list')
+        data = {'game': other.publicId, 'uuidp': self.participant.uuidP,
+                'answer': 1}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data,
+                         {'detail': 'Participant is not in this game.'})
+        self.assertFalse(Guess.objects.exists())
+        self.assertEqual(
+            Participant.objects.get(pk=self.participant.pk).points, 0)
+
+
+class ParticipantJoinTest(APITestCase):
+    """joining is a single insert guarded by the unique alias constraint"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456)
+        self.url = reverse('participant-list')
+
+    def join(self, alias):
+        data = {'game': self.game.publicId, 'alias': alias}
+        return self.client.post(self.url, data, format='json')
+
+    def test_join(self):
+        gamestate.get_game_context(self.game.publicId)
+        # savepoint, insert and savepoint release
+        with self.assertNumQueries(3):
+            response = self.join('luis')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['alias'], 'luis')
+        self.assertEqual(response.data['game'], self.game.id)
+        self.assertNotIn('normalizedAlias', response.data)
+
+    def test_join_duplicate_alias(self):
+        self.assertEqual(self.join('Luis Garcia').status_code, 201)
+        for alias in ['Luis Garcia', 'luis garcia', ' LUIS  garcia ']:
+            response = self.join(alias)
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(response.data, {
+                'detail': 'Participant already exists in the game.'})
+        self.assertEqual(Participant.objects.count(), 1)
+
+    def test_same_alias_in_other_game(self):
+        other = Game.objects.create(
+            questionnaire=self.game.questionnaire, publicId=654321)
+        Participant.objects.create(game=other, alias='luis')
+        self.assertEqual(self.join('luis').status_code, 201)
+
+    def test_join_game_not_waiting(self):
+        gamestate.get_game_context(self.game.publicId)
+        self.game.state = QUESTION
+        self.game.save()
+        response = self.join('luis')
+        self.assertEqual(response.status_code, 403)
+
+    def test_normalize_aliases(self):
+        # participants stored before normalizedAlias, two of them clash
+        for alias in ['Luis', 'pepe', 'other']:
+            Participant.objects.create(game=self.game, alias=alias)
+        Participant.objects.update(normalizedAlias=None)
+        first, pepe, second = Participant.objects.order_by('pk')
+        Participant.objects.filter(pk=second.pk).update(alias='luis ')
+        out = StringIO()
+        call_command('normalizealiases', '--chunk-size', '1', stdout=out)
+        self.assertIn('3 aliases normalized, 1 duplicates kept apart',
+                      out.getvalue())
+        self.assertEqual(
+            list(Participant.objects.order_by('pk').values_list(
+                'alias', 'normalizedAlias')),
+            [('Luis', 'luis'), ('pepe', 'pepe'),
+             ('luis ', 'luis#%d' % second.pk)])
+        # the first one keeps the alias, nobody else can take it
+        self.assertEqual(self.join('LUIS').status_code, 403)
+        call_command('normalizealiases', stdout=out)
+        self.assertIn('0 aliases normalized', out.getvalue())
+
+
+class GameETagTest(APITestCase):
+    """polling an unchanged game is answered with 304 from the cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456)
+        self.url = reverse('game-detail',
+                           kwargs={'publicId': self.game.publicId})
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            # a client without the ETag gets the cached payload
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['state'], self.game.state)
+
+    def test_state_change_bumps_version(self):
+        etag = self.client.get(self.url)['ETag']
+        self.game.state = QUESTION
+        self.game.questionNo = 1
+        self.game.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['state'], QUESTION)
+        self.assertEqual(response.data['questionNo'], 1)
+
+    def test_deleted_game(self):
+        etag = self.client.get(self.url)['ETag']
+        self.game.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_game(self):
+        url = reverse('game-detail', kwargs={'publicId': 654321})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        # nothing is kept for pins nobody plays
+        self.assertIsNone(cache.get(gamestate._version_key(654321)))
+
+    def test_version_expires(self):
+        self.client.get(self.url)
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            cache.delete(gamestate._version_key(self.game.publicId))
+            self.client.get(self.url)
+        self.assertEqual(add.call_args[0][2], gamestate.CONTEXT_TIMEOUT)
+
+    @override_settings(WEB_WORKERS=2)
+    def test_version_per_process_cache(self):
+        # other workers answer 304 until their version expires
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            cache.delete(gamestate._version_key(self.game.publicId))
+            etag = self.client.get(self.url)['ETag']
+        self.assertEqual(add.call_args[0][2], gamestate.LOCAL_TIMEOUT)
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set:
+            self.game.state = QUESTION
+            self.game.save()
+        self.assertIn(
+            gamestate.LOCAL_TIMEOUT,
+            [call[0][2] for call in set.call_args_list
+             if call[0][0] == gamestate._version_key(self.game.publicId)])
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
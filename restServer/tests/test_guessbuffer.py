@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game, Guess
+from models.models import Questionnaire, Question, Answer, User
+from models.constants import ANSWER
+from models import guessbuffer
+
+
+@override_settings(GUESS_WRITE_BEHIND=True, GUESS_BUFFER_SIZE=5,
+                   GUESS_BUFFER_INTERVAL=60)
+class GuessBufferTest(APITestCase):
+    """write-behind mode for guesses"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        self.question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        self.right = Answer.objects.create(
+            answer='right', question=self.question, correct=True)
+        self.wrong = Answer.objects.create(
+            answer='wrong', question=self.question)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1)
+        guessbuffer.buffer.discard(self.game.id)
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+            for i in range(8)]
+
+    def guess(self, participant, answer=1):
+        data = {'game': self.game.publicId, 'uuidp': participant.uuidP,
+                'answer': answer}
+        return self.client.post(reverse('guess-list'), data, format='json')
+
+    def test_guesses_are_buffered(self):
+        for participant in self.participants[:4]:
+            response = self.guess(participant)
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(Guess.objects.count(), 0)
+        self.assertEqual(guessbuffer.buffer.pending(self.game.id), 4)
+        # answering twice is rejected from memory
+        response = self.guess(self.participants[0], 2)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, {'detail': 'Guess already exists.'})
+        # the fifth guess fills the buffer
+        self.guess(self.participants[4], 2)
+        self.assertEqual(Guess.objects.count(), 5)
+        self.assertEqual(guessbuffer.buffer.pending(self.game.id), 0)
+        points = [p.points for p in Participant.objects.order_by('id')]
+        self.assertEqual(points, [1, 1, 1, 1, 0, 0, 0, 0])
+
+    def test_stored_guesses_count_as_answered(self):
+        Guess.objects.create(participant=self.participants[0],
+                             game=self.game, question=self.question,
+                             answer=self.right)
+        response = self.guess(self.participants[0])
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_is_buffered(self):
+        guesses = [{'uuidp': str(p.uuidP), 'answer': 1}
+                   for p in self.participants[:3]]
+        guesses.append(guesses[0])
+        response = self.client.post(
+            reverse('guess-batch'),
+            {'game': self.game.publicId, 'guesses': guesses},
+            format='json')
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         [202, 202, 202, 403])
+        self.assertEqual(guessbuffer.buffer.pending(self.game.id), 3)
+
+    def test_flush_before_answer_statistics(self):
+        for participant in self.participants[:3]:
+            self.guess(participant)
+        self.guess(self.participants[3], 2)
+        self.assertEqual(Guess.objects.count(), 0)
+        self.game.state = ANSWER
+        self.game.save()
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session.save()
+        response = self.client.get(reverse('game-count-down'))
+        self.assertEqual(Guess.objects.count(), 4)
+        self.assertEqual(response.context['correct_percentage'], 75)
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework.reverse import reverse
+from models.models import User, Questionnaire, Question, Answer, Game
+from models.models import Participant
+from models.snapshot import compile_snapshot
+from models.constants import LEADERBOARD
+
+
+class LeaderboardTest(APITestCase):
+    """paginated ranking of the participants of a game"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        Answer.objects.create(answer='a', question=question, correct=True)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, state=LEADERBOARD,
+            snapshot=compile_snapshot(questionnaire.id))
+        # alias_i has i // 2 points
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i,
+                                       points=i // 2)
+            for i in range(250)]
+        self.url = reverse('game-leaderboard',
+                           kwargs={'publicId': self.game.publicId})
+
+    def test_pages(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 250)
+        self.assertEqual(response.data['next'], 50)
+        results = response.data['results']
+        self.assertEqual(len(results), 50)
+        self.assertEqual(results[:3], [
+            {'rank': 1, 'alias': 'alias_248', 'points': 124},
+            {'rank': 1, 'alias': 'alias_249', 'points': 124},
+            {'rank': 3, 'alias': 'alias_246', 'points': 123}])
+        response = self.client.get(self.url, {'offset': 240, 'limit': 20})
+        self.assertIsNone(response.data['next'])
+        self.assertEqual([row['alias'] for row in response.data['results']],
+                         ['alias_%d' % i for i in (8, 9, 6, 7, 4, 5, 2, 3,
+                                                   0, 1)])
+        # the page size is capped
+        response = self.client.get(self.url, {'limit': 1000})
+        self.assertEqual(len(response.data['results']), 200)
+
+    def test_participant_rank(self):
+        participant = self.participants[10]
+        response = self.client.get(self.url, {'uuidp': participant.uuidP,
+                                              'limit': 1})
+        self.assertEqual(response.data['participant'],
+                         {'rank': 239, 'points': 5})
+
+    def test_errors(self):
+        response = self.client.get(self.url, {'offset': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'uuidp': 'x'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse(
+            'game-leaderboard', kwargs={'publicId': 0}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game, Guess
+from models.models import Questionnaire, Question, Answer, User
+from models.constants import QUESTION
+
+
+class PaginationTest(APITestCase):
+    """list endpoints are keyset paginated and filterable"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        self.question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        self.question2 = Question.objects.create(
+            question='question2', questionnaire=questionnaire)
+        answer = Answer.objects.create(
+            answer='answer', question=self.question)
+        answer2 = Answer.objects.create(
+            answer='answer', question=self.question2)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456)
+        self.other = Game.objects.create(
+            questionnaire=questionnaire, publicId=654321, state=QUESTION)
+        for i in range(120):
+            participant = Participant.objects.create(
+                game=self.game, alias='alias_%d' % i)
+            Guess.objects.create(participant=participant, game=self.game,
+                                 question=self.question, answer=answer)
+            if i % 2:
+                Guess.objects.create(
+                    participant=participant, game=self.game,
+                    question=self.question2, answer=answer2)
+        Participant.objects.create(game=self.other, alias='other')
+
+    def collect(self, url, **params):
+        '''follow the next links, return all the results and pages'''
+        results = []
+        pages = 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            results.extend(response.data['results'])
+            pages += 1
+            if response.data['next'] is None:
+                return results, pages
+            response = self.client.get(response.data['next'])
+
+    def test_participant_pages(self):
+        results, pages = self.collect(reverse('participant-list'))
+        self.assertEqual(len(results), 121)
+        self.assertEqual(pages, 3)
+        ids = [r['id'] for r in results]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('guess-list'),
+                                   {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+        response = self.client.get(reverse('guess-list'),
+                                   {'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 180)
+        for i in range(100):
+            Participant.objects.create(game=self.game, alias='more_%d' % i)
+        response = self.client.get(reverse('participant-list'),
+                                   {'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 200)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_filter_by_game(self):
+        results, _ = self.collect(reverse('participant-list'),
+                                  game=self.other.publicId)
+        self.assertEqual([r['alias'] for r in results], ['other'])
+        results, _ = self.collect(reverse('participant-list'), game=111)
+        self.assertEqual(results, [])
+        response = self.client.get(reverse('participant-list'),
+                                   {'game': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filter_guesses(self):
+        results, _ = self.collect(reverse('guess-list'),
+                                  game=self.game.publicId,
+                                  question=self.question2.id)
+        self.assertEqual(len(results), 60)
+        self.assertTrue(all(r['question'] == self.question2.id
+                            for r in results))
+
+    def test_filter_games(self):
+        results, _ = self.collect(reverse('game-list'), state=QUESTION)
+        self.assertEqual([r['publicId'] for r in results], [654321])
@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from kahootclone.querycount import QueryBudgetMixin
+from models.models import Participant, Game
+from models.snapshot import compile_snapshot
+from models.models import Questionnaire, Question, Answer, User
+from models.constants import QUESTION
+
+
+class RestQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """the player endpoints run a fixed number of queries"""
+
+    # the first request of each test finds the game context cache empty
+    query_budgets = {
+        'participant-create': 5,
+        'participant-list': 1,
+        'game-detail': 1,
+        'guess-create': 7,
+        'guess-batch': 5,
+        # game context and the ranking
+        'game-leaderboard': 3,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        Answer.objects.bulk_create(
+            Answer(answer='answer %d' % i, question=question, correct=i == 0,
+                   position=i + 1) for i in range(4))
+        # started with a snapshot, like GameCreateView does
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1,
+            snapshot=compile_snapshot(questionnaire.id))
+        Participant.objects.bulk_create(
+            Participant(game=self.game, alias='p%d' % i,
+                        normalizedAlias='p%d' % i) for i in range(100))
+
+    def test_participants(self):
+        with self.assertQueryBudget('participant-create'):
+            response = self.client.post(
+                reverse('participant-list'),
+                {'game': self.game.publicId, 'alias': 'pepe'})
+        self.assertEqual(response.status_code, 201)
+        with self.assertQueryBudget('participant-list'):
+            response = self.client.get(
+                reverse('participant-list'), {'game': self.game.publicId})
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_game(self):
+        url = reverse('game-detail', kwargs={'publicId': self.game.publicId})
+        with self.assertQueryBudget('game-detail'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_leaderboard(self):
+        url = reverse('game-leaderboard',
+                      kwargs={'publicId': self.game.publicId})
+        with self.assertQueryBudget('game-leaderboard'):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 100)
+        # the next pages come from the ranking in memory
+        with self.assertNumQueries(0):
+            self.client.get(url, {'offset': 50})
+
+    def test_guesses(self):
+        self.game.state = QUESTION
+        self.game.save()
+        participants = list(Participant.objects.filter(game=self.game))
+        with self.assertQueryBudget('guess-create'):
+            response = self.client.post(reverse('guess-list'), {
+                'game': self.game.publicId,
+                'uuidp': participants[0].uuidP, 'answer': 1})
+        self.assertEqual(response.status_code, 201)
+        guesses = [{'uuidp': str(participant.uuidP), 'answer': 2}
+                   for participant in participants[1:]]
+        with self.assertQueryBudget('guess-batch'):
+            response = self.client.post(
+                reverse('guess-batch'),
+                {'game': self.game.publicId, 'guesses': guesses},
+                format='json')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,77 @@
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game, Guess
+from models.models import Questionnaire, Question, Answer, User
+from restServer.serializers import ParticipantSerializer, GameSerializer
+from restServer.serializers import GuessSerializer
+from restServer.serializers import participant_values, game_values
+from restServer.serializers import guess_values
+from models.snapshot import compile_snapshot
+
+
+class ValuesSerializerTest(APITestCase):
+    """the values() fast path builds the same payload as the
+    model serializers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        answer = Answer.objects.create(answer='answer', question=question)
+        for publicId in [123456, 654321]:
+            game = Game.objects.create(
+                questionnaire=questionnaire, publicId=publicId)
+            for i in range(5):
+                participant = Participant.objects.create(
+                    game=game, alias='alias_%d' % i, points=i)
+                Guess.objects.create(participant=participant, game=game,
+                                     question=question, answer=answer)
+
+    def check(self, serializer_class, values_serializer):
+        queryset = serializer_class.Meta.model.objects.order_by('id')
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(values_serializer.serialize(queryset), expected)
+        # same keys in the same order, and the same json
+        self.assertEqual(
+            [list(row) for row in values_serializer.serialize(queryset)],
+            [list(row) for row in expected])
+
+    def test_participant(self):
+        self.check(ParticipantSerializer, participant_values)
+
+    def test_game(self):
+        self.check(GameSerializer, game_values)
+
+    def test_guess(self):
+        self.check(GuessSerializer, guess_values)
+
+    def test_views(self):
+        game = Game.objects.first()
+        response = self.client.get(
+            reverse('game-detail', kwargs={'publicId': game.publicId}))
+        self.assertEqual(response.json(), GameSerializer(game).data)
+        response = self.client.get(
+            reverse('game-detail', kwargs={'publicId': 'x'}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('participant-list'))
+        self.assertEqual(
+            response.json()['results'],
+            ParticipantSerializer(
+                Participant.objects.order_by('id'), many=True).data)
+
+    def test_no_snapshot(self):
+        game = Game.objects.first()
+        game.snapshot = compile_snapshot(game.questionnaire_id)
+        game.save()
+        response = self.client.get(
+            reverse('game-detail', kwargs={'publicId': game.publicId}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('snapshot', response.json())
+        # nor the bookkeeping of archivegames
+        self.assertNotIn('updated_at', response.json())
+        response = self.client.get(reverse('game-list'))
+        for row in response.json()['results']:
+            self.assertNotIn('snapshot', row)
+            self.assertNotIn('updated_at', row)
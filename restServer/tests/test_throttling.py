@@ -0,0 +1,144 @@
+import threading
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.reverse import reverse
+from models.models import Participant, Game
+from models.models import Questionnaire, Question, Answer, User
+from restServer import throttling
+
+
+@override_settings(API_THROTTLES={'participant': (2, 0.1),
+                                  'ip': (5, 0.1)})
+class ThrottlingTest(APITestCase):
+    """token buckets per participant and per client address"""
+
+    def setUp(self):
+        cache.clear()
+        throttling.memory_store.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        Answer.objects.create(answer='answer', question=question,
+                              correct=True)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1)
+        self.first = Participant.objects.create(game=self.game, alias='a')
+        self.second = Participant.objects.create(game=self.game, alias='b')
+
+    def tearDown(self):
+        throttling.memory_store.clear()
+
+    def guess(self, participant):
+        data = {'game': self.game.publicId, 'uuidp': participant.uuidP,
+                'answer': 1}
+        return self.client.post(reverse('guess-list'), data, format='json')
+
+    def test_participant_bucket(self):
+        self.assertEqual(self.guess(self.first).status_code, 201)
+        self.assertEqual(self.guess(self.first).status_code, 403)
+        # rejected before any database work
+        with self.assertNumQueries(0):
+            response = self.guess(self.first)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        # other participants are not affected
+        self.assertEqual(self.guess(self.second).status_code, 201)
+
+    def test_ip_bucket(self):
+        url = reverse('participant-list')
+        statuses = [self.client.post(url, {'game': self.game.publicId,
+                                           'alias': 'alias_%d' % i},
+                                     format='json').status_code
+                    for i in range(6)]
+        self.assertEqual(statuses, [201] * 5 + [429])
+
+    def join(self, i, forwarded_for):
+        return self.client.post(
+            reverse('participant-list'),
+            {'game': self.game.publicId, 'alias': 'alias_%d' % i},
+            format='json', HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 0})
+    def test_spoofed_forwarded_for(self):
+        # no proxy: the header is the client's word, the address is used
+        statuses = [self.join(i, '10.0.0.%d' % i) for i in range(6)]
+        self.assertEqual(statuses, [201] * 5 + [429])
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_proxy_forwarded_for(self):
+        # the proxy appends the address it saw, only that one counts
+        statuses = [self.join(i, '10.0.0.%d, 192.0.2.1' % i)
+                    for i in range(6)]
+        self.assertEqual(statuses, [201] * 5 + [429])
+        self.assertEqual(self.join(6, '10.0.0.6, 192.0.2.2'), 201)
+
+    def test_rejected_participant_keeps_ip_tokens(self):
+        for _ in range(4):
+            self.guess(self.first)
+        # two guesses took ip tokens, the other two were rejected by the
+        # participant bucket and did not
+        self.assertEqual(self.guess(self.second).status_code, 201)
+        self.assertEqual(self.guess(self.second).status_code, 403)
+        self.assertEqual(self.guess(self.second).status_code, 429)
+
+    def test_batch_participant_buckets(self):
+        self.assertEqual(self.guess(self.first).status_code, 201)
+        # the batch takes a token of every participant it carries
+        guesses = [{'uuidp': str(participant.uuidP).upper(), 'answer': 1}
+                   for participant in (self.first, self.first, self.second)]
+        response = self.client.post(
+            reverse('guess-batch'),
+            {'game': self.game.publicId, 'guesses': guesses}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            [403, 429, 201])
+        self.assertEqual(self.guess(self.first).status_code, 429)
+
+    @override_settings(API_THROTTLE_STORE='cache')
+    def test_cache_store(self):
+        self.assertEqual(self.guess(self.first).status_code, 201)
+        self.assertEqual(self.guess(self.first).status_code, 403)
+        self.assertEqual(self.guess(self.first).status_code, 429)
+        self.assertEqual(throttling.memory_store._buckets, {})
+
+
+class LoadSheddingTest(APITestCase):
+    """API requests over API_MAX_INFLIGHT are rejected with 503"""
+
+    def test_shed(self):
+        user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(title='q', user=user)
+        Game.objects.create(questionnaire=questionnaire, publicId=123456)
+        url = reverse('game-detail', kwargs={'publicId': 123456})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(API_MAX_INFLIGHT=0):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            # pages other than the API are not shed
+            response = self.client.get(reverse('home'))
+            self.assertEqual(response.status_code, 200)
+
+    def test_inflight_count(self):
+        from kahootclone.middleware import LoadSheddingMiddleware
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow(request):
+            entered.set()
+            release.wait(5)
+            return 'done'
+
+        middleware = LoadSheddingMiddleware(slow)
+        request = type('Request', (), {'path': '/api/guess/'})()
+        with override_settings(API_MAX_INFLIGHT=1):
+            thread = threading.Thread(target=middleware, args=(request,))
+            thread.start()
+            entered.wait(5)
+            self.assertEqual(middleware(request).status_code, 503)
+            release.set()
+            thread.join()
+            self.assertEqual(middleware(request), 'done')
@@ -0,0 +1,147 @@
+import json
+import queue
+from unittest import mock
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from kahootclone.asgi import application
+from models.models import Participant, Game
+from models.models import Questionnaire, Question, Answer, User
+from models.constants import QUESTION, ANSWER
+from models import broadcast, gamestate
+from restServer.consumers import GAME_NOT_FOUND
+
+
+class GameSocketTest(TestCase):
+    """state transitions are pushed to the players' websockets"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire,
+            answerTime=7)
+        Answer.objects.create(answer='right', question=question,
+                              correct=True)
+        Answer.objects.create(answer='wrong', question=question)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1)
+        Participant.objects.create(game=self.game, alias='pepe', points=3)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session.save()
+
+    def advance(self):
+        '''the host clicks on next'''
+        self.client.get(reverse('game-count-down'))
+
+    async def connect(self, publicId):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'websocket', 'path': '/ws/games/%d/' % publicId,
+            'headers': [], 'query_string': b''})
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator
+
+    async def receive_json(self, communicator):
+        message = await communicator.receive_output(2)
+        self.assertEqual(message['type'], 'websocket.send')
+        return json.loads(message['text'])
+
+    async def test_push_transitions(self):
+        communicator = await self.connect(self.game.publicId)
+        self.assertEqual(await communicator.receive_output(2),
+                         {'type': 'websocket.accept'})
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'state', 'state': 1, 'questionNo': 1})
+
+        await sync_to_async(self.advance)()
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'state', 'state': QUESTION, 'questionNo': 1})
+
+        await sync_to_async(self.advance)()
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'state', 'state': ANSWER, 'questionNo': 1,
+            'question': {'question': 'question', 'answerTime': 7,
+                         'answers': ['right', 'wrong']}})
+
+        await sync_to_async(self.advance)()
+        message = await self.receive_json(communicator)
+        self.assertEqual(message['questionNo'], 0)
+        self.assertEqual(message['scores'],
+                         [{'alias': 'pepe', 'points': 3}])
+
+        channel = broadcast.game_channel(self.game.publicId)
+        self.assertEqual(broadcast.get_broadcast().subscribers(channel), 1)
+        await communicator.send_input({'type': 'websocket.disconnect',
+                                       'code': 1000})
+        await communicator.wait(2)
+        self.assertEqual(broadcast.get_broadcast().subscribers(channel), 0)
+
+    async def test_reconnect_while_answering(self):
+        await sync_to_async(self.advance)()
+        await sync_to_async(self.advance)()
+        communicator = await self.connect(self.game.publicId)
+        await communicator.receive_output(2)
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'state', 'state': ANSWER, 'questionNo': 1,
+            'question': {'question': 'question', 'answerTime': 7,
+                         'answers': ['right', 'wrong']}})
+        await communicator.send_input({'type': 'websocket.disconnect',
+                                       'code': 1000})
+        await communicator.wait(2)
+
+    async def test_transition_while_connecting(self):
+        get_game_context = gamestate.get_game_context
+
+        def read_then_advance(publicId):
+            # the state is read, then the host moves on before the
+            # socket is accepted
+            context = get_game_context(publicId)
+            self.advance()
+            return context
+        with mock.patch.object(gamestate, 'get_game_context',
+                               read_then_advance):
+            communicator = await self.connect(self.game.publicId)
+            await communicator.receive_output(2)
+            self.assertEqual((await self.receive_json(communicator))['state'],
+                             1)
+        # the transition is not lost
+        self.assertEqual((await self.receive_json(communicator))['state'],
+                         QUESTION)
+        await communicator.send_input({'type': 'websocket.disconnect',
+                                       'code': 1000})
+        await communicator.wait(2)
+
+    async def test_unknown_game(self):
+        communicator = await self.connect(654321)
+        self.assertEqual(await communicator.receive_output(2), {
+            'type': 'websocket.close', 'code': GAME_NOT_FOUND})
+
+
+class BroadcastTest(TestCase):
+    """fan-out of the broadcast backends"""
+
+    def test_in_process(self):
+        backend = broadcast.InProcessBroadcast()
+        with backend.subscribe('a') as first, backend.subscribe('a') as b:
+            with backend.subscribe('b') as other:
+                backend.publish('a', {'n': 1})
+                self.assertEqual(first.get(1), {'n': 1})
+                self.assertEqual(b.get(1), {'n': 1})
+                self.assertRaises(queue.Empty, other.get, 0.01)
+        self.assertEqual(backend.subscribers('a'), 0)
+
+    def test_cluster(self):
+        hub = []
+        worker1 = broadcast.LocalClusterBroadcast(hub)
+        worker2 = broadcast.LocalClusterBroadcast(hub)
+        with worker1.subscribe('a') as first, worker2.subscribe('a') as b:
+            # published on one worker, received on both
+            worker2.publish('a', {'answers': ('x', 'y')})
+            self.assertEqual(first.get(1), {'answers': ['x', 'y']})
+            self.assertEqual(b.get(1), {'answers': ['x', 'y']})
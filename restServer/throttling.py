@@ -0,0 +1,144 @@
+"""Token-bucket throttles for the player endpoints.
+
+Every client has a bucket of settings.API_THROTTLES[scope][0] tokens that
+refills at API_THROTTLES[scope][1] tokens per second; each request takes
+one token and is rejected with 429 and Retry-After when the bucket is
+empty. Buckets are checked before the view runs, so rejected requests
+never reach the database.
+
+Buckets live in the memory of the process by default. With
+settings.API_THROTTLE_STORE = 'cache' they are kept in the Django cache
+instead, so that several workers sharing a cache backend share the
+buckets (updates are not atomic, the limits are approximate).
+
+A guess batch carries many participants, so it takes one token of the
+bucket of each of them instead (see take_token and GuessViewSet.batch).
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import ParseError
+from rest_framework.throttling import BaseThrottle
+from models import gamestate
+
+
+class MemoryBucketStore:
+    '''buckets of this process'''
+
+    # drop full buckets when there are more than this many
+    max_buckets = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, capacity, rate):
+        '''take a token, return 0 or the seconds until one is available'''
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            # the last item is when the bucket will be full again
+            self._buckets[key] = (tokens, now,
+                                  now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_buckets:
+                # a full bucket is the same as no bucket at all
+                self._buckets = {
+                    name: bucket for name, bucket in self._buckets.items()
+                    if bucket[2] > now}
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+
+
+class CacheBucketStore:
+    '''buckets shared by all the processes that use the same cache'''
+
+    def take(self, key, capacity, rate):
+        now = time.time()
+        key = 'throttle:%s' % key
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        wait = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # after this long the bucket is full again
+        cache.set(key, (tokens, now), int(capacity / rate) + 1)
+        return wait
+
+    def clear(self):
+        pass
+
+
+memory_store = MemoryBucketStore()
+cache_store = CacheBucketStore()
+
+
+def get_store():
+    if getattr(settings, 'API_THROTTLE_STORE', 'memory') == 'cache':
+        return cache_store
+    return memory_store
+
+
+def take_token(scope, key):
+    '''take a token from the bucket of key, return 0 or the seconds
+    until one is available'''
+    capacity, rate = settings.API_THROTTLES[scope]
+    return get_store().take('%s:%s' % (scope, key), capacity, rate)
+
+
+def participant_key(uuidp):
+    '''the same bucket whatever the spelling of the uuid'''
+    return str(gamestate.parse_uuid(uuidp) or uuidp)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_key(self, request):
+        '''identity of the client, None to let the request through'''
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if key is None:
+            return True
+        self._wait = take_token(self.scope, key)
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
+
+
+class ParticipantThrottle(TokenBucketThrottle):
+    '''one bucket per participant uuid (uuidp in the request body)'''
+    scope = 'participant'
+
+    def get_key(self, request):
+        try:
+            data = request.data
+        except ParseError:
+            return None
+        if not hasattr(data, 'get'):
+            return None
+        uuidp = data.get('uuidp')
+        return participant_key(uuidp) if uuidp else None
+
+
+class ClientIPThrottle(TokenBucketThrottle):
+    '''one bucket per client address; a whole classroom may share one
+    address behind a proxy, so its bucket must be much larger'''
+    scope = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
@@ -1,32 +1,125 @@
-from models.models import Participant, Game, Guess, Answer, Question
+import math
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.http import parse_etags
+from models.models import Participant, Game, Guess, Answer
+from models.constants import WAITING, LEADERBOARD
+from models import gamestate, guessbuffer, broadcast, ranking
+from models import histogram, snapshot
 from .serializers import ParticipantSerializer, GameSerializer, GuessSerializer
+from .serializers import participant_values, game_values, guess_values
+from .pagination import KeysetPagination
+from .throttling import ParticipantThrottle, ClientIPThrottle
+from .throttling import take_token, participant_key
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
 
-class ParticipantViewSet(viewsets.ModelViewSet):
+# largest number of guesses accepted by GuessViewSet.batch
+BATCH_SIZE = 1000
+
+
+def get_answer(game, number):
+    '''return the answer with this 1-based number in the current
+    question of the game context, or None if it is not valid'''
+    try:
+        answer_id, correct = game['answers'][int(number) - 1]
+    except (IndexError, TypeError, ValueError):
+        return None
+    return Answer(id=answer_id, question_id=game['question'],
+                  correct=correct)
+
+
+def int_param(request, name):
+    '''return the integer query parameter name, None if it is missing'''
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
+
+
+def filter_by_game(request, queryset):
+    '''apply ?game=<publicId>, resolved through the game context so the
+    filter is on game_id and can use the (game, id) index'''
+    publicId = int_param(request, 'game')
+    if publicId is None:
+        return queryset
+    game = gamestate.get_game_context(publicId)
+    if game is None:
+        return queryset.none()
+    return queryset.filter(game_id=game['id'])
+
+
+class ValuesListMixin:
+    '''list through a ValuesSerializer: rows are read with values() and
+    turned into the same payload serializer_class would build'''
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.values_serializer.values(
+            self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.values_serializer.serialize(page))
+        return Response(self.values_serializer.serialize(queryset))
+
+
+class PlayerThrottleMixin:
+    '''token-bucket throttling of the endpoints used by the players'''
+    # players are anonymous, do not look up a session before throttling
+    authentication_classes = []
+    throttle_classes = [ParticipantThrottle, ClientIPThrottle]
+
+    def check_throttles(self, request):
+        # stop at the first empty bucket, so that a client rejected by its
+        # own bucket does not drain the one it shares with its classmates
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
+
+class ParticipantViewSet(PlayerThrottleMixin, ValuesListMixin,
+                         viewsets.ModelViewSet):
     queryset = Participant.objects.all()
     serializer_class = ParticipantSerializer
+    values_serializer = participant_values
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return filter_by_game(self.request, super().get_queryset())
 
     def create(self, request):
-        game = Game.objects.filter(publicId=request.data['game'])
-        if game.exists() is False:
+        # the game comes from the cached game context and the alias is
+        # checked by the unique constraint, so joining is a single insert
+        game = gamestate.get_game_context(request.data['game'])
+        if not game:
             return Response(status=403, data={
                 'detail': 'Game does not exist.'})
-        game = game[0]
         # check that all the identifiers are correct,
         # and the game is in WAITING state
-        if request.data['alias'] is None or game.state != 1:
+        if request.data['alias'] is None or game['state'] != WAITING:
             return Response(status=403, data={
                 'detail': 'Alias is already taken or \
 game is not in WAITING state.'})
-        # check that there is not already a participant
-        # with the same alias in the game
-        if Participant.objects.filter(alias=request.data['alias'], game=game):
+        participant = Participant(alias=request.data['alias'],
+                                  game_id=game['id'])
+        try:
+            with transaction.atomic():
+                participant.save()
+        except IntegrityError:
+            # there is already a participant with the same alias
             return Response(status=403, data={
                 'detail': 'Participant already exists in the game.'})
-        participant = Participant(alias=request.data['alias'], game=game)
-        participant.save()
+        # tell the host lobby (services.views.GameParticipantStreamView)
+        broadcast.publish(broadcast.lobby_channel(game['publicId']), {
+            'type': 'join', 'id': participant.id,
+            'alias': participant.alias})
         # return an http response with the all the data of the participant
         serializer = ParticipantSerializer(participant)
         return Response(status=201, data=serializer.data)
@@ -44,10 +137,130 @@ game is not in WAITING state.'})
             'detail': 'Authentication credentials were not provided.'})
 
 
-class GameViewSet(viewsets.ModelViewSet):
+class GameViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Game.objects.all()
     serializer_class = GameSerializer
+    values_serializer = game_values
     lookup_field = 'publicId'
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        state = int_param(self.request, 'state')
+        if state is not None:
+            queryset = queryset.filter(state=state)
+        return queryset
+
+    def retrieve(self, request, publicId=None):
+        # players poll this endpoint to learn about state changes. The
+        # ETag is the game version, bumped on every change, so an
+        # unchanged game is answered with 304 from the cache and the
+        # payload of each version is read from the database only once
+        try:
+            publicId = int(publicId)
+        except ValueError:
+            raise NotFound()
+        # only games that exist have a version: without one the game is
+        # read first, and a pin nobody plays keeps nothing in the cache
+        row = None
+        version = gamestate.peek_game_version(publicId)
+        if version is None:
+            version = gamestate.get_game_version(publicId)
+            row = self.values_serializer.values(
+                Game.objects.filter(publicId=publicId)).first()
+            if row is None:
+                gamestate.forget_game_version(publicId)
+                raise NotFound()
+        etag = '"%d-%s"' % (publicId, version)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if etag in etags or '*' in etags:
+                return Response(status=304, headers=headers)
+        key = 'game:%d:payload:%s' % (publicId, version)
+        data = cache.get(key)
+        if data is None:
+            if row is None:
+                row = self.values_serializer.values(
+                    Game.objects.filter(publicId=publicId)).first()
+            if row is None:
+                raise NotFound()
+            data = self.values_serializer.to_representation(row)
+            cache.set(key, data, gamestate.CONTEXT_TIMEOUT)
+        return Response(data, headers=headers)
+
+    @action(detail=True)
+    def leaderboard(self, request, publicId=None):
+        """participants by points, ?offset=0&limit=50; with ?uuidp= the
+        rank of that participant is added. Pages come from the ranking of
+        the game (models/ranking.py), the participants are not sorted again
+        for every request"""
+        game = gamestate.get_game_context(publicId)
+        if not game:
+            raise NotFound()
+        offset = max(int_param(request, 'offset') or 0, 0)
+        limit = int_param(request, 'limit')
+        if limit is None:
+            limit = KeysetPagination.page_size
+        limit = min(max(limit, 1), KeysetPagination.max_page_size)
+        game_ranking = ranking.get_ranking(game['id'], game['publicId'])
+        count = len(game_ranking)
+        data = {
+            'count': count,
+            'offset': offset,
+            'next': offset + limit if offset + limit < count else None,
+            'results': [{'rank': row['rank'], 'alias': row['alias'],
+                         'points': row['points']}
+                        for row in game_ranking.page(offset, limit)],
+        }
+        uuidp = request.query_params.get('uuidp')
+        if uuidp is not None:
+            participant = gamestate.get_participant(uuidp)
+            if not participant or participant['game'] != game['id']:
+                raise NotFound()
+            data['participant'] = {
+                'rank': game_ranking.rank(participant['id']),
+                'points': game_ranking.points_of(participant['id'])}
+        return Response(data)
+
+    @action(detail=True)
+    def distribution(self, request, publicId=None):
+        """guesses of every answer of a question, the current one or
+        ?question=<id>, read from the answer histograms
+        (models/histogram.py). Which answers are correct is only told
+        once the question is closed"""
+        game = gamestate.get_game_context(publicId)
+        if not game:
+            raise NotFound()
+        question_id = int_param(request, 'question')
+        if question_id is None:
+            question_id = game['question']
+        game_snapshot = snapshot.get_snapshot(game['id'])
+        position, question = next(
+            ((position, question) for position, question
+             in enumerate(game_snapshot['questions'], 1)
+             if question['id'] == question_id), (None, None))
+        if question is None:
+            raise NotFound()
+        distribution = histogram.distribution(game['id'], question)
+        # questionNo counts down from the last question and is decremented
+        # once the scores of the current one are shown (ANSWER is the state
+        # while it takes guesses), so the questions after it are played
+        closed = (position > game['questionNo']
+                  or game['state'] == LEADERBOARD)
+        answers = [{'answer': answer['answer'], 'count': answer['count']}
+                   for answer in distribution['answers']]
+        data = {'question': question_id, 'total': distribution['total'],
+                'answers': answers}
+        if closed:
+            for answer, counted in zip(answers, distribution['answers']):
+                answer['correct'] = counted['correct']
+            data['correct'] = distribution['correct']
+            data['correctRate'] = (
+                distribution['correct'] / distribution['total']
+                if distribution['total'] else 0)
+        return Response(data)
 
     def destroy(self, request, *args, **kwargs):
         return Response(status=405, data={
@@ -62,43 +275,146 @@ class GameViewSet(viewsets.ModelViewSet):
             'detail': 'Authentication credentials were not provided.'})
 
 
-class GuessViewSet(viewsets.ModelViewSet):
+class GuessViewSet(PlayerThrottleMixin, ValuesListMixin,
+                   viewsets.ModelViewSet):
     queryset = Guess.objects.all()
     serializer_class = GuessSerializer
+    values_serializer = guess_values
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = filter_by_game(self.request, super().get_queryset())
+        question = int_param(self.request, 'question')
+        if question is not None:
+            queryset = queryset.filter(question_id=question)
+        return queryset
 
     def create(self, request):
-        game = Game.objects.filter(publicId=request.data['game']).first()
+        # game, current question and answers come from the cached game
+        # context, so a guess only costs the checks and the insert
+        game = gamestate.get_game_context(request.data['game'])
         if not game:
             return Response(status=403, data={
                 'detail': 'Game does not exist.'})
-        participant = Participant.objects.filter(
-            uuidP=request.data['uuidp']).first()
+        participant = gamestate.get_participant(request.data['uuidp'])
         if not participant:
             return Response(status=403, data={
                 'detail': 'Participant does not exist.'})
-        question_index = game.questionNo
-        question = Question.objects.filter(
-            questionnaire=game.questionnaire)[question_index-1]
+        if participant['game'] != game['id']:
+            return Response(status=403, data={
+                'detail': 'Participant is not in this game.'})
         # if game.state != 2:
         #     return Response(status=403, data={
         #                   'detail': 'wait until the question is shown.'})
-        try:
-            answer = list(Answer.objects.filter(
-                question=question))[int(request.data['answer']) - 1]
-        except IndexError:
+        answer = get_answer(game, request.data['answer'])
+        if answer is None:
             return Response(status=403, data={
                 'detail': 'Invalid answer.'})
-        guess_exists = Guess.objects.filter(
-            participant=participant, question=question).exists()
-        if guess_exists:
+        guess = Guess(participant_id=participant['id'], game_id=game['id'],
+                      question_id=game['question'], answer=answer)
+        if guessbuffer.enabled():
+            # write-behind: the guess is stored by the next flush
+            if not guessbuffer.buffer.add(guess):
+                return Response(status=403, data={
+                    'detail': 'Guess already exists.'})
+            serializer = GuessSerializer(guess)
+            return Response(status=202, data=serializer.data)
+        try:
+            # unique_guess_per_question rejects a second guess
+            guess.save()
+        except IntegrityError:
             return Response(status=403, data={
                 'detail': 'Guess already exists.'})
-        guess = Guess(participant=participant,
-                      game=game, question=question, answer=answer)
-        guess.save()
         serializer = GuessSerializer(guess)
         return Response(status=201, data=serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """create many guesses for one game with a constant number of
+        queries: {"game": publicId, "guesses": [{"uuidp", "answer"}]}.
+        Every item gets its own status in the results list"""
+        if not isinstance(request.data, dict):
+            return Response(status=400, data={
+                'detail': 'Expected an object with game and guesses.'})
+        game = gamestate.get_game_context(request.data.get('game'))
+        if not game:
+            return Response(status=403, data={
+                'detail': 'Game does not exist.'})
+        items = request.data.get('guesses')
+        if not isinstance(items, list) or len(items) > BATCH_SIZE:
+            return Response(status=400, data={
+                'detail': 'guesses must be a list of at most %d items.'
+                % BATCH_SIZE})
+        write_behind = guessbuffer.enabled()
+        uuids = [gamestate.parse_uuid(item.get('uuidp'))
+                 if isinstance(item, dict) else None for item in items]
+        # every item takes a token of its participant, as a guess would;
+        # the throttles of the view only saw the address
+        waits = [take_token('participant', participant_key(uuidP))
+                 if uuidP else 0 for uuidP in uuids]
+        # one query for the participants of the game and one for the
+        # guesses they have already made to the current question
+        participants = dict(Participant.objects.filter(
+            game_id=game['id'],
+            uuidP__in=[uuidP for uuidP, wait in zip(uuids, waits)
+                       if uuidP and not wait]).values_list('uuidP', 'id'))
+        answered = set()
+        if not write_behind:
+            answered = set(Guess.objects.filter(
+                question_id=game['question'],
+                participant_id__in=participants.values()).values_list(
+                'participant_id', flat=True))
+        results = []
+        guesses = []
+        for item, uuidP, wait in zip(items, uuids, waits):
+            if wait:
+                results.append({
+                    'status': 429,
+                    'detail': 'Request was throttled. Expected available '
+                              'in %d seconds.' % math.ceil(wait)})
+                continue
+            participant_id = participants.get(uuidP)
+            if participant_id is None:
+                results.append({'status': 403,
+                                'detail': 'Participant does not exist.'})
+                continue
+            answer = get_answer(game, item.get('answer'))
+            if answer is None:
+                results.append({'status': 403,
+                                'detail': 'Invalid answer.'})
+                continue
+            if participant_id in answered:
+                results.append({'status': 403,
+                                'detail': 'Guess already exists.'})
+                continue
+            answered.add(participant_id)
+            guess = Guess(participant_id=participant_id, game_id=game['id'],
+                          question_id=game['question'], answer=answer)
+            if write_behind and not guessbuffer.buffer.add(guess):
+                results.append({'status': 403,
+                                'detail': 'Guess already exists.'})
+                continue
+            guesses.append(guess)
+            results.append(guess)
+        # ids of the guesses that a concurrent request stored first
+        duplicates = set()
+        if not write_behind:
+            try:
+                Guess.objects.bulk_create_scored(guesses)
+            except IntegrityError:
+                for guess in guesses:
+                    try:
+                        guess.save()
+                    except IntegrityError:
+                        duplicates.add(id(guess))
+        created = 202 if write_behind else 201
+        results = [
+            {'status': 403, 'detail': 'Guess already exists.'}
+            if id(result) in duplicates else
+            {'status': created, 'data': GuessSerializer(result).data}
+            if isinstance(result, Guess) else result for result in results]
+        return Response(status=200, data={'results': results})
+
     def destroy(self, request, *args, **kwargs):
         return Response(status=403, data={
             'detail': 'Authentication credentials were not provided.'})
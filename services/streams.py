@@ -0,0 +1,132 @@
+"""Server-sent events with the participants joining the game of the host.
+
+Served straight from the ASGI application (see kahootclone/asgi.py), next
+to the websockets, so an open lobby holds no worker thread: the database
+is only read through sync_to_async and joins are awaited on the lobby
+channel. The participants that joined before the connection (or after
+the Last-Event-ID sent by a reconnecting browser) are sent first, then
+one event per join notification, until the game leaves the WAITING state.
+
+Joins may be handled by any worker, so the stream is only offered when
+the broadcast reaches every worker (broadcast.reaches_every_worker: a
+single worker process, or a shared backend); otherwise it answers 204,
+which tells EventSource not to reconnect, and the lobby page polls
+GameUpdateParticipantView?since= instead.
+"""
+import asyncio
+import json
+from importlib import import_module
+from http.cookies import SimpleCookie
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from models.models import Game, Participant
+from models import broadcast, constants
+
+# seconds between keep-alive comments while nobody joins
+KEEPALIVE = 15
+
+CLOSE = b'event: close\ndata: {}\n\n'
+
+
+def event(id, alias):
+    return ('id: %d\ndata: %s\n\n' % (
+        id, json.dumps({'alias': alias}))).encode()
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _get_game(scope):
+    '''id and publicId of the game of the session, or None'''
+    cookie = SimpleCookie(_header(scope, b'cookie') or '')
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    game_id = store(morsel.value).get('game_id')
+    return Game.objects.filter(pk=game_id).values('id', 'publicId').first()
+
+
+def _joined(game_id, last_id):
+    '''state of the game and (id, alias) of the participants that joined
+    after last_id'''
+    state = Game.objects.filter(pk=game_id).values_list(
+        'state', flat=True).first()
+    return state, list(Participant.objects.filter(
+        game_id=game_id, id__gt=last_id).order_by('id').values_list(
+        'id', 'alias'))
+
+
+async def _respond(send, status):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def participant_stream(scope, receive, send):
+    if not broadcast.reaches_every_worker():
+        await _respond(send, 204)
+        return
+    game = await sync_to_async(_get_game)(scope)
+    if game is None:
+        await _respond(send, 404)
+        return
+    try:
+        last_id = int(_header(scope, b'last-event-id') or 0)
+    except ValueError:
+        last_id = 0
+    # subscribe before reading the state and the participants, so no join
+    # nor the start of the game is missed
+    subscription = broadcast.subscribe(
+        broadcast.lobby_channel(game['publicId']))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+
+        async def write(body):
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+
+        state, joined = await sync_to_async(_joined)(game['id'], last_id)
+        for id, alias in joined:
+            last_id = id
+            await write(event(id, alias))
+        if state != constants.WAITING:
+            await send({'type': 'http.response.body', 'body': CLOSE})
+            return
+        receiving = asyncio.ensure_future(receive())
+        publishing = asyncio.ensure_future(subscription.aget())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    [receiving, publishing], timeout=KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    await write(b': keepalive\n\n')
+                    continue
+                if receiving in done:
+                    # the browser went away
+                    if receiving.result()['type'] == 'http.disconnect':
+                        return
+                    receiving = asyncio.ensure_future(receive())
+                if publishing in done:
+                    message = publishing.result()
+                    if message['type'] == 'close':
+                        await send({'type': 'http.response.body',
+                                    'body': CLOSE})
+                        return
+                    if message['id'] > last_id:
+                        last_id = message['id']
+                        await write(event(message['id'], message['alias']))
+                    publishing = asyncio.ensure_future(subscription.aget())
+        finally:
+            receiving.cancel()
+            publishing.cancel()
+    finally:
+        subscription.close()
@@ -0,0 +1,105 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from models.models import Questionnaire, Question, Answer, User
+from models import contentcache
+from models.snapshot import compile_snapshot
+
+
+class ContentCacheTest(TestCase):
+    """authoring pages are read from the database once per change"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        self.question = Question.objects.create(
+            question='question', questionnaire=self.questionnaire)
+        self.answer = Answer.objects.create(
+            answer='answer', question=self.question, correct=True)
+        self.client.force_login(self.user)
+
+    def get(self, name, *args):
+        response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_warm_pages(self):
+        pages = [('home',), ('questionnaire-list',),
+                 ('questionnaire-detail', self.questionnaire.id),
+                 ('question-detail', self.question.id)]
+        for page in pages:
+            self.get(*page)
+        for page in pages:
+            # session and user only
+            with self.assertNumQueries(2):
+                self.get(*page)
+
+    def test_question_changed(self):
+        self.get('questionnaire-detail', self.questionnaire.id)
+        self.question.question = 'edited'
+        self.question.save()
+        self.assertContains(
+            self.get('questionnaire-detail', self.questionnaire.id),
+            'edited')
+
+    def test_answer_changed(self):
+        url = ('question-detail', self.question.id)
+        self.assertContains(self.get(*url), 'answer')
+        Answer.objects.create(answer='another', question=self.question)
+        self.assertContains(self.get(*url), 'another')
+        self.assertContains(
+            self.get('questionnaire-detail', self.questionnaire.id),
+            '2 answers')
+        self.answer.delete()
+        self.assertNotContains(self.get(*url), '>answer<')
+
+    def test_questionnaire_changed(self):
+        self.get('home')
+        self.get('questionnaire-list')
+        self.questionnaire.title = 'renamed'
+        self.questionnaire.save()
+        self.assertContains(self.get('home'), 'renamed')
+        self.assertContains(self.get('questionnaire-list'), 'renamed')
+        Questionnaire.objects.create(title='new', user=self.user)
+        self.assertContains(self.get('questionnaire-list'), 'new')
+
+    def test_snapshot(self):
+        def build():
+            return compile_snapshot(self.questionnaire.id)
+
+        first = contentcache.cached(
+            contentcache.QUESTIONNAIRE, self.questionnaire.id, 'snapshot',
+            build)
+        with self.assertNumQueries(0):
+            self.assertEqual(contentcache.cached(
+                contentcache.QUESTIONNAIRE, self.questionnaire.id,
+                'snapshot', build), first)
+        self.answer.correct = False
+        self.answer.save()
+        self.assertNotEqual(contentcache.cached(
+            contentcache.QUESTIONNAIRE, self.questionnaire.id, 'snapshot',
+            build), first)
+
+    def test_other_user(self):
+        self.get('questionnaire-detail', self.questionnaire.id)
+        other = User.objects.create_user(username='b', password='b')
+        self.client.force_login(other)
+        response = self.client.get(reverse(
+            'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertTemplateUsed(response, 'error.html')
+
+    def test_cascade(self):
+        for i in range(19):
+            question = Question.objects.create(
+                question='question %d' % i,
+                questionnaire=self.questionnaire)
+            Answer.objects.bulk_create(
+                Answer(answer='answer %d' % j, question=question,
+                       position=j + 1) for j in range(4))
+        self.get('questionnaire-list')
+        # the collector's selects and deletes, none per question or answer
+        with self.assertNumQueries(9):
+            self.questionnaire.delete()
+        self.assertNotContains(self.get('questionnaire-list'), '>q<')
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.urls import reverse
+from models.models import Questionnaire, Question, Answer, User
+
+
+class MoveViewTest(TestCase):
+    """the owner reorders questions and answers"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        self.questions = [
+            Question.objects.create(question='question %d' % i,
+                                    questionnaire=self.questionnaire)
+            for i in range(3)]
+        self.answers = [
+            Answer.objects.create(answer='answer %d' % i,
+                                  question=self.questions[0])
+            for i in range(3)]
+        self.client.force_login(self.user)
+
+    def test_move_question(self):
+        response = self.client.post(
+            reverse('question-move', args=[self.questions[2].id]),
+            {'position': 1})
+        self.assertRedirects(response, reverse(
+            'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertEqual(
+            list(Question.objects.values_list('id', flat=True)),
+            [self.questions[i].id for i in (2, 0, 1)])
+        response = self.client.get(reverse(
+            'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertContains(response, reverse(
+            'question-move', args=[self.questions[0].id]))
+
+    def test_move_answer(self):
+        response = self.client.post(
+            reverse('answer-move', args=[self.answers[0].id]),
+            {'position': 2})
+        self.assertRedirects(response, reverse(
+            'question-detail', args=[self.questions[0].id]))
+        self.assertEqual(
+            list(Answer.objects.values_list('id', flat=True)),
+            [self.answers[i].id for i in (1, 0, 2)])
+
+    def test_bad_position(self):
+        response = self.client.post(
+            reverse('question-move', args=[self.questions[0].id]),
+            {'position': 'first'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_owner(self):
+        other = User.objects.create_user(username='b', password='b')
+        self.client.force_login(other)
+        response = self.client.post(
+            reverse('question-move', args=[self.questions[2].id]),
+            {'position': 1})
+        self.assertTemplateUsed(response, 'error.html')
+        self.assertEqual(
+            list(Question.objects.values_list('id', flat=True)),
+            [question.id for question in self.questions])
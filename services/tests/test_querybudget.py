@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from kahootclone.querycount import QueryBudgetMixin
+from models.models import Questionnaire, Question, Answer, User
+from models.models import Game, Participant, Guess
+from models.snapshot import compile_snapshot
+
+
+class ServicesQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """the number of queries of a page does not grow with its content"""
+
+    # session and user included
+    query_budgets = {
+        'questionnaire-detail': 4,
+        'game-count-down:waiting': 7,
+        'game-count-down:question': 9,
+        'game-count-down:answer': 8,
+        'game-count-down:leaderboard': 3,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        for i in range(10):
+            question = Question.objects.create(
+                question='question %d' % i,
+                questionnaire=self.questionnaire)
+            Answer.objects.bulk_create(
+                Answer(answer='answer %d' % j, question=question,
+                       correct=j == 0, position=j + 1) for j in range(4))
+        # started with a snapshot, like GameCreateView does
+        self.game = Game.objects.create(
+            questionnaire=self.questionnaire, publicId=123456, questionNo=2,
+            snapshot=compile_snapshot(self.questionnaire.id))
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='p%d' % i)
+            for i in range(20)]
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session.save()
+
+    def test_questionnaire_detail(self):
+        with self.assertQueryBudget('questionnaire-detail'):
+            response = self.client.get(reverse(
+                'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertContains(response, '4 answers', count=10)
+
+    def test_game_count_down(self):
+        url = reverse('game-count-down')
+        with self.assertQueryBudget('game-count-down:waiting'):
+            self.client.get(url)
+        with self.assertQueryBudget('game-count-down:question'):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['answers']), 4)
+        question = response.context['question']
+        answer = Answer.objects.get(question_id=question['id'], correct=True)
+        # the answer histograms are updated when the guesses commit
+        with self.captureOnCommitCallbacks(execute=True):
+            for participant in self.participants:
+                Guess.objects.create(participant=participant, game=self.game,
+                                     question_id=question['id'],
+                                     answer=answer)
+        with self.assertQueryBudget('game-count-down:answer'):
+            response = self.client.get(url)
+        self.assertEqual(response.context['correct_percentage'], 100)
+        # the last question
+        self.client.get(url)
+        self.client.get(url)
+        with self.assertQueryBudget('game-count-down:leaderboard'):
+            self.client.get(url)
+        with self.assertQueryBudget('game-count-down:leaderboard'):
+            response = self.client.get(url)
+        self.assertIn('third', response.context)
+        podium = [response.context[key]['points']
+                  for key in ('first', 'second', 'third')]
+        self.assertEqual(podium, sorted(podium, reverse=True))
+
+    @override_settings(DEBUG=True)
+    def test_headers(self):
+        response = self.client.get(reverse(
+            'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertLessEqual(int(response['X-DB-Query-Count']),
+                             self.query_budgets['questionnaire-detail'])
+        self.assertGreaterEqual(float(response['X-DB-Time']), 0)
+
+    def test_no_headers(self):
+        response = self.client.get(reverse(
+            'questionnaire-detail', args=[self.questionnaire.id]))
+        self.assertNotIn('X-DB-Query-Count', response)
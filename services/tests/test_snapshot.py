@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from models.models import Questionnaire, Question, Answer, User
+from models.models import Game, Participant
+from models.constants import LEADERBOARD
+
+
+class GameSnapshotTest(TestCase):
+    """a started game does not read questions and answers any more"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        self.questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        self.questions = []
+        for i in range(2):
+            question = Question.objects.create(
+                question='question %d' % i, questionnaire=self.questionnaire)
+            Answer.objects.create(answer='right %d' % i, question=question,
+                                  correct=True)
+            Answer.objects.create(answer='wrong %d' % i, question=question)
+            self.questions.append(question)
+        self.client.force_login(self.user)
+
+    def test_play(self):
+        self.client.get(reverse('game-create',
+                                args=[self.questionnaire.id]))
+        game = Game.objects.get(questionnaire=self.questionnaire)
+        self.assertEqual(game.questionNo, 2)
+        self.assertEqual(len(game.snapshot['questions']), 2)
+        participant = Participant.objects.create(game=game, alias='pepe')
+        # the author edits the questionnaire while the game runs
+        self.questions[1].question = 'edited'
+        self.questions[1].save()
+        Answer.objects.filter(answer='wrong 1').delete()
+        url = reverse('game-count-down')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+            response = self.client.get(url)
+            self.assertEqual(response.context['question']['question'],
+                             'question 1')
+            self.assertEqual([answer['answer'] for answer in
+                              response.context['answers']],
+                             ['right 1', 'wrong 1'])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('guess-list'), {
+                    'game': game.publicId, 'uuidp': participant.uuidP,
+                    'answer': 1})
+            response = self.client.get(url)
+            self.assertEqual(response.context['correct'], 'right 1')
+            self.assertEqual(response.context['correct_percentage'], 100)
+            while Game.objects.get(pk=game.pk).state != LEADERBOARD:
+                self.client.get(url)
+        for query in queries.captured_queries:
+            self.assertNotIn('models_question', query['sql'])
+            self.assertNotIn('models_answer"', query['sql'])
@@ -0,0 +1,213 @@
+import json
+from unittest import mock
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from kahootclone.asgi import application
+from models.models import Questionnaire, Question, Answer, User
+from models.models import Game, Participant
+from models import broadcast
+from services import streams
+
+STREAM_SERVICE = 'game-participantstream'
+
+
+class GameParticipantStreamTest(TestCase):
+    """the host lobby receives only the participants that join"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        question = Question.objects.create(
+            question='question', questionnaire=questionnaire)
+        Answer.objects.create(answer='answer', question=question,
+                              correct=True)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456, questionNo=1)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session.save()
+        self.channel = broadcast.lobby_channel(self.game.publicId)
+        # joins handled by any worker reach the stream
+        self.broadcast = broadcast.LocalClusterBroadcast([])
+        patcher = mock.patch.object(broadcast, '_broadcast', self.broadcast)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def join(self, alias):
+        return self.client.post(
+            reverse('participant-list'),
+            {'game': self.game.publicId, 'alias': alias})
+
+    async def connect(self, *headers):
+        cookie = '%s=%s' % (settings.SESSION_COOKIE_NAME,
+                            self.client.cookies[
+                                settings.SESSION_COOKIE_NAME].value)
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'method': 'GET', 'path': reverse(STREAM_SERVICE),
+            'query_string': b'', 'headers': [
+                (b'cookie', cookie.encode())] + list(headers)})
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        return communicator
+
+    async def start(self, communicator):
+        message = await communicator.receive_output(2)
+        self.assertEqual(message['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'),
+                      message['headers'])
+
+    async def receive(self, communicator):
+        message = await communicator.receive_output(2)
+        return message['body'].decode()
+
+    @staticmethod
+    def parse(event):
+        '''(id, alias) of a participant event'''
+        lines = event.splitlines()
+        return (int(lines[0][len('id: '):]),
+                json.loads(lines[1][len('data: '):])['alias'])
+
+    async def test_stream(self):
+        first = await sync_to_async(Participant.objects.create)(
+            game=self.game, alias='first')
+        communicator = await self.connect()
+        await self.start(communicator)
+        self.assertEqual(self.parse(await self.receive(communicator)),
+                         (first.id, 'first'))
+        # the stream waits for join notifications, no polling
+        await sync_to_async(self.join)('second')
+        second = await sync_to_async(Participant.objects.get)(alias='second')
+        self.assertEqual(self.parse(await self.receive(communicator)),
+                         (second.id, 'second'))
+        # the game starts, the stream ends
+        await sync_to_async(self.client.get)(reverse('game-count-down'))
+        message = await communicator.receive_output(2)
+        self.assertEqual(message['body'], streams.CLOSE)
+        self.assertFalse(message.get('more_body', False))
+        await communicator.wait(2)
+        self.assertEqual(self.broadcast.subscribers(self.channel), 0)
+
+    async def test_reconnect(self):
+        first = await sync_to_async(Participant.objects.create)(
+            game=self.game, alias='first')
+        second = await sync_to_async(Participant.objects.create)(
+            game=self.game, alias='second')
+        communicator = await self.connect(
+            (b'last-event-id', str(first.id).encode()))
+        await self.start(communicator)
+        self.assertEqual(self.parse(await self.receive(communicator)),
+                         (second.id, 'second'))
+        # the browser goes away
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(2)
+        self.assertEqual(self.broadcast.subscribers(self.channel), 0)
+
+    async def test_keepalive(self):
+        with mock.patch.object(streams, 'KEEPALIVE', 0.01):
+            communicator = await self.connect()
+            await self.start(communicator)
+            self.assertEqual(await self.receive(communicator),
+                             ': keepalive\n\n')
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(2)
+
+    async def test_game_starts_while_connecting(self):
+        get_game = streams._get_game
+
+        def start_after_read(scope):
+            # the game starts before the stream subscribes to its lobby
+            game = get_game(scope)
+            self.client.get(reverse('game-count-down'))
+            return game
+
+        with mock.patch.object(streams, '_get_game', start_after_read):
+            communicator = await self.connect()
+            await self.start(communicator)
+            message = await communicator.receive_output(2)
+        self.assertEqual(message['body'], streams.CLOSE)
+        await communicator.wait(2)
+
+    async def test_single_worker(self):
+        # one worker handles every join, in-process fan-out is enough
+        with mock.patch.object(broadcast, '_broadcast',
+                               broadcast.InProcessBroadcast()):
+            communicator = await self.connect()
+            await self.start(communicator)
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(2)
+            response = await sync_to_async(self.client.get)(
+                reverse('game-create', args=[self.game.questionnaire_id]))
+        self.assertTrue(response.context['event_stream'])
+
+    @override_settings(WEB_WORKERS=2)
+    async def test_not_shared(self):
+        # joins handled by other workers would never arrive, poll instead
+        with mock.patch.object(broadcast, '_broadcast',
+                               broadcast.InProcessBroadcast()):
+            communicator = await self.connect()
+            message = await communicator.receive_output(2)
+            self.assertEqual(message['status'], 204)
+            response = await sync_to_async(self.client.get)(
+                reverse('game-create', args=[self.game.questionnaire_id]))
+        self.assertFalse(response.context['event_stream'])
+        self.assertNotContains(response, 'EventSource')
+
+    def test_wsgi(self):
+        # outside the ASGI application there is no stream
+        response = self.client.get(reverse(STREAM_SERVICE))
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(
+            reverse('game-create', args=[self.game.questionnaire_id]))
+        self.assertTrue(response.context['event_stream'])
+        self.assertContains(response, 'EventSource')
+
+
+class GameUpdateParticipantSinceTest(TestCase):
+    """?since returns only the participants that joined later"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='a', password='a')
+        questionnaire = Questionnaire.objects.create(
+            title='q', user=self.user)
+        self.game = Game.objects.create(
+            questionnaire=questionnaire, publicId=123456)
+        self.participants = [
+            Participant.objects.create(game=self.game, alias='alias_%d' % i)
+            for i in range(5)]
+        session = self.client.session
+        session['game_id'] = self.game.id
+        session['publicId'] = self.game.publicId
+        session.save()
+        self.url = reverse('game-updateparticipant')
+
+    def test_full_list(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['participants'],
+                         ['alias_%d' % i for i in range(5)])
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['last'], self.participants[-1].id)
+        self.assertEqual(data['publicId'], self.game.publicId)
+
+    def test_since(self):
+        data = self.client.get(
+            self.url, {'since': self.participants[2].id}).json()
+        self.assertEqual(data['participants'], ['alias_3', 'alias_4'])
+        self.assertEqual(data['count'], 5)
+        last = data['last']
+        data = self.client.get(self.url, {'since': last}).json()
+        self.assertEqual(data['participants'], [])
+        self.assertEqual(data['last'], last)
+        Participant.objects.create(game=self.game, alias='late')
+        data = self.client.get(self.url, {'since': last}).json()
+        self.assertEqual(data['participants'], ['late'])
+        self.assertEqual(data['count'], 6)
+
+    def test_invalid_since(self):
+        response = self.client.get(self.url, {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
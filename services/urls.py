@@ -19,12 +19,16 @@ urlpatterns = [
          views.QuestionRemoveView.as_view(), name='question-remove'),
     path('questionupdate/<int:pk>',
          views.QuestionUpdateView.as_view(), name='question-update'),
+    path('questionmove/<int:pk>',
+         views.QuestionMoveView.as_view(), name='question-move'),
     path('questioncreate/<int:questionnaireid>',
          views.QuestionCreateView.as_view(), name='question-create'),
     path('answercreate/<int:questionid>',
          views.AnswerCreateView.as_view(), name='answer-create'),
     path('answerremove/<int:pk>',
          views.AnswerRemoveView.as_view(), name='answer-remove'),
+    path('answermove/<int:pk>',
+         views.AnswerMoveView.as_view(), name='answer-move'),
     path('answerupdate/<int:pk>',
          views.AnswerUpdateView.as_view(), name='answer-update'),
     path('gamecreate/<int:questionnaireid>',
@@ -32,6 +36,9 @@ urlpatterns = [
     path('gameUpdateParticipant/',
          views.GameUpdateParticipantView.as_view(),
          name='game-updateparticipant'),
+    path('gameParticipantStream/',
+         views.GameParticipantStreamView.as_view(),
+         name='game-participantstream'),
     path('gamecountdown/', views.GameCountdownView.as_view(),
          name='game-count-down'),
 ]
@@ -1,14 +1,16 @@
 from django.shortcuts import render
 from django.views import generic
 from models.models import Questionnaire, Question
-from models.models import Answer, Game, Participant, Guess
+from models.models import Answer, Game, Participant, PinsExhausted
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
 from django.shortcuts import redirect
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
-from models import constants
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.db.models import Count
+from models import constants, guessbuffer, gamestate, broadcast
+from models import contentcache, deletion, histogram, ranking, snapshot
 import os
 
 
@@ -20,8 +22,11 @@ class HomeView(generic.ListView):
     # Mostrar los cuestionarios del usuario logado
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Questionnaire.objects.filter(
-                user=self.request.user).order_by('-updated_at')[:5]
+            user = self.request.user
+            return contentcache.cached(
+                contentcache.USER, user.id, 'latest',
+                lambda: list(Questionnaire.objects.filter(
+                    user=user).order_by('-updated_at')[:5]))
         else:
             return None
 
@@ -35,20 +40,42 @@ class QuestionnaireView(LoginRequiredMixin, generic.DetailView):
         if not self.request.user.is_authenticated:
             return redirect('login')
         obj = self.get_object()
-        if obj.user != self.request.user:
+        if obj.user_id != self.request.user.id:
             return render(request, 'error.html')
         return super().dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        # dispatch and get both need it, read it only once and keep it
+        # in the cache until the questionnaire changes
+        if not hasattr(self, '_object'):
+            self._object = contentcache.cached(
+                contentcache.QUESTIONNAIRE, self.kwargs['pk'], 'object',
+                lambda: super(QuestionnaireView, self).get_object(queryset))
+        return self._object
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # number of answers of every question in the same query
+        context['questions'] = contentcache.cached(
+            contentcache.QUESTIONNAIRE, self.object.id, 'questions',
+            lambda: list(self.object.question_set.annotate(
+                answerCount=Count('answer'))))
+        return context
+
 
 class QuestionnaireListView(LoginRequiredMixin, generic.ListView):
     template_name = 'questionnaire-list.html'
     model = Questionnaire
+    context_object_name = 'questionnaire_list'
 
     # Mostrar los cuestionarios del usuario logado
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Questionnaire.objects.filter(
-                user=self.request.user).order_by('-updated_at')
+            user = self.request.user
+            return contentcache.cached(
+                contentcache.USER, user.id, 'all',
+                lambda: list(Questionnaire.objects.filter(
+                    user=user).order_by('-updated_at')))
 
 
 class QuestionnaireRemoveView(LoginRequiredMixin, generic.DeleteView):
@@ -64,6 +91,12 @@ class QuestionnaireRemoveView(LoginRequiredMixin, generic.DeleteView):
             return render(request, 'error.html')
         return super().dispatch(request, *args, **kwargs)
 
+    def delete(self, request, *args, **kwargs):
+        # large questionnaires are deleted in the background
+        self.object = self.get_object()
+        deletion.delete_questionnaire(self.object)
+        return redirect(self.get_success_url())
+
 
 class QuestionnaireUpdateView(LoginRequiredMixin, generic.UpdateView):
     model = Questionnaire
@@ -103,10 +136,25 @@ class QuestionView(LoginRequiredMixin, generic.DetailView):
         if not self.request.user.is_authenticated:
             return redirect('login')
         obj = self.get_object()
-        if obj.questionnaire.user != self.request.user:
+        if obj.questionnaire.user_id != self.request.user.id:
             return render(request, 'error.html')
         return super().dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        if not hasattr(self, '_object'):
+            self._object = contentcache.cached(
+                contentcache.QUESTION, self.kwargs['pk'], 'object',
+                lambda: super(QuestionView, self).get_object(
+                    Question.objects.select_related('questionnaire')))
+        return self._object
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['answers'] = contentcache.cached(
+            contentcache.QUESTION, self.object.id, 'answers',
+            lambda: list(self.object.answer_set.all()))
+        return context
+
 
 class QuestionRemoveView(LoginRequiredMixin, generic.DeleteView):
     model = Question
@@ -125,6 +173,48 @@ class QuestionRemoveView(LoginRequiredMixin, generic.DeleteView):
         return super().dispatch(request, *args, **kwargs)
 
 
+class PositionMoveView(LoginRequiredMixin, generic.View):
+    '''move a question or an answer to the position in the POST data'''
+    model = None
+
+    def get_questionnaire(self, obj):
+        raise NotImplementedError
+
+    def get_success_url(self, obj):
+        raise NotImplementedError
+
+    def post(self, request, pk):
+        obj = get_object_or_404(self.model, pk=pk)
+        if self.get_questionnaire(obj).user != request.user:
+            return render(request, 'error.html')
+        try:
+            position = int(request.POST.get('position'))
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest('position must be an integer')
+        obj.move_to(position)
+        return redirect(self.get_success_url(obj))
+
+
+class QuestionMoveView(PositionMoveView):
+    model = Question
+
+    def get_questionnaire(self, obj):
+        return obj.questionnaire
+
+    def get_success_url(self, obj):
+        return reverse('questionnaire-detail', args=[obj.questionnaire_id])
+
+
+class AnswerMoveView(PositionMoveView):
+    model = Answer
+
+    def get_questionnaire(self, obj):
+        return obj.question.questionnaire
+
+    def get_success_url(self, obj):
+        return reverse('question-detail', args=[obj.question_id])
+
+
 class QuestionUpdateView(LoginRequiredMixin, generic.UpdateView):
     model = Question
     fields = ['question', 'questionnaire']
@@ -286,17 +376,25 @@ class GameCreateView(generic.View):
     def get(self, request, questionnaireid):
 
         questionnaire = get_object_or_404(Questionnaire, id=questionnaireid)
+        # If the game already exists, delete it and create a new one; it
+        # is only deleted once the new one has a PIN
+        old_games = list(Game.objects.filter(questionnaire=questionnaire))
+        # the game plays the questionnaire as it is now
+        game_snapshot = contentcache.cached(
+            contentcache.QUESTIONNAIRE, questionnaire.id, 'snapshot',
+            lambda: snapshot.compile_snapshot(questionnaire.id))
         try:
-            # If the game already exists, delete it and create a new one
-            game = Game.objects.get(questionnaire=questionnaire)
-            game.delete()
-        except Game.DoesNotExist:
-            pass
-        game = Game.objects.create(
-            questionnaire=questionnaire,
-            questionNo=Question.objects.filter(
-                questionnaire=questionnaire).count(),
-        )
+            game = Game.objects.create(
+                questionnaire=questionnaire,
+                questionNo=len(game_snapshot['questions']),
+                snapshot=game_snapshot,
+            )
+        except PinsExhausted:
+            return HttpResponse('Every game PIN is in use, try again later.',
+                                status=503)
+        for old_game in old_games:
+            deletion.delete_game(old_game)
+        snapshot.remember(game.id, game_snapshot)
         request.session['publicId'] = game.publicId
         request.session['game_id'] = game.pk
 
@@ -304,7 +402,10 @@ class GameCreateView(generic.View):
         url = "https://vueclient-xng7.onrender.com"
         if os.environ.get('TESTING') == '1':
             url = "http://localhost:3000"
-        return render(request, 'game-create.html', {'game': game, 'url': url})
+        return render(request, 'game-create.html', {
+            'game': game, 'url': url,
+            # joins handled by any worker must reach the stream
+            'event_stream': broadcast.reaches_every_worker()})
 
     def dispatch(self, request, *args, **kwargs):
         if not self.request.user.is_authenticated:
@@ -317,38 +418,105 @@ class GameCreateView(generic.View):
 
 
 class GameUpdateParticipantView(generic.View):
+    '''aliases of the participants of the game. With ?since=<id> only the
+    participants that joined after the participant with that id are
+    returned; 'last' is the cursor to use in the next request and
+    'count' the total number of participants'''
 
     def get(self, request):
+        try:
+            since = int(request.GET.get('since', 0))
+        except ValueError:
+            return JsonResponse({'detail': 'since must be an integer.'},
+                                status=400)
         try:
             game = Game.objects.get(pk=request.session.get('game_id'))
         except Game.DoesNotExist:
             return render(request, 'error.html')
-        participants = [
-            participant.alias for participant in
-            Participant.objects.filter(game=game)]
+        # both queries are served by the (game, id) index
+        participants = list(Participant.objects.filter(
+            game=game, id__gt=since).order_by('id').values_list(
+            'id', 'alias'))
+        count = len(participants)
+        if since:
+            count = Participant.objects.filter(game=game).count()
         data = {
             'publicId': request.session.get('publicId'),
-            'participants': participants,
+            'participants': [alias for _, alias in participants],
+            'count': count,
+            'last': participants[-1][0] if participants else since,
         }
         return JsonResponse(data)
 
 
+def notify_players(game, scores=False):
+    '''push the new state of the game to the players' websockets'''
+    message = {'type': 'state', 'state': game.state,
+               'questionNo': game.questionNo}
+    if game.state == constants.ANSWER:
+        # the host is showing the question, players can answer it
+        message['question'] = gamestate.question_message(
+            gamestate.get_game_context(game.publicId))
+    if scores:
+        game_ranking = ranking.get_ranking(game.id, game.publicId)
+        message['scores'] = [
+            {'alias': row['alias'], 'points': row['points']}
+            for row in game_ranking.top(len(game_ranking))]
+    broadcast.publish(broadcast.game_channel(game.publicId), message)
+
+
+class GameParticipantStreamView(generic.View):
+    '''The lobby event stream is served by the ASGI application, without
+    holding a worker (services/streams.py). Reaching this view means the
+    project runs under WSGI: 204 tells EventSource to stop, the lobby page
+    polls GameUpdateParticipantView instead.'''
+
+    def get(self, request):
+        return HttpResponse(status=204)
+
+
+# participants listed on the score screen after every question
+SCORES_SHOWN = 50
+
+
 class GameCountdownView(generic.TemplateView):
     template_name = "game-count-down.html"
 
+    def get_game(self):
+        # the context and the template are chosen from the same game
+        if not hasattr(self, '_game'):
+            self._game = Game.objects.get(
+                pk=self.request.session.get('game_id'))
+        return self._game
+
+    def set_game_state(self, state):
+        # only a change marks the session as modified and saves it
+        if self.request.session.get('game_state') != state:
+            self.request.session['game_state'] = state
+
     def get_template_names(self):
-        game = Game.objects.get(pk=self.request.session.get('game_id'))
+        game = self.get_game()
         state = game.state
         if state == constants.WAITING:
             template_name = "game-count-down.html"
             game.state = constants.QUESTION
-            self.request.session['game_state'] = game.state
+            self.set_game_state(game.state)
             game.save()
+            notify_players(game)
+            # the lobby is over, end the participant streams
+            broadcast.publish(broadcast.lobby_channel(game.publicId),
+                              {'type': 'close'})
         elif state == constants.QUESTION:
             template_name = "game-question.html"
+            question = snapshot.get_question(
+                snapshot.get_snapshot(game.id), game.questionNo)
+            if question is not None:
+                # count the guesses from zero before any can arrive
+                histogram.open_question(game.id, question)
             game.state = constants.ANSWER
-            self.request.session['game_state'] = game.state
+            self.set_game_state(game.state)
             game.save()
+            notify_players(game)
         elif state == constants.ANSWER:
             template_name = "game-score.html"
             game.questionNo -= 1
@@ -356,8 +524,9 @@ class GameCountdownView(generic.TemplateView):
                 game.state = constants.LEADERBOARD
             else:
                 game.state = constants.QUESTION
-            self.request.session['game_state'] = game.state
+            self.set_game_state(game.state)
             game.save()
+            notify_players(game, scores=True)
         elif state == constants.LEADERBOARD:
             template_name = "game-leaderboard.html"
         else:
@@ -366,51 +535,47 @@ class GameCountdownView(generic.TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        game = Game.objects.get(pk=self.request.session.get('game_id'))
+        game = self.get_game()
         state = game.state
-        session = self.request.session
-        session['game_state'] = state
-        questions = Question.objects.filter(questionnaire=game.questionnaire)
+        self.set_game_state(state)
+        # questions and answers come from the snapshot, not the database
+        question = None
+        if state in (constants.QUESTION, constants.ANSWER):
+            game_snapshot = snapshot.get_snapshot(game.id)
+            question = snapshot.get_question(game_snapshot, game.questionNo)
+        if question is not None:
+            correct = snapshot.correct_answers(question)
+            # same attributes as the models for the templates
+            context["question"] = {'id': question['id'],
+                                   'question': question['text'],
+                                   'answerTime': question['answerTime']}
         if state == constants.WAITING:
             context["countdown"] = game.countdownTime
         elif state == constants.QUESTION:
-            context["questions"] = questions
-            context["answers"] = [answer for answer in Answer.objects.filter(
-                question=context["questions"][game.questionNo-1])
-                if answer.question.questionnaire == game.questionnaire]
-            group = context["questions"][game.questionNo-1]
-            context["countdown"] = group.answerTime
-            context["question"] = context["questions"][game.questionNo-1]
-            session['correct'] = [answer for answer in Answer.objects.filter(
-                question=context["question"]) if answer.correct][0].answer
-            participants = Participant.objects.filter(game=game)
-            session['participants'] = [
-                participant.alias for participant in participants]
+            context["questions"] = game_snapshot['questions']
+            context["answers"] = [{'id': id, 'answer': text}
+                                  for id, text in question['answers']]
+            context["countdown"] = question['answerTime']
         elif state == constants.ANSWER:
-            context["correct"] = session.get('correct')
-            context["question"] = questions[game.questionNo-1]
-            context["participants"] = Participant.objects.filter(game=game)
-            guesses = Guess.objects.filter(
-                game=game, question=context["question"])
-            total_guesses = guesses.count()
-            answer = Answer.objects.get(
-                question=context["question"], correct=True)
-            correct_guesses = guesses.filter(answer=answer).count()
-            if total_guesses != 0:
-                context["correct_percentage"] = (
-                    correct_guesses / total_guesses) * 100
-            else:
-                context["correct_percentage"] = 0
+            # buffered guesses must be stored before they are counted
+            guessbuffer.buffer.flush(game.id)
+            context["correct"] = correct[0][1]
+            # read when the template is rendered, after the transition in
+            # get_template_names, from the ranking notify_players built
+            context["participants"] = lambda: ranking.get_ranking(
+                game.id, game.publicId).top(SCORES_SHOWN)
+            distribution = histogram.distribution(game.id, question)
+            total = distribution['total']
+            for answer in distribution['answers']:
+                answer['percentage'] = (
+                    answer['count'] / total * 100 if total else 0)
+            context["distribution"] = distribution['answers']
+            context["correct_percentage"] = (
+                distribution['correct'] / total * 100 if total else 0)
         elif state == constants.LEADERBOARD:
-            try:
-                context['first'] = Participant.objects.filter(
-                    game=game).order_by('points')[0]
-                context['second'] = Participant.objects.filter(
-                    game=game).order_by('points')[1]
-                context['third'] = Participant.objects.filter(
-                    game=game).order_by('points')[2]
-            except IndexError:
-                pass
+            podium = ranking.get_ranking(game.id, game.publicId).top(3)
+            for key, participant in zip(('first', 'second', 'third'), podium):
+                context[key] = participant
             context["questionnaire"] = game.questionnaire
         context["game"] = game
         return context